@@ -0,0 +1,140 @@
+"""
+LLMClient负载基准
+按调用类型的比例并发发起评估、质量、压缩和深度分析请求（prompt由真实模板生成），
+根据LLMClient的调用指标统计各类型的吞吐、首token延迟和尾延迟，配合 llm_stub_server.py 可在本机离线复现
+
+用法:
+    python benchmarks/llm_stub_server.py --ttft 0.5 --tokens-per-sec 80 &
+    python benchmarks/llm_load_bench.py [--requests 200] [--concurrency 32] [--mix quality:0.6,evaluate:0.2,compression:0.1,deep_analysis:0.1]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+SAMPLE = "大模型推理服务的吞吐与首token延迟取决于批处理策略、KV缓存命中率和网络往返，"
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def fmt(value):
+    return f"{value * 1000:8.0f}" if value is not None else "       -"
+
+
+def make_article(chars: int) -> str:
+    return (SAMPLE * (chars // len(SAMPLE) + 1))[:chars]
+
+
+async def run(args):
+    # 必须在导入llm_client之前设置，load_dotenv不会覆盖已有的环境变量；
+    # 备用端点、级联、限流和离线批处理配置都清空，保证所有请求只发往桩服务
+    os.environ["LLM_API_BASE"] = args.api_base
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ["LLM_ENDPOINTS"] = ""
+    os.environ["LLM_CASCADE_RULES"] = ""
+    os.environ["LLM_RATE_LIMITS"] = ""
+    os.environ["LLM_BATCH_ENABLED"] = "false"
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ["LLM_METRICS_SINKS"] = "memory"
+    os.environ["LLM_METRICS_BUFFER_SIZE"] = str(args.requests * 4)
+
+    from src.model.llm_client import llm_client, CallType
+    from src.model.llm_metrics import bind_call_tags
+    from src.model.rate_limiter import RequestPriority
+    from src.prompts.prompt_templates import PromptTemplates
+
+    run_id = uuid.uuid4().hex
+    bind_call_tags(stream_id=run_id)
+    articles = [make_article(args.article_chars) for _ in range(8)]
+    query = "大模型推理加速有哪些方法"
+
+    async def quality():
+        prompt = PromptTemplates.format_article_quality_prompt(article=articles[0], query=query)
+        await llm_client.generate_json(prompt, system_message=PromptTemplates.system_prompt("ARTICLE_QUALITY_TEMPLATE", word_count=5000),
+                                       priority=RequestPriority.BULK, call_type=CallType.QUALITY)
+
+    async def evaluate():
+        prompt = PromptTemplates.format_evaluate_information_prompt(query, "", [f"文档{i}: {a}" for i, a in enumerate(articles[:2])])
+        await llm_client.generate_json(prompt, system_message=PromptTemplates.system_prompt("EVALUATE_INFORMATION_TEMPLATE"),
+                                       priority=RequestPriority.INTERACTIVE, call_type=CallType.EVALUATE)
+
+    async def compression():
+        prompt = PromptTemplates.format_content_compression_prompt(
+            query=query,
+            existing_content=[f"[文章{i}]\n内容: {a}" for i, a in enumerate(articles[:4])],
+            new_content=f"[新文章]\n内容: {articles[4]}",
+            token_limit=8000
+        )
+        await llm_client.generate(prompt, system_message=PromptTemplates.system_prompt("CONTENT_COMPRESSION_TEMPLATE"),
+                                  priority=RequestPriority.INTERACTIVE, call_type=CallType.COMPRESSION)
+
+    async def deep_analysis():
+        prompt = PromptTemplates.format_deep_analysis_prompt(query, articles)
+        async for _ in llm_client.generate_with_streaming(prompt, system_message=PromptTemplates.system_prompt("DEEP_ANALYSIS_TEMPLATE")):
+            pass
+
+    workloads = {"quality": quality, "evaluate": evaluate, "compression": compression, "deep_analysis": deep_analysis}
+    mix = []
+    for part in args.mix.split(","):
+        name, weight = part.split(":")
+        mix.append((workloads[name.strip()], float(weight)))
+    functions, weights = zip(*mix)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            try:
+                await random.choices(functions, weights)[0]()
+            except Exception:
+                pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - start
+    await llm_client.aclose()
+
+    records = llm_client.get_call_records(stream_id=run_id)
+    print(f"{len(records)} 次调用，耗时 {elapsed:.1f}s，吞吐 {len(records) / elapsed:.1f} req/s，并发 {args.concurrency}")
+    print(f"{'call_type':<14}{'count':>6}{'errors':>7}{'retries':>8}   ttft p50/p95 (ms)   latency p50/p95/p99 (ms)   queue p95 (ms)  tokens/s")
+    for call_type in sorted({r["call_type"] for r in records}):
+        group = [r for r in records if r["call_type"] == call_type]
+        ok = [r for r in group if not r["error"]]
+        ttft = [r["ttft"] for r in ok if r["ttft"] is not None]
+        latency = [r["latency"] for r in ok]
+        queue = [r["queue_time"] for r in group]
+        completion = sum(r["completion_tokens"] for r in ok)
+        print(f"{call_type:<14}{len(group):>6}{len(group) - len(ok):>7}{sum(r['retries'] for r in group):>8}   "
+              f"{fmt(percentile(ttft, 0.5))}{fmt(percentile(ttft, 0.95))}   "
+              f"{fmt(percentile(latency, 0.5))}{fmt(percentile(latency, 0.95))}{fmt(percentile(latency, 0.99))}   "
+              f"{fmt(percentile(queue, 0.95))}   {completion / elapsed:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api-base", default="http://127.0.0.1:8900/v1")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--article-chars", type=int, default=3000)
+    parser.add_argument("--mix", default="quality:0.6,evaluate:0.2,compression:0.1,deep_analysis:0.1")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
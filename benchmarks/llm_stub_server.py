@@ -0,0 +1,401 @@
+"""
+离线OpenAI兼容桩服务
+实现 /v1/chat/completions（含流式输出和reasoning_content增量）、/v1/models 以及批处理相关的
+/v1/files 与 /v1/batches，按prompt识别
+评估、质量、批量质量、摘录初筛、压缩、深度分析模板并返回脚本化或合成的响应，首token延迟、生成速度和错误注入均可配置，
+用于在没有真实模型服务时测试LLMClient的吞吐和尾延迟
+
+用法: python benchmarks/llm_stub_server.py [--port 8900] [--ttft 0.8] [--tokens-per-sec 60] [--error-rate 0.02]
+然后设置 LLM_API_BASE=http://127.0.0.1:8900/v1 启动应用或运行 benchmarks/llm_load_bench.py
+
+脚本文件(--script)为JSON，键为模板名(evaluate/quality/quality_batch/quality_excerpt/compression/deep_analysis/default)，
+值为响应列表，按顺序循环回放；元素可以是字符串，或 {"content": ..., "reasoning_content": ...}
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import uvicorn
+from fastapi import FastAPI, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+# 按顺序匹配，批量质量模板必须排在单篇质量模板之前
+TEMPLATE_MARKERS = [
+    ("quality_batch", "逐篇进行内容质量评估"),
+    ("quality", "内容质量评估、智能压缩"),
+    ("quality_excerpt", "初步判断整篇文章是否值得进一步评估"),
+    ("evaluate", "评估我们目前收集的信息是否足够"),
+    ("compression", "对已收集的多篇文章进行分析"),
+    ("deep_analysis", "结合查到的数据，解决用户问题"),
+]
+
+FILLER = "根据检索到的资料，该问题涉及多个方面，需要结合具体场景综合分析。"
+
+
+def detect_template(prompt: str) -> str:
+    for name, marker in TEMPLATE_MARKERS:
+        if marker in prompt:
+            return name
+    return "default"
+
+
+def extract_query(prompt: str) -> str:
+    match = re.search(r"用户查询[:：]\s*(.*)", prompt)
+    return match.group(1).strip() if match else "unknown"
+
+
+class StubBehavior:
+    """桩服务的延迟与错误注入配置"""
+
+    def __init__(self, ttft: float = 0.8, ttft_jitter: float = 0.2, tokens_per_sec: float = 60.0,
+                 chars_per_token: int = 2, reasoning_tokens: int = 0, answer_tokens: int = 400,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, stall_rate: float = 0.0,
+                 stall_seconds: float = 30.0, midstream_error_rate: float = 0.0, confidence: float = 0.9,
+                 enough_after: int = 3, batch_delay: float = 5.0, batch_error_rate: float = 0.0,
+                 script: Optional[Dict[str, List[Any]]] = None):
+        self.ttft = ttft
+        self.ttft_jitter = ttft_jitter
+        self.tokens_per_sec = tokens_per_sec
+        self.chars_per_token = chars_per_token
+        self.reasoning_tokens = reasoning_tokens
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.midstream_error_rate = midstream_error_rate
+        self.confidence = confidence
+        self.enough_after = enough_after
+        self.batch_delay = batch_delay
+        self.batch_error_rate = batch_error_rate
+        self._script = {name: itertools.cycle(items) for name, items in (script or {}).items() if items}
+        self._seen_prefixes = set()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "stalled": 0, "midstream_errors": 0,
+                      "batches": 0, "batch_requests": 0}
+
+    def first_token_delay(self) -> float:
+        return max(0.0, random.gauss(self.ttft, self.ttft_jitter))
+
+    def respond(self, prompt: str) -> Tuple[str, str]:
+        """返回 (reasoning_content, content)"""
+        template = detect_template(prompt)
+        if template in self._script:
+            item = next(self._script[template])
+            if isinstance(item, dict):
+                return item.get("reasoning_content", ""), item.get("content", "")
+            return "", str(item)
+        reasoning = (FILLER * (self.reasoning_tokens * self.chars_per_token // len(FILLER) + 1))[:self.reasoning_tokens * self.chars_per_token]
+        return reasoning, self._synthesize(template, prompt)
+
+    def _synthesize(self, template: str, prompt: str) -> str:
+        query = extract_query(prompt)
+        with_confidence = "confidence字段" in prompt
+        if template == "evaluate":
+            collected = len(re.findall(r"文档\d+[:：]", prompt))
+            data = {
+                "fetch_url": [],
+                "enough": collected >= self.enough_after,
+                "search_url": [f"https://www.bing.com/search?q={query}", f"https://www.baidu.com/s?wd={query}"],
+                "thought": FILLER * 3,
+                "query": query,
+                "scenario": "tech"
+            }
+        elif template == "quality":
+            data = {"high_quality": True, "compress": False, "title": "桩服务文章标题", "scenario": "tech"}
+        elif template == "quality_excerpt":
+            data = {"score": 7, "reason": "桩服务摘录评分"}
+        elif template == "quality_batch":
+            indexes = [int(i) for i in re.findall(r"\[文章(\d+)\]", prompt)]
+            data = {"results": [
+                {"index": i, "high_quality": i % 3 != 2, "compress": False, "title": f"桩服务文章{i}", "scenario": "tech"}
+                for i in indexes
+            ]}
+        elif template == "compression":
+            indexes = [int(i) for i in re.findall(r"\[文章(\d+)\]", prompt)]
+            data = {
+                "decisions": {"reasoning": "保留全部文章并截取前半部分", "strategy": "truncate"},
+                "compressed_results": [
+                    {"original_index": i, "url": "", "title": "", "content": FILLER, "compressed": True}
+                    for i in indexes + [-1]
+                ]
+            }
+        else:
+            return (FILLER * (self.answer_tokens * self.chars_per_token // len(FILLER) + 1))[:self.answer_tokens * self.chars_per_token]
+        if with_confidence:
+            if "results" in data:
+                for item in data["results"]:
+                    item["confidence"] = self.confidence
+            else:
+                data["confidence"] = self.confidence
+        return json.dumps(data, ensure_ascii=False)
+
+    def cached_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """模拟服务端前缀缓存：再次出现的system消息按缓存命中计入cached_tokens"""
+        system = "".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        if not system:
+            return 0
+        if system in self._seen_prefixes:
+            return len(system) // self.chars_per_token
+        self._seen_prefixes.add(system)
+        return 0
+
+    def usage(self, messages: List[Dict[str, Any]], prompt: str, reasoning: str, content: str) -> Dict[str, Any]:
+        prompt_tokens = len(prompt) // self.chars_per_token
+        completion_tokens = (len(reasoning) + len(content)) // self.chars_per_token
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": self.cached_tokens(messages)}}
+
+    def pieces(self, text: str) -> Iterator[str]:
+        step = max(1, self.chars_per_token)
+        for i in range(0, len(text), step):
+            yield text[i:i + step]
+
+
+def create_app(behavior: StubBehavior) -> FastAPI:
+    app = FastAPI(title="LLM stub")
+
+    def error_response(status: int, message: str) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"error": {"message": message, "type": "stub_error"}})
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return behavior.stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        behavior.stats["requests"] += 1
+        model = body.get("model", "stub")
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        roll = random.random()
+        if roll < behavior.rate_limit_rate:
+            behavior.stats["rate_limited"] += 1
+            return error_response(429, "stub rate limit")
+        if roll < behavior.rate_limit_rate + behavior.error_rate:
+            behavior.stats["errors"] += 1
+            return error_response(500, "stub internal error")
+
+        reasoning, content = behavior.respond(prompt)
+        usage = behavior.usage(body.get("messages", []), prompt, reasoning, content)
+        completion_tokens = usage["completion_tokens"]
+        delay = behavior.first_token_delay()
+        if random.random() < behavior.stall_rate:
+            behavior.stats["stalled"] += 1
+            delay += behavior.stall_seconds
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(delay + completion_tokens / behavior.tokens_per_sec)
+            message = {"role": "assistant", "content": content}
+            if reasoning:
+                message["reasoning_content"] = reasoning
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": usage
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        fail_midstream = random.random() < behavior.midstream_error_rate
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, chunk_usage=None) -> str:
+            data = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if delta is not None else [],
+            }
+            if chunk_usage is not None:
+                data["usage"] = chunk_usage
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(delay)
+            yield chunk({"role": "assistant", "content": ""})
+            interval = 1.0 / behavior.tokens_per_sec
+            sent = 0
+            for piece in behavior.pieces(reasoning):
+                yield chunk({"reasoning_content": piece})
+                await asyncio.sleep(interval)
+            for piece in behavior.pieces(content):
+                sent += 1
+                if fail_midstream and sent > 5:
+                    behavior.stats["midstream_errors"] += 1
+                    raise RuntimeError("stub midstream failure")
+                yield chunk({"content": piece})
+                await asyncio.sleep(interval)
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # 批处理：上传的输入文件在batch_delay秒后整体完成，结果写入输出文件和错误文件
+    files: Dict[str, Dict[str, Any]] = {}
+    batches: Dict[str, Dict[str, Any]] = {}
+
+    def save_file(content: str, purpose: str, filename: str) -> Dict[str, Any]:
+        file_id = f"file-{uuid.uuid4().hex}"
+        files[file_id] = {
+            "id": file_id, "object": "file", "bytes": len(content.encode("utf-8")), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "content": content
+        }
+        return files[file_id]
+
+    def file_object(item: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in item.items() if key != "content"}
+
+    def run_batch_line(line: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """返回 (输出行, 错误行)"""
+        body = line.get("body", {})
+        if random.random() < behavior.batch_error_rate:
+            return None, {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": line.get("custom_id"),
+                          "response": None, "error": {"code": "server_error", "message": "stub batch error"}}
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        reasoning, content = behavior.respond(prompt)
+        message = {"role": "assistant", "content": content}
+        if reasoning:
+            message["reasoning_content"] = reasoning
+        completion = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": behavior.usage(body.get("messages", []), prompt, reasoning, content)
+        }
+        return {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": line.get("custom_id"),
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": completion},
+                "error": None}, None
+
+    def refresh_batch(batch: Dict[str, Any]) -> Dict[str, Any]:
+        if batch["status"] != "in_progress" or time.time() < batch["_ready_at"]:
+            return batch
+        outputs, errors = [], []
+        for raw in files[batch["input_file_id"]]["content"].splitlines():
+            if not raw.strip():
+                continue
+            output, error = run_batch_line(json.loads(raw))
+            if output is not None:
+                outputs.append(json.dumps(output, ensure_ascii=False))
+            if error is not None:
+                errors.append(json.dumps(error, ensure_ascii=False))
+        if outputs:
+            batch["output_file_id"] = save_file("\n".join(outputs), "batch_output", f"{batch['id']}_output.jsonl")["id"]
+        if errors:
+            batch["error_file_id"] = save_file("\n".join(errors), "batch_output", f"{batch['id']}_error.jsonl")["id"]
+        batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+        batch["status"] = "completed"
+        batch["completed_at"] = int(time.time())
+        return batch
+
+    def batch_object(batch: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+    @app.post("/v1/files")
+    async def upload_file(file: UploadFile = File(...), purpose: str = Form(...)):
+        content = (await file.read()).decode("utf-8")
+        return file_object(save_file(content, purpose, file.filename or "upload.jsonl"))
+
+    @app.get("/v1/files/{file_id}/content")
+    async def file_content(file_id: str):
+        if file_id not in files:
+            return error_response(404, f"file {file_id} not found")
+        return PlainTextResponse(files[file_id]["content"])
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        input_file_id = body.get("input_file_id")
+        if input_file_id not in files:
+            return error_response(400, f"file {input_file_id} not found")
+        total = sum(1 for line in files[input_file_id]["content"].splitlines() if line.strip())
+        behavior.stats["batches"] += 1
+        behavior.stats["batch_requests"] += total
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"), "errors": None,
+            "input_file_id": input_file_id, "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "output_file_id": None, "error_file_id": None,
+            "created_at": int(time.time()), "completed_at": None, "metadata": body.get("metadata"),
+            "request_counts": {"total": total, "completed": 0, "failed": 0},
+            "_ready_at": time.time() + behavior.batch_delay
+        }
+        return batch_object(batches[batch_id])
+
+    @app.get("/v1/batches/{batch_id}")
+    async def retrieve_batch(batch_id: str):
+        if batch_id not in batches:
+            return error_response(404, f"batch {batch_id} not found")
+        return batch_object(refresh_batch(batches[batch_id]))
+
+    @app.post("/v1/batches/{batch_id}/cancel")
+    async def cancel_batch(batch_id: str):
+        if batch_id not in batches:
+            return error_response(404, f"batch {batch_id} not found")
+        batch = batches[batch_id]
+        if batch["status"] == "in_progress":
+            batch["status"] = "cancelled"
+        return batch_object(batch)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--ttft", type=float, default=0.8, help="首token延迟均值（秒）")
+    parser.add_argument("--ttft-jitter", type=float, default=0.2, help="首token延迟标准差（秒）")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--chars-per-token", type=int, default=2)
+    parser.add_argument("--reasoning-tokens", type=int, default=0, help="正文前输出的reasoning_content token数")
+    parser.add_argument("--answer-tokens", type=int, default=400, help="深度分析等非JSON模板的回答长度")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回429的比例")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="首token额外延迟stall-seconds的比例，用于测试对冲")
+    parser.add_argument("--stall-seconds", type=float, default=30.0)
+    parser.add_argument("--midstream-error-rate", type=float, default=0.0, help="流式输出中途断开的比例")
+    parser.add_argument("--confidence", type=float, default=0.9, help="级联prompt要求confidence字段时返回的值")
+    parser.add_argument("--enough-after", type=int, default=3, help="评估模板中已收集文档达到该数量时返回enough=true")
+    parser.add_argument("--batch-delay", type=float, default=5.0, help="批处理任务从提交到完成的秒数")
+    parser.add_argument("--batch-error-rate", type=float, default=0.0, help="批处理中单个请求失败的比例")
+    parser.add_argument("--script", type=str, default=None, help="脚本化响应JSON文件")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    script = None
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    behavior = StubBehavior(
+        ttft=args.ttft, ttft_jitter=args.ttft_jitter, tokens_per_sec=args.tokens_per_sec,
+        chars_per_token=args.chars_per_token, reasoning_tokens=args.reasoning_tokens,
+        answer_tokens=args.answer_tokens, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        stall_rate=args.stall_rate, stall_seconds=args.stall_seconds,
+        midstream_error_rate=args.midstream_error_rate, confidence=args.confidence,
+        enough_after=args.enough_after, batch_delay=args.batch_delay,
+        batch_error_rate=args.batch_error_rate, script=script
+    )
+    uvicorn.run(create_app(behavior), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
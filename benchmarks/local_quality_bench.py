@@ -0,0 +1,144 @@
+"""
+本地小模型质量评估基准
+对同一批文章分别用远程模型和本地llama.cpp模型做单篇质量评估（相同模板、相同结构化输出），
+统计两者判定的一致率、混淆矩阵、解析失败数以及吞吐和延迟，用于决定quality/evaluate调用能否挂到本地端点
+
+用法:
+    python benchmarks/local_quality_bench.py --model-path /models/qwen2.5-1.5b-instruct-q4_k_m.gguf \\
+        --articles-dir data/articles [--query "大模型推理加速"] [--limit 50] [--concurrency 4]
+
+文章目录下的每个 .txt/.md 文件视为一篇文章；远程模型使用 ARTICLE_QUALITY_MODEL（未设置时为LLM_MODEL）
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+LOCAL_ROLE = "local_bench"
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def load_articles(directory: str, limit: int):
+    files = sorted(p for p in Path(directory).iterdir() if p.suffix in (".txt", ".md"))[:limit]
+    return [(p.name, p.read_text(encoding="utf-8", errors="ignore")) for p in files]
+
+
+async def run(args):
+    os.environ["LLM_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("LLM_CASCADE_RULES", "{}")
+
+    from src.model.llm_client import llm_client, CallType
+    from src.model.llm_endpoints import LLMEndpointPool
+    from src.prompts.prompt_templates import PromptTemplates
+
+    local_endpoint = LLMEndpointPool._local_endpoint(LOCAL_ROLE, 0, {
+        "name": "local",
+        "local_model_path": args.model_path,
+        "n_ctx": args.n_ctx,
+        "n_threads": args.n_threads,
+        "max_queue": args.concurrency,
+    }, llm_client.http_client, failure_threshold=10 ** 6, cooldown=0)
+    # 本地角色只有一个端点，失败时不转移到远程，结果才能反映本地模型本身
+    llm_client.endpoint_pool.roles[LOCAL_ROLE] = [local_endpoint]
+
+    articles = load_articles(args.articles_dir, args.limit)
+    if not articles:
+        print(f"{args.articles_dir} 下没有 .txt/.md 文章")
+        return
+    word_count = int(os.getenv("ARTICLE_TRUNC_WORD_COUNT", "10000"))
+    system_message = PromptTemplates.system_prompt("ARTICLE_QUALITY_TEMPLATE", word_count=word_count)
+
+    async def evaluate(content: str, model: str, call_type: str, n_ctx: int = None):
+        budget = llm_client.prompt_token_budget(model, system_message=system_message)
+        if n_ctx:
+            budget = min(budget, n_ctx - llm_client.max_tokens // 4 - llm_client.count_tokens(system_message, model=model))
+        prompt = PromptTemplates.format_article_quality_prompt(
+            article=content, query=args.query,
+            assembler=llm_client.prompt_assembler_for(model), token_budget=max(0, budget)
+        )
+        start = time.perf_counter()
+        try:
+            result = await llm_client.generate_json(
+                prompt, system_message=system_message, model=model, call_type=call_type,
+                cascade=False, schema_key="ARTICLE_QUALITY_TEMPLATE", max_tokens=llm_client.max_tokens // 4
+            )
+        except Exception:
+            result = None
+        return result, time.perf_counter() - start
+
+    async def run_side(model: str, call_type: str, concurrency: int, n_ctx: int = None):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(content):
+            async with semaphore:
+                return await evaluate(content, model, call_type, n_ctx)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(content) for _, content in articles))
+        return results, time.perf_counter() - start
+
+    remote_model = os.getenv("ARTICLE_QUALITY_MODEL") or llm_client.model
+    local_model = local_endpoint.model
+    remote, remote_elapsed = await run_side(remote_model, CallType.DEFAULT, args.remote_concurrency)
+    local, local_elapsed = await run_side(local_model, LOCAL_ROLE, args.concurrency, args.n_ctx)
+    await llm_client.aclose()
+
+    matrix = {(r, l): 0 for r in (True, False, None) for l in (True, False, None)}
+    disagreements = []
+    for (name, _), (r, _), (l, _) in zip(articles, remote, local):
+        r_verdict = r.get("high_quality") if r else None
+        l_verdict = l.get("high_quality") if l else None
+        matrix[(r_verdict, l_verdict)] += 1
+        if r_verdict is not None and l_verdict is not None and r_verdict != l_verdict:
+            disagreements.append(name)
+    both = sum(count for (r, l), count in matrix.items() if r is not None and l is not None)
+    agree = matrix[(True, True)] + matrix[(False, False)]
+
+    print(f"文章数 {len(articles)}，远程模型 {remote_model}，本地模型 {local_model}")
+    print(f"{'':<10}{'articles/s':>12}{'p50 (s)':>10}{'p95 (s)':>10}{'失败':>6}")
+    for label, results, elapsed in (("remote", remote, remote_elapsed), ("local", local, local_elapsed)):
+        latency = [seconds for result, seconds in results if result]
+        failed = sum(1 for result, _ in results if not result)
+        p50, p95 = percentile(latency, 0.5), percentile(latency, 0.95)
+        print(f"{label:<10}{len(results) / elapsed:>12.2f}{p50 or 0:>10.2f}{p95 or 0:>10.2f}{failed:>6}")
+    print(f"判定一致率 {agree / both:.1%}（{agree}/{both}）" if both else "没有两侧都成功的文章")
+    print("混淆矩阵（行: 远程，列: 本地，None为失败）")
+    print(f"{'':<8}{'True':>8}{'False':>8}{'None':>8}")
+    for r in (True, False, None):
+        print(f"{str(r):<8}" + "".join(f"{matrix[(r, l)]:>8}" for l in (True, False, None)))
+    # 本地判为低质量而远程判为高质量的文章会被直接丢弃，是切换到本地模型的主要风险
+    dropped = matrix[(True, False)]
+    print(f"本地误判为低质量（会丢弃有用文章）: {dropped}，本地误判为高质量: {matrix[(False, True)]}")
+    if disagreements:
+        print("判定不一致的文章: " + ", ".join(disagreements[:20]))
+    print(f"本地后端统计: {local_endpoint.client.get_stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", required=True, help="GGUF量化模型路径")
+    parser.add_argument("--articles-dir", required=True)
+    parser.add_argument("--query", default=None)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--n-ctx", type=int, default=8192)
+    parser.add_argument("--n-threads", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4, help="本地请求并发（生成串行，其余排队）")
+    parser.add_argument("--remote-concurrency", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
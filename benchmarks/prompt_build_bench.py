@@ -0,0 +1,118 @@
+"""
+Prompt构建微基准
+在约10万token的文章语料上构建一轮研究迭代用到的三个prompt（信息评估、内容压缩、深度分析），
+对比原实现（str.format后对整个prompt做TextFilter正则过滤，过滤词每次拼接成正则）与
+预编译模板 + 文章入库时一次性清理（渲染时只过滤查询等短段落）的耗时，并校验两者输出一致
+
+用法: python benchmarks/prompt_build_bench.py [--articles 40] [--chars 3000] [--rounds 20] [--budget 0]
+--budget大于0时同时测量通过PromptAssembler按token预算组装的耗时
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+from src.model.token_counter import TokenCounter
+from src.prompts.prompt_assembler import PromptAssembler
+from src.prompts.prompt_templates import PROMPT_TEMPLATES, PromptTemplates
+from src.utils.text_filter import TextFilter
+
+SAMPLE_ZH = "大模型在检索增强生成场景下的推理效率与上下文长度密切相关，"
+SAMPLE_EN = "Retrieval augmented generation pipelines spend most of their budget on context assembly. "
+QUERY = "大模型推理加速有哪些工程手段"
+
+
+def make_article(chars: int) -> str:
+    parts = []
+    while sum(len(p) for p in parts) < chars:
+        parts.append(random.choice([SAMPLE_ZH, SAMPLE_EN]) + str(random.randint(0, 10 ** 6)))
+        if random.random() < 0.1:
+            parts.append("\n\n")
+    return "".join(parts)[:chars]
+
+
+def legacy_filter_useless(text, filter=TextFilter.DEFAULT_INVALID_WORD, replacement=""):
+    """原TextFilter.filter_useless：每次调用拼接过滤词并扫描整个文本"""
+    if not text or not filter:
+        return text
+    pattern = "|".join(map(re.escape, filter))
+    text = re.sub(pattern, replacement, text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def legacy_prompts(query, summaries, article_text, existing_content, new_content, token_limit):
+    current_time = datetime.now().strftime("%Y-%m-%d")
+    return [
+        legacy_filter_useless(PROMPT_TEMPLATES["EVALUATE_INFORMATION_TEMPLATE"].format(
+            current_time=current_time, query=query, context="", article_text="\n".join(article_text))),
+        legacy_filter_useless(PROMPT_TEMPLATES["CONTENT_COMPRESSION_TEMPLATE"].format(
+            current_time=current_time, query=query, token_limit=int(token_limit * 0.8),
+            existing_content="\n".join(existing_content), new_content=new_content)),
+        legacy_filter_useless(PROMPT_TEMPLATES["DEEP_ANALYSIS_TEMPLATE"].format(
+            current_time=current_time, query=query, summaries="\n".join(summaries))),
+    ]
+
+
+def current_prompts(query, summaries, article_text, existing_content, new_content, token_limit,
+                    assembler=None, budget=None):
+    return [
+        PromptTemplates.format_evaluate_information_prompt(query, "", article_text, assembler, budget),
+        PromptTemplates.format_content_compression_prompt(query, existing_content, new_content, token_limit,
+                                                          assembler, budget),
+        PromptTemplates.format_deep_analysis_prompt(query, summaries, assembler, budget),
+    ]
+
+
+def bench(name, fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{name:<36} median {timings[len(timings) // 2] * 1000:8.2f} ms/iteration   min {timings[0] * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=40)
+    parser.add_argument("--chars", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=0, help="按token预算组装时的预算，0为不测量")
+    args = parser.parse_args()
+
+    random.seed(0)
+    # 文章在抓取时已经清理，这里一次性清理后在每轮迭代中复用
+    corpus = [TextFilter.filter_useless(make_article(args.chars)) for _ in range(args.articles)]
+    summaries = [f"[文章{i}]\nURL: https://example.com/{i}\n标题: 文章{i}\n内容: {c}" for i, c in enumerate(corpus)]
+    article_text = [f"文档{i}: {c}..." for i, c in enumerate(corpus)]
+    existing_content, new_content = summaries[:-1], summaries[-1]
+    inputs = (QUERY, summaries, article_text, existing_content, new_content, 100000)
+
+    counter = TokenCounter()
+    corpus_tokens = sum(counter.count_batch(corpus))
+    print(f"{args.articles} 篇文章 x {args.chars} 字符，共 {corpus_tokens} token，每轮构建3个prompt")
+
+    legacy = legacy_prompts(*inputs)
+    current = current_prompts(*inputs)
+    print("输出一致" if legacy == current else "输出不一致: " + ", ".join(
+        str(i) for i, (a, b) in enumerate(zip(legacy, current)) if a != b))
+
+    bench("原实现 (format + 全文正则过滤)", lambda: legacy_prompts(*inputs), args.rounds)
+    bench("预编译模板 + 入库时清理", lambda: current_prompts(*inputs), args.rounds)
+    if args.budget > 0:
+        assembler = PromptAssembler(counter)
+        bench(f"按{args.budget} token预算组装",
+              lambda: current_prompts(*inputs, assembler=assembler, budget=args.budget), args.rounds)
+        print(f"token计数缓存: {counter.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Token计数微基准
+模拟一次研究迭代中的预算检查：逐篇检查新结果，超出预算时压缩（改写约一半文章）后重新统计全部结果，
+对比原实现（每次都tiktoken全量编码）与TokenCounter（哈希缓存 + 批量编码 + 快速估算）的耗时
+
+用法: python benchmarks/token_counting_bench.py [--articles 30] [--chars 6000] [--rounds 5]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.append(str(ROOT_DIR))
+
+import tiktoken
+from src.model.token_counter import TokenCounter
+
+SAMPLE_ZH = "大模型在检索增强生成场景下的推理效率与上下文长度密切相关，"
+SAMPLE_EN = "Retrieval augmented generation pipelines spend most of their budget on context assembly. "
+
+
+def make_article(chars: int) -> str:
+    parts = []
+    while sum(len(p) for p in parts) < chars:
+        parts.append(random.choice([SAMPLE_ZH, SAMPLE_EN]) + str(random.randint(0, 10 ** 6)))
+    return "".join(parts)[:chars]
+
+
+def result_text(result) -> str:
+    return f"URL: {result['url']}\n标题: {result['title']}\n内容: {result['content']}"
+
+
+def run_iteration(results, count_one, count_all, compress_every: int):
+    """按agent.is_add_result的调用模式执行一次迭代"""
+    kept = []
+    for i, result in enumerate(results):
+        count_one(result_text(result))
+        kept.append(result)
+        if (i + 1) % compress_every == 0:
+            for r in kept[::2]:
+                r["content"] = r["content"][: len(r["content"]) // 2]
+            count_all([result_text(r) for r in kept])
+
+
+def bench(name, fn, rounds, setup=None):
+    """setup不为None时每轮先（不计时）调用setup()创建新的状态传给fn，避免后几轮只测到缓存命中"""
+    timings = []
+    for _ in range(rounds):
+        args = (setup(),) if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{name:<28} median {timings[len(timings) // 2] * 1000:8.2f} ms/iteration   min {timings[0] * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=30)
+    parser.add_argument("--chars", type=int, default=6000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--compress-every", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(0)
+    corpus = [{"url": f"https://example.com/{i}", "title": f"文章{i}", "content": make_article(args.chars)}
+              for i in range(args.articles)]
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    def baseline():
+        results = [dict(r) for r in corpus]
+        run_iteration(
+            results,
+            lambda text: len(encoding.encode(text)),
+            lambda texts: sum(len(encoding.encode(t)) for t in texts),
+            args.compress_every
+        )
+
+    # 校准语料与测试语料内容不同，估算使用校准后的系数，但测试语料在缓存中都是冷的
+    calibration_texts = [make_article(args.chars) for _ in range(args.articles)]
+
+    def memoized(counter):
+        results = [dict(r) for r in corpus]
+        run_iteration(
+            results,
+            counter.count,
+            lambda texts: sum(counter.count_batch(texts)),
+            args.compress_every
+        )
+
+    def calibrated_counter():
+        counter = TokenCounter()
+        counter.count_batch(calibration_texts)
+        return counter
+
+    def approximate(counter):
+        results = [dict(r) for r in corpus]
+        run_iteration(
+            results,
+            lambda text: counter.count(text, approximate=True),
+            lambda texts: sum(counter.count_batch(texts, approximate=True)),
+            args.compress_every
+        )
+
+    counter = TokenCounter()
+    print(f"{args.articles} 篇文章 x {args.chars} 字符，每 {args.compress_every} 篇压缩一次")
+    bench("baseline tiktoken.encode", baseline, args.rounds)
+    # 每轮使用新的计数器，测量单次迭代内的收益；warm为同一计数器重复运行（跨迭代重复出现的文章）
+    bench("TokenCounter (exact)", memoized, args.rounds, setup=TokenCounter)
+    bench("TokenCounter (approximate)", approximate, args.rounds, setup=calibrated_counter)
+    memoized(counter)
+    bench("TokenCounter (exact, warm)", lambda: memoized(counter), args.rounds)
+    approx_counter = calibrated_counter()
+    exact = sum(len(encoding.encode(result_text(r))) for r in corpus)
+    estimated = sum(approx_counter.estimate(result_text(r)) for r in corpus)
+    print(f"估算误差: {abs(estimated - exact) / exact * 100:.2f}% (校准系数 {approx_counter.calibration_factor:.3f})")
+    print(f"缓存统计(warm): {counter.stats}")
+
+
+if __name__ == "__main__":
+    main()
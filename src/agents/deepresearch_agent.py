@@ -14,15 +14,17 @@ import sys
 ROOT_DIR = Path(__file__).parent.parent.parent
 sys.path.append(str(ROOT_DIR))
 
-from src.model.llm_client import llm_client
+from src.model.llm_client import llm_client, CallType
+from src.model.rate_limiter import RequestPriority
+from src.model.llm_metrics import bind_call_tags
 from src.session.session_manager import session_manager
 from src.memory.memory_manager import memory_manager
 from src.database.vectordb.milvus_dao import milvus_dao
 from src.tools.crawler.crawler_config import crawler_config_manager
 from src.tools.crawler.web_crawlers import web_crawler
 from src.app.chat_bean import ChatMessage
-from src.utils.json_parser import str2Json
 from src.prompts.prompt_templates import PromptTemplates
+from src.utils.text_filter import TextFilter
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -62,6 +64,8 @@ class DeepresearchAgent:
             self.memory_manager = None
         self.memory_threshold = int(os.getenv("MEMORY_THRESHOLD", "50"))  # 多少轮对话后生成长期记忆
         self.max_context_tokens = int(os.getenv("MAX_CONTEXT_TOKENS", "3072"))  # 上下文最大token数
+        self.approximate_token_budget = os.getenv("RESEARCH_APPROXIMATE_TOKEN_BUDGET", "false").lower() == "true"  # 预算检查是否使用快速估算
+        self.compression_trigger_ratio = float(os.getenv("RESEARCH_COMPRESSION_TRIGGER_RATIO", "0.95"))  # 累计token数超过预算的该比例时触发压缩
 
     async def process_stream(self, message: ChatMessage) -> AsyncGenerator[dict, None]:
         """
@@ -74,6 +78,7 @@ class DeepresearchAgent:
             AsyncGenerator: 流式生成的回复
         """
         query = message.message
+        bind_call_tags(session_id=self.session_id)
         self.memory_manager.save_chat_history(self.session_id, [{"role": "user", "content": query}])
         
         try:
@@ -113,10 +118,14 @@ class DeepresearchAgent:
             """
             all_content.append(content)
         
+        system_message = None
         if all_content:
+            system_message = PromptTemplates.system_prompt("DEEP_ANALYSIS_TEMPLATE")
             prompt = PromptTemplates.format_deep_analysis_prompt(
                 query, 
-                '\n'.join(all_content)
+                all_content,
+                assembler=self.llm_client.prompt_assembler_for(self.llm_client.model),
+                token_budget=self.llm_client.prompt_token_budget(self.llm_client.model, system_message=system_message)
             )
         else:
             prompt = f"用户当前问题: {query}\n\n"
@@ -134,7 +143,7 @@ class DeepresearchAgent:
                 buffer = ""
                 reasoning_buffer = ""
                 buffer_limit = 10
-                async for chunk in self.llm_client.generate_with_streaming(prompt):
+                async for chunk in self.llm_client.generate_with_streaming(prompt, system_message=system_message):
                     if chunk.get("reasoning_content"):
                         reasoning_buffer += chunk.get("reasoning_content")
                     if len(reasoning_buffer) >= buffer_limit or '\n' in reasoning_buffer or '。' in reasoning_buffer:
@@ -180,9 +189,15 @@ class DeepresearchAgent:
         iteration_count = 0
 
         try:
-            max_token_limit = self.llm_client._get_model_token_limit(self.llm_client.model)
-            available_token_limit = max_token_limit - 2048
-            logger.info(f"总结模型 {self.llm_client.model}的可用token限制: {available_token_limit}")
+            # 上下文长度 - 生成预留 - 系统消息 - 模板本身，均按总结模型自己的分词器计算
+            summary_model = self.llm_client.model
+            template_tokens = self.llm_client.count_tokens(
+                PromptTemplates.format_deep_analysis_prompt(origin_query, ""), model=summary_model
+            )
+            available_token_limit = self.llm_client.prompt_token_budget(
+                summary_model, system_message=PromptTemplates.system_prompt("DEEP_ANALYSIS_TEMPLATE")
+            ) - template_tokens
+            logger.info(f"总结模型 {summary_model}的可用token限制: {available_token_limit}")
         except Exception as e:
             logger.warning(f"获取模型token限制失败: {e}，使用默认值12000")
             available_token_limit = 12000
@@ -191,12 +206,29 @@ class DeepresearchAgent:
         current_token_count = 0
         filter_url = set()
         while iteration_count < self.research_max_iterations:
+            search_url_tasks = []
+            embedding_task = None
             try:
-                evaluate_result = await self._evaluate_information(origin_query, context, all_results)
+                # 评估结果按字段流式到达，字段完整后立即开始对应的抓取和向量化，不等待thought等长字段生成完
+                evaluate_result = {}
+                evaluate_stream = self._evaluate_information_stream(origin_query, context, all_results)
+                try:
+                    async for key, value in evaluate_stream:
+                        evaluate_result[key] = value
+                        if key == "fetch_url" and value and handle_fetch_url:
+                            break
+                        if key == "search_url" and value:
+                            search_url_tasks = [asyncio.create_task(self.web_crawler.parse_sub_url(url)) for url in value]
+                        elif key == "query" and value:
+                            embedding_task = asyncio.create_task(
+                                asyncio.to_thread(self.milvus_dao.generate_embeddings, [value])
+                            )
+                finally:
+                    await evaluate_stream.aclose()
                 logger.info(f"评估结果{evaluate_result}")
-                evaluate_query = evaluate_result["query"]
+                evaluate_query = evaluate_result.get("query")
 
-                if evaluate_result["fetch_url"] and handle_fetch_url:
+                if evaluate_result.get("fetch_url") and handle_fetch_url:
                     handle_fetch_url = False
                     async for result in self.web_crawler.fetch_article_stream(evaluate_result["fetch_url"], evaluate_query if evaluate_query else origin_query):
                         if 'content' in result and result['content'] and len(result['content'].strip()) > 0:
@@ -215,7 +247,7 @@ class DeepresearchAgent:
                                 logger.error(f"处理指定URL搜索结果时出错: {str(e)}", exc_info=True)
                     continue
                 
-                if evaluate_result and evaluate_result["enough"]:
+                if evaluate_result.get("enough"):
                     break
                 yield {
                     "type": "research_process", 
@@ -229,8 +261,8 @@ class DeepresearchAgent:
                     if url_list_str:
                         filter_expr = f"url not in [{url_list_str}]"
                     vector_contents = self.milvus_dao.search(
-                        collection_name=self.crawler_config_manager.get_collection_name(evaluate_result["scenario"]),
-                        data=self.milvus_dao.generate_embeddings([evaluate_query]),
+                        collection_name=self.crawler_config_manager.get_collection_name(evaluate_result.get("scenario")),
+                        data=await embedding_task if embedding_task is not None else self.milvus_dao.generate_embeddings([evaluate_query]),
                         filter=filter_expr,
                         limit=self.vectordb_limit,
                         output_fields=["id", "url", "title", "content", "create_time"]
@@ -242,6 +274,8 @@ class DeepresearchAgent:
                                 continue
                             for content in contents:
                                 entity = content['entity']
+                                # 早期入库的文章可能未经清理，取出时清理一次，之后每轮拼接prompt不再过滤正文
+                                entity['content'] = TextFilter.filter_useless(entity.get('content'))
                                 unique_contents[entity['url']] = entity
                         news_items = list(unique_contents.values())
                         if news_items:
@@ -261,12 +295,10 @@ class DeepresearchAgent:
                                     logger.error(f"处理知识库搜索结果时出错: {str(e)}")
 
                 search_fetch_url_list = []
-                search_url_list = evaluate_result["search_url"]
-                if search_url_list:
-                    for search_url in search_url_list:
-                        urls = await self.web_crawler.parse_sub_url(search_url)
-                        if urls:
-                            search_fetch_url_list.extend(urls)
+                for task in search_url_tasks:
+                    urls = await task
+                    if urls:
+                        search_fetch_url_list.extend(urls)
                 search_fetch_url_list = [url for url in search_fetch_url_list if url not in filter_url]
                 if search_fetch_url_list:
                     async for result in self.web_crawler.fetch_article_stream(search_fetch_url_list, evaluate_query if evaluate_query else origin_query):
@@ -286,19 +318,29 @@ class DeepresearchAgent:
                                 logger.error(f"处理网络搜索结果时出错: {str(e)}")
             except Exception as e:
                 logger.error(f"deepresearch迭代时出错: {str(e)}", exc_info=True)
+            finally:
+                for task in [*search_url_tasks, embedding_task]:
+                    if task is not None and not task.done():
+                        task.cancel()
             iteration_count += 1
         yield {"type": "research_results", "result": all_results}
 
+    @staticmethod
+    def _result_token_text(result):
+        """用于token预算计算的结果文本"""
+        return f"URL: {result.get('url', '')}\n标题: {result.get('title', '')}\n内容: {result.get('content', '')}"
+
     async def is_add_result(self, origin_query, all_results, result, current_token_count, available_token_limit):
         result_tokens = self.llm_client.count_tokens(
-            f"URL: {result['url']}\n标题: {result['title']}\n内容: {result['content']}"
+            self._result_token_text(result), approximate=self.approximate_token_budget
         )
-        if current_token_count + result_tokens > available_token_limit * 0.9:
+        if current_token_count + result_tokens > available_token_limit * self.compression_trigger_ratio:
             logger.info(f"添加新结果将超过token限制，当前:{current_token_count}，新结果:{result_tokens}，限制:{available_token_limit}")
             await self._compress_results(origin_query, all_results, result, available_token_limit)
-            current_token_count = sum(self.llm_client.count_tokens(
-                f"URL: {r.get('url', '')}\n标题: {r.get('title', '')}\n内容: {r.get('content', '')}"
-            ) for r in all_results)
+            # 压缩后未改动的文章命中token计数缓存，只有被改写的文章需要重新编码
+            current_token_count = sum(self.llm_client.count_tokens_batch(
+                [self._result_token_text(r) for r in all_results], approximate=self.approximate_token_budget
+            ))
             logger.info(f"压缩后的token数: {current_token_count}")
         return current_token_count + result_tokens <= available_token_limit, current_token_count, result_tokens
 
@@ -335,23 +377,33 @@ class DeepresearchAgent:
         """
         
         # 使用提示词模板
+        compression_model = os.getenv("COMPRESSION_MODEL", self.llm_client.model)
+        system_message = PromptTemplates.system_prompt("CONTENT_COMPRESSION_TEMPLATE")
         unified_prompt = PromptTemplates.format_content_compression_prompt(
             query=query,
-            existing_content=chr(10).join(all_content),
+            existing_content=all_content,
             new_content=new_content,
-            token_limit=token_limit
+            token_limit=token_limit,
+            assembler=self.llm_client.prompt_assembler_for(compression_model),
+            token_budget=self.llm_client.prompt_token_budget(compression_model, system_message=system_message)
         )
         
         try:
             logger.info(f"开始执行统一的内容压缩，当前有{len(all_results)}篇文章和1篇新文章")
-            compression_response = await self.llm_client.generate(
+            # 输出经结构化输出模式约束，格式错误时先修复/重新请求，仍无法解析才走备用策略
+            result_data = await self.llm_client.generate_json(
                 prompt=unified_prompt,
-                model=os.getenv("COMPRESSION_MODEL", self.llm_client.model)
+                system_message=system_message,
+                model=compression_model,
+                priority=RequestPriority.INTERACTIVE,
+                call_type=CallType.COMPRESSION,
+                schema_key="CONTENT_COMPRESSION_TEMPLATE"
             )
             
             # 解析压缩结果
             try:
-                result_data = str2Json(compression_response)
+                if result_data is None:
+                    raise json.JSONDecodeError("压缩结果无法解析为JSON对象", "", 0)
                 compressed_results = result_data.get("compressed_results", [])
                 decisions = result_data.get("decisions", {})
                 
@@ -373,14 +425,14 @@ class DeepresearchAgent:
                     if original_index == -1:
                         # 这是新文章
                         processed_article = new_result.copy()
-                        processed_article["content"] = article.get("content")
+                        processed_article["content"] = TextFilter.filter_useless(article.get("content"))
                         processed_article["compressed"] = article.get("compressed", True)
                     else:
                         # 这是已有文章
                         if 0 <= original_index < len(all_content):
                             # 从原内容获取文章对象，并更新为压缩后的内容
                             processed_article = all_results[original_index].copy() if original_index < len(all_results) else {}
-                            processed_article["content"] = article.get("content")
+                            processed_article["content"] = TextFilter.filter_useless(article.get("content"))
                             processed_article["compressed"] = article.get("compressed", True)
                             processed_article["url"] = article.get("url", processed_article.get("url", ""))
                             processed_article["title"] = article.get("title", processed_article.get("title", ""))
@@ -420,32 +472,47 @@ class DeepresearchAgent:
                 all_results.pop(0)  # 移除最旧的一篇
             all_results.append(new_result)
 
-    async def _evaluate_information(self, query, context, results):
+    async def _evaluate_information_stream(self, query, context, results):
         """
-        使用LLM评估已获取的信息是否足够回答用户查询
+        使用LLM评估已获取的信息是否足够回答用户查询，评估结果的字段生成完毕即产出
         
         Args:
             query: 用户查询
             context: 历史对话上下文
             results: 已获取的结果
-        Returns:
-            bool: 信息是否足够
+        Yields:
+            Tuple[str, Any]: 评估结果的字段名与值（fetch_url、enough、search_url、thought、query、scenario）
         """
-        article_text = ""
+        article_text = []
         if results:
             for i, result in enumerate(results):
                 if 'content' in result and result['content']:
                     snippet = result['content']
-                    article_text += f"文档{i}: {snippet}...\n"
+                    article_text.append(f"文档{i}: {snippet}...")
         
-        prompt = PromptTemplates.format_evaluate_information_prompt(query, context, article_text)
+        evaluate_model = os.getenv("EVALUATE_INFORMATION_MODEL")
+        system_message = PromptTemplates.system_prompt("EVALUATE_INFORMATION_TEMPLATE")
+        prompt = PromptTemplates.format_evaluate_information_prompt(
+            query,
+            context,
+            article_text,
+            assembler=self.llm_client.prompt_assembler_for(evaluate_model),
+            token_budget=self.llm_client.prompt_token_budget(evaluate_model, system_message=system_message)
+        )
         
+        stream = self.llm_client.generate_json_stream(
+            prompt=prompt, 
+            system_message=system_message,
+            model=evaluate_model,
+            priority=RequestPriority.INTERACTIVE,
+            call_type=CallType.EVALUATE,
+            schema_key="EVALUATE_INFORMATION_TEMPLATE"
+        )
         try:
-            response = await self.llm_client.generate(
-                prompt=prompt, 
-                model=os.getenv("EVALUATE_INFORMATION_MODEL")
-            )
-            return str2Json(response)
+            async for key, value in stream:
+                yield key, value
         except Exception as e:
             logger.error(f"评估信息充分性时出错: {str(e)}", exc_info=True)
-            return {}
\ No newline at end of file
+        finally:
+            # 调用方提前结束迭代时取消尚未完成的评估请求
+            await stream.aclose()
\ No newline at end of file
@@ -3,9 +3,11 @@
 
 import os
 import logging
+import asyncio
 import sys
 import uuid
 import json
+import time
 import hashlib
 from pathlib import Path
 from typing import List, Optional, Dict, Any
@@ -37,6 +39,9 @@ from src.database.mysql.schemas.chat_schema import CHAT_SCHEMA, init_chat_defaul
 from src.database.mysql.mysql_base import MySQLBase
 from src.utils.log_utils import setup_logging
 from src.session.session_manager import SessionManager
+from src.model.llm_client import llm_client
+from src.model.llm_metrics import bind_call_tags, reset_call_tags
+from src.tools.crawler.web_crawlers import web_crawler
 
 # 加载环境变量
 load_dotenv()
@@ -55,6 +60,9 @@ app = FastAPI(title="深度研究助手 - 对客版")
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
 
+# 可以提交入库任务、查看全部调用指标的管理员用户名，逗号分隔
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "admin").split(",") if name.strip()}
+
 # 创建模板引擎
 templates = Jinja2Templates(directory="templates")
 
@@ -89,6 +97,17 @@ init_dialog_database()
 # 包含客户端用户认证路由
 app.include_router(client_auth_router)
 
+@app.on_event("startup")
+async def warm_tokenizers():
+    """启动时在线程中预加载各模型的分词器，避免首个请求在事件循环中同步加载"""
+    await llm_client.warm_tokenizers()
+
+@app.on_event("shutdown")
+async def shutdown_resources():
+    """应用退出时释放共享连接池等资源"""
+    await llm_client.aclose()
+    await web_crawler.aclose()
+
 # 全局代理实例
 agent_instances = {}
 # 创建邮件发送工具实例
@@ -123,6 +142,10 @@ def get_current_user(request: Request):
     except jwt.PyJWTError:
         return None
 
+def is_admin(user: Optional[Dict[str, Any]]) -> bool:
+    """当前用户是否为管理员"""
+    return bool(user) and user.get("username") in ADMIN_USERNAMES
+
 def get_agent(session_id: str) -> DeepresearchAgent:
     """
     获取或创建代理实例
@@ -284,6 +307,133 @@ async def chat_stream(request: Request):
         media_type="text/event-stream"
     )
 
+@app.get("/api/llm/metrics")
+async def llm_metrics(request: Request):
+    """
+    LLM调用指标：按会话或流ID过滤的单次调用记录，以及缓存、限流、端点和级联的汇总统计
+
+    管理员可以查看全部记录和汇总统计，其他用户必须指定自己的session_id，只返回该会话的调用记录
+    """
+    user = get_current_user(request)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="请先登录",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    tags = {key: request.query_params.get(key) for key in ("session_id", "stream_id") if request.query_params.get(key)}
+    if not is_admin(user):
+        if "session_id" not in tags:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="请指定session_id")
+        session = session_manager.get_session(tags["session_id"])
+        if not session:
+            raise HTTPException(status_code=404, detail="会话不存在")
+        if session.get('user_id') != user["user_id"]:
+            raise HTTPException(status_code=403, detail="无权访问此会话")
+        return {"calls": llm_client.get_call_records(**tags)}
+    return {
+        "calls": llm_client.get_call_records(**tags),
+        "cache": llm_client.get_cache_stats(),
+        "rate_limit": llm_client.get_rate_limit_stats(),
+        "endpoints": llm_client.get_endpoint_stats(),
+        "cascade": llm_client.get_cascade_stats(),
+        "prompt_cache": llm_client.get_prompt_cache_stats(),
+        "structured_output": llm_client.get_structured_output_stats(),
+        "batch": llm_client.get_batch_stats(),
+        "tokenizers": llm_client.get_tokenizer_stats()
+    }
+
+@app.get("/api/crawler/metrics")
+async def crawler_metrics(request: Request):
+    """
+    抓取层指标：浏览器池的浏览器数、页面占用率和回收统计
+    """
+    user = get_current_user(request)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="请先登录",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return web_crawler.get_fetch_stats()
+
+# 后台入库任务 job_id -> 状态，任务对象单独持有引用避免被回收
+ingest_jobs: Dict[str, Dict[str, Any]] = {}
+ingest_tasks: set = set()
+# 已结束的任务保留时长（秒）与最多保留的任务数
+INGEST_JOB_TTL = int(os.getenv("INGEST_JOB_TTL", "3600"))
+INGEST_MAX_JOBS = int(os.getenv("INGEST_MAX_JOBS", "200"))
+
+def evict_ingest_jobs():
+    """清理超过保留时长的已结束任务，任务数仍超过上限时按结束时间淘汰最早结束的任务"""
+    now = time.time()
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in ingest_jobs.items() if job.get("finished_at")
+    )
+    for finished_at, job_id in finished:
+        if now - finished_at > INGEST_JOB_TTL or len(ingest_jobs) > INGEST_MAX_JOBS:
+            ingest_jobs.pop(job_id, None)
+
+@app.post("/api/ingest")
+async def ingest_links(request: Request):
+    """
+    提交后台知识库入库任务：抓取链接、通过LLM离线批处理评估质量后写入Milvus，立即返回任务ID
+
+    任务消耗LLM与抓取配额并写入共享知识库，只允许管理员提交
+    """
+    user = get_current_user(request)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="请先登录",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    if not is_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="仅管理员可以提交入库任务")
+    data = await request.json()
+    links = [link for link in data.get("links", []) if isinstance(link, str) and link]
+    if not links:
+        return JSONResponse(status_code=400, content={"error": "links不能为空"})
+    evict_ingest_jobs()
+    running = sum(1 for job in ingest_jobs.values() if job["status"] == "running")
+    if running >= INGEST_MAX_JOBS:
+        return JSONResponse(status_code=429, content={"error": "进行中的入库任务过多，请稍后再试"})
+    job_id = str(uuid.uuid4())
+    owner = user["user_id"]
+    ingest_jobs[job_id] = {"status": "running", "links": len(links), "owner": owner}
+
+    async def run():
+        bind_call_tags(stream_id=job_id)
+        try:
+            job = {"status": "completed", **await web_crawler.ingest_links(links, data.get("query"))}
+        except Exception as e:
+            logger.error(f"入库任务失败 [job_id={job_id}]: {str(e)}", exc_info=True)
+            job = {"status": "failed", "error": str(e)}
+        ingest_jobs[job_id] = {**job, "owner": owner, "finished_at": time.time()}
+
+    task = asyncio.create_task(run())
+    ingest_tasks.add(task)
+    task.add_done_callback(ingest_tasks.discard)
+    return {"job_id": job_id}
+
+@app.get("/api/ingest/{job_id}")
+async def ingest_status(job_id: str, request: Request):
+    """查询后台入库任务状态，只能查询自己提交的任务"""
+    user = get_current_user(request)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="请先登录",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    evict_ingest_jobs()
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+    if job["owner"] != user["user_id"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权访问此任务")
+    return {key: value for key, value in job.items() if key != "owner"}
+
 @app.post("/api/abort")
 async def abort_stream(request: Request):
     """
@@ -325,6 +475,8 @@ async def process_chat_request(stream_id: str, user: Dict[str, Any], session_id:
         "session_id": session_id,
         "message": message
     }
+    # 本次请求内的LLM调用指标都带上会话与流ID
+    tag_token = bind_call_tags(session_id=session_id, stream_id=stream_id)
     agent = get_agent(session_id)
     full_think = ""
     full_content = ""
@@ -359,6 +511,11 @@ async def process_chat_request(stream_id: str, user: Dict[str, Any], session_id:
         if stream_id in active_streams:
             active_streams[stream_id]["active"] = False
             logger.info(f"流处理完成 [stream_id={stream_id}]")
+        # 生成器由其他上下文关闭时无法恢复，此时标签只留在已结束的上下文中
+        try:
+            reset_call_tags(tag_token)
+        except ValueError:
+            pass
 
 async def send_email_with_results(query: str, think: str, content: str, email: str = None):
     """
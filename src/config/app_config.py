@@ -12,6 +12,11 @@ class LLMConfig(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 4096
     use_tool_model: str = "qwen2.5-72b-instruct"
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    request_timeout: float = 120.0
+    max_retries: int = 2
 
 
 class AppConfig(BaseModel):
@@ -40,6 +45,11 @@ class AppConfig(BaseModel):
                 temperature=float(os.getenv("LLM_TEMPERATURE", "0.7")),
                 max_tokens=int(os.getenv("LLM_MAX_TOKENS", "4096")),
                 use_tool_model=os.getenv("LLM_USE_TOOL_MODEL", "qwen2.5-72b-instruct"),
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+                request_timeout=float(os.getenv("LLM_REQUEST_TIMEOUT", "120")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
             )
         )
 
@@ -0,0 +1,154 @@
+"""
+模型级联路由模块
+按调用类型配置级联规则：先让快速模型给出带confidence字段的判断，置信度不足、结果无法解析
+或prompt超过大小阈值时再交给重型推理模型，并统计升级率与节省的延迟
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from src.utils.json_parser import str2Json
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_INSTRUCTION = """
+
+    额外要求：在输出JSON的顶层增加confidence字段（如果输出包含results数组，则在results的每个元素中增加），
+    取值0到1之间的小数，表示你对本次判断的把握程度，没有把握时如实给出较低的值
+    """
+
+
+class CascadeRule:
+    """
+    单个调用类型的级联规则
+
+    Args:
+        call_type: 调用类型
+        fast_model: 先尝试的快速模型
+        confidence_threshold: 快速模型置信度达到该值时直接采用其结果
+        max_prompt_tokens: prompt超过该token数时直接使用重型模型
+    """
+
+    def __init__(self, call_type: str, fast_model: str, confidence_threshold: float = 0.8,
+                 max_prompt_tokens: int = 8000):
+        self.call_type = call_type
+        self.fast_model = fast_model
+        self.confidence_threshold = confidence_threshold
+        self.max_prompt_tokens = max_prompt_tokens
+
+
+class CascadeRouter:
+    """
+    级联路由器
+
+    LLM_CASCADE_RULES 环境变量为JSON，例如：
+        {"quality": {"fast_model": "qwen-turbo-latest", "confidence_threshold": 0.8, "max_prompt_tokens": 8000},
+         "evaluate": {"fast_model": "qwen-plus-latest", "confidence_threshold": 0.85}}
+    未配置的调用类型不走级联
+    """
+
+    def __init__(self, rules: Optional[Dict[str, CascadeRule]] = None):
+        self.rules = rules or {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @classmethod
+    def from_env(cls) -> "CascadeRouter":
+        rules = {}
+        raw = os.getenv("LLM_CASCADE_RULES", "")
+        if raw:
+            try:
+                for call_type, conf in json.loads(raw).items():
+                    rules[call_type] = CascadeRule(
+                        call_type=call_type,
+                        fast_model=conf["fast_model"],
+                        confidence_threshold=float(conf.get("confidence_threshold", 0.8)),
+                        max_prompt_tokens=int(conf.get("max_prompt_tokens", 8000))
+                    )
+            except Exception as e:
+                logger.error(f"解析LLM_CASCADE_RULES失败，不启用模型级联: {str(e)}")
+                rules = {}
+        return cls(rules)
+
+    def rule_for(self, call_type: Optional[str]) -> Optional[CascadeRule]:
+        return self.rules.get(call_type) if call_type else None
+
+    @staticmethod
+    def with_confidence_instruction(prompt: str) -> str:
+        return prompt + CONFIDENCE_INSTRUCTION
+
+    @staticmethod
+    def extract_confidence(response: Optional[str]) -> Optional[float]:
+        """从快速模型输出中提取置信度，批量结果取各元素的最小值，无法解析时返回None"""
+        data = str2Json(response) if response else None
+        if not isinstance(data, dict):
+            return None
+        values = []
+        if isinstance(data.get("results"), list):
+            values = [item.get("confidence") for item in data["results"] if isinstance(item, dict)]
+            if not values:
+                return None
+        else:
+            values = [data.get("confidence")]
+        try:
+            return min(float(v) for v in values)
+        except (TypeError, ValueError):
+            return None
+
+    def _bucket(self, call_type: str) -> Dict[str, float]:
+        return self._stats.setdefault(call_type, {
+            "calls": 0,
+            "accepted": 0,
+            "escalated_low_confidence": 0,
+            "escalated_unparsable": 0,
+            "escalated_fast_error": 0,
+            "skipped_too_large": 0,
+            "fast_latency": 0.0,
+            "accepted_fast_latency": 0.0,
+            "heavy_calls": 0,
+            "heavy_latency": 0.0
+        })
+
+    def record_fast(self, call_type: str, latency: float, outcome: str):
+        """
+        记录一次快速模型调用
+
+        Args:
+            outcome: accepted / low_confidence / unparsable / fast_error
+        """
+        bucket = self._bucket(call_type)
+        bucket["calls"] += 1
+        bucket["fast_latency"] += latency
+        if outcome == "accepted":
+            bucket["accepted"] += 1
+            bucket["accepted_fast_latency"] += latency
+        else:
+            bucket[f"escalated_{outcome}"] += 1
+
+    def record_skip(self, call_type: str):
+        bucket = self._bucket(call_type)
+        bucket["calls"] += 1
+        bucket["skipped_too_large"] += 1
+
+    def record_heavy(self, call_type: str, latency: float):
+        bucket = self._bucket(call_type)
+        bucket["heavy_calls"] += 1
+        bucket["heavy_latency"] += latency
+
+    def get_stats(self) -> Dict[str, Any]:
+        """按调用类型统计升级率与节省的延迟（按重型模型平均延迟估算）"""
+        stats = {}
+        for call_type, bucket in self._stats.items():
+            calls = bucket["calls"]
+            heavy_avg = bucket["heavy_latency"] / bucket["heavy_calls"] if bucket["heavy_calls"] else None
+            escalated = calls - bucket["accepted"]
+            stats[call_type] = {
+                **bucket,
+                "escalation_rate": escalated / calls if calls else 0.0,
+                "heavy_avg_latency": heavy_avg,
+                "latency_saved": (bucket["accepted"] * heavy_avg - bucket["accepted_fast_latency"]) if heavy_avg is not None else None,
+                # 升级的调用额外花费了快速模型的时间
+                "latency_wasted": bucket["fast_latency"] - bucket["accepted_fast_latency"]
+            }
+        return stats
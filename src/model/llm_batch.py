@@ -0,0 +1,166 @@
+"""
+LLM离线批处理模块
+把不要求实时返回的后台调用（知识库入库时的文章质量评估等）写成OpenAI格式的批处理文件提交，
+轮询直到批任务结束后下载结果；批处理按批量价格计费，且不占用交互式调用的RPM/TPM配额
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class LLMBatchRunner:
+    """
+    OpenAI兼容的批处理接口封装
+
+    每个请求体对应批处理文件中的一行，custom_id为请求在列表中的序号；
+    超过max_requests的请求拆成多个批任务并行提交。未启用时由调用方回退为逐条的BULK优先级请求
+    """
+
+    def __init__(self, enabled: bool = False, completion_window: str = "24h", poll_interval: float = 30.0,
+                 timeout: float = 86400.0, max_requests: int = 50000):
+        self.enabled = enabled
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_requests = max(1, max_requests)
+        self.stats = {
+            "batches": 0, "requests": 0, "succeeded": 0, "failed": 0, "timeouts": 0,
+            "prompt_tokens": 0, "completion_tokens": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMBatchRunner":
+        return cls(
+            enabled=os.getenv("LLM_BATCH_ENABLED", "false").lower() == "true",
+            completion_window=os.getenv("LLM_BATCH_COMPLETION_WINDOW", "24h"),
+            poll_interval=float(os.getenv("LLM_BATCH_POLL_INTERVAL", "30")),
+            timeout=float(os.getenv("LLM_BATCH_TIMEOUT", "86400")),
+            max_requests=int(os.getenv("LLM_BATCH_MAX_REQUESTS", "50000"))
+        )
+
+    async def run(self, client: openai.AsyncOpenAI, bodies: List[Dict[str, Any]],
+                  metadata: Optional[Dict[str, str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        提交批处理并等待完成
+
+        Args:
+            client: 端点的AsyncOpenAI客户端
+            bodies: chat.completions请求体列表
+            metadata: 附加到批任务上的元数据
+        Returns:
+            List[Optional[Dict[str, Any]]]: 与bodies顺序一致的chat.completion响应体，失败的请求为None
+        """
+        chunks = [bodies[i:i + self.max_requests] for i in range(0, len(bodies), self.max_requests)]
+        results = await asyncio.gather(*(
+            self._run_chunk(client, chunk, offset * self.max_requests, metadata)
+            for offset, chunk in enumerate(chunks)
+        ))
+        merged: Dict[int, Dict[str, Any]] = {}
+        for result in results:
+            merged.update(result)
+        return [merged.get(index) for index in range(len(bodies))]
+
+    async def _run_chunk(self, client: openai.AsyncOpenAI, bodies: List[Dict[str, Any]], offset: int,
+                         metadata: Optional[Dict[str, str]]) -> Dict[int, Dict[str, Any]]:
+        lines = [
+            json.dumps({"custom_id": str(offset + index), "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                       ensure_ascii=False)
+            for index, body in enumerate(bodies)
+        ]
+        self.stats["batches"] += 1
+        self.stats["requests"] += len(bodies)
+        try:
+            input_file = await client.files.create(
+                file=(f"batch-{int(time.time())}-{offset}.jsonl", "\n".join(lines).encode("utf-8")),
+                purpose="batch"
+            )
+            batch = await client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=self.completion_window,
+                metadata=metadata
+            )
+            logger.info(f"已提交LLM批处理任务 {batch.id}，共{len(bodies)}个请求")
+            batch = await self._wait(client, batch.id)
+        except Exception as e:
+            logger.error(f"LLM批处理任务提交或查询失败，共{len(bodies)}个请求: {str(e)}")
+            self.stats["failed"] += len(bodies)
+            return {}
+
+        results: Dict[int, Dict[str, Any]] = {}
+        if batch is not None and batch.output_file_id:
+            for item in await self._download(client, batch.output_file_id):
+                response = item.get("response") or {}
+                body = response.get("body")
+                if response.get("status_code") == 200 and isinstance(body, dict):
+                    results[int(item["custom_id"])] = body
+                    usage = body.get("usage") or {}
+                    self.stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+                    self.stats["completion_tokens"] += usage.get("completion_tokens") or 0
+        if batch is not None and batch.error_file_id:
+            errors = await self._download(client, batch.error_file_id)
+            if errors:
+                logger.warning(f"LLM批处理任务 {batch.id} 有{len(errors)}个请求失败，"
+                               f"示例: {json.dumps(errors[0].get('error'), ensure_ascii=False)}")
+        self.stats["succeeded"] += len(results)
+        self.stats["failed"] += len(bodies) - len(results)
+        return results
+
+    async def _wait(self, client: openai.AsyncOpenAI, batch_id: str):
+        """轮询批任务直到结束，超时后取消并返回None"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            batch = await client.batches.retrieve(batch_id)
+            if batch.status in TERMINAL_STATUSES:
+                if batch.status != "completed":
+                    logger.warning(f"LLM批处理任务 {batch_id} 结束状态: {batch.status}")
+                return batch
+            if time.monotonic() >= deadline:
+                self.stats["timeouts"] += 1
+                logger.error(f"LLM批处理任务 {batch_id} 超过{self.timeout}秒未完成，取消任务")
+                try:
+                    await client.batches.cancel(batch_id)
+                except Exception as e:
+                    logger.warning(f"取消LLM批处理任务 {batch_id} 失败: {str(e)}")
+                return None
+            await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    async def _download(client: openai.AsyncOpenAI, file_id: str) -> List[Dict[str, Any]]:
+        try:
+            content = await client.files.content(file_id)
+        except Exception as e:
+            logger.error(f"下载LLM批处理结果文件 {file_id} 失败: {str(e)}")
+            return []
+        items = []
+        for line in content.text.splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logger.warning(f"跳过无法解析的批处理结果行: {line[:200]}")
+        return items
+
+    @staticmethod
+    def content_of(completion: Optional[Dict[str, Any]]) -> Optional[str]:
+        """从chat.completion响应体中取出回答文本"""
+        if not completion:
+            return None
+        choices = completion.get("choices") or []
+        if not choices:
+            return None
+        return (choices[0].get("message") or {}).get("content")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
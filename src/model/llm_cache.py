@@ -0,0 +1,197 @@
+"""
+LLM响应缓存模块
+按 模型 + prompt哈希 + 采样参数 对响应做内容寻址缓存，分进程内LRU和Redis共享两级，
+并对相同key的并发请求做合并，只向远端发起一次调用
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    LLM响应两级缓存
+
+    一级为进程内LRU（带过期时间），二级为Redis（带TTL，多worker共享）
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: int = 86400,
+                 redis_client: Any = None, key_prefix: str = "llm_cache:"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 进行中的调用 -> 等待它的请求数，最后一个等待者取消时取消调用本身
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "bypassed": 0,
+            "abandoned": 0,
+            "errors": 0
+        }
+
+    @classmethod
+    def from_env(cls) -> "LLMResponseCache":
+        """根据环境变量创建缓存，Redis未配置或不可用时只使用进程内缓存"""
+        redis_client = None
+        redis_host = os.getenv("REDIS_HOST")
+        if redis_host and os.getenv("LLM_CACHE_REDIS_ENABLED", "true").lower() == "true":
+            try:
+                import redis.asyncio as aioredis
+                redis_client = aioredis.Redis(
+                    host=redis_host,
+                    port=int(os.getenv("REDIS_PORT", "6379")),
+                    db=int(os.getenv("REDIS_DB", "0")),
+                    password=os.getenv("REDIS_PASSWORD", None),
+                    decode_responses=True,
+                    socket_connect_timeout=1,
+                    socket_timeout=1
+                )
+            except Exception as e:
+                logger.warning(f"LLM缓存Redis初始化失败，仅使用进程内缓存: {str(e)}")
+                redis_client = None
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+            ttl=int(os.getenv("LLM_CACHE_TTL", "86400")),
+            redis_client=redis_client
+        )
+
+    @staticmethod
+    def make_key(model: str, messages: Any, **params) -> str:
+        """
+        生成缓存key
+
+        Args:
+            model: 模型名称
+            messages: 请求消息列表
+            params: 影响输出的采样参数（temperature、max_tokens、tools等）
+        Returns:
+            str: sha256十六进制摘要
+        """
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """依次查询进程内缓存和Redis，命中Redis时回填进程内缓存"""
+        entry = self._local.get(key)
+        if entry is not None:
+            value, expire_at = entry
+            if expire_at > time.monotonic():
+                self._local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return value
+            self._local.pop(key, None)
+        if self.redis_client is not None:
+            try:
+                value = await self.redis_client.get(self.key_prefix + key)
+                if value is not None:
+                    self._set_local(key, value)
+                    self.stats["redis_hits"] += 1
+                    return value
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.debug(f"读取Redis LLM缓存失败: {str(e)}")
+        return None
+
+    async def set(self, key: str, value: str):
+        """写入两级缓存"""
+        self._set_local(key, value)
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(self.key_prefix + key, value, ex=self.ttl)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.debug(f"写入Redis LLM缓存失败: {str(e)}")
+
+    def _set_local(self, key: str, value: str):
+        self._local[key] = (value, time.monotonic() + self.ttl)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get_or_create(self, key: str, factory: Callable[[], Awaitable[str]]) -> str:
+        """
+        查询缓存，未命中时调用factory生成并写入缓存；相同key的并发请求共享同一次调用，
+        所有等待者都取消时（如流式解析提前结束）同时取消共享的调用，不让远端继续生成
+
+        Args:
+            key: 缓存key
+            factory: 未命中时实际发起LLM调用的协程工厂
+        Returns:
+            str: 响应文本
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.ensure_future(self._create(key, factory))
+            self._inflight[key] = task
+        return await self._wait(task)
+
+    async def _wait(self, task: asyncio.Future) -> str:
+        # shield使单个等待者取消时不影响其他等待者，引用计数归零时再取消调用本身
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                self.stats["abandoned"] += 1
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    async def _create(self, key: str, factory: Callable[[], Awaitable[str]]) -> str:
+        try:
+            value = await factory()
+            # 空响应通常意味着调用异常，不写入缓存
+            if value:
+                await self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def aclose(self):
+        """关闭Redis连接"""
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.close()
+            except Exception as e:
+                logger.debug(f"关闭Redis LLM缓存连接失败: {str(e)}")
+
+    def record_bypass(self):
+        """记录一次跳过缓存的调用"""
+        self.stats["bypassed"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取命中统计，saved_calls为节省的远端调用次数"""
+        stats = dict(self.stats)
+        stats["saved_calls"] = stats["local_hits"] + stats["redis_hits"] + stats["coalesced"]
+        lookups = stats["saved_calls"] + stats["misses"]
+        stats["hit_rate"] = stats["saved_calls"] / lookups if lookups else 0.0
+        stats["local_entries"] = len(self._local)
+        return stats
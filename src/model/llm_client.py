@@ -1,90 +1,216 @@
 import os
 import logging
 import json
-from typing import Dict, Any, Optional, List, AsyncGenerator
+from typing import Dict, Any, Optional, List, AsyncGenerator, Callable, Tuple
 import time
 import asyncio
 import openai
-from src.prompts.prompt_templates import PromptTemplates
+import httpx
+from src.prompts.prompt_assembler import PromptAssembler, TRUNCATION_MARKER
 from src.config.app_config import app_config
-import tiktoken
+from src.model.llm_cache import LLMResponseCache
+from src.model.rate_limiter import LLMRateLimiter, RequestPriority
+from src.model.llm_endpoints import LLMEndpoint, LLMEndpointPool, normalize_api_base
+from src.model.local_backend import LocalBackendBusy
+from src.model.token_counter import TokenCounter
+from src.model.tokenizer_registry import TokenizerRegistry
+from src.model.model_limits import ModelLimits
+from src.model.cascade_router import CascadeRouter, CascadeRule
+from src.model.llm_metrics import LLMMetrics, RingBufferSink, current_record
+from src.model.structured_output import StructuredOutput
+from src.model.llm_batch import LLMBatchRunner
+from src.prompts.output_schemas import OUTPUT_SCHEMAS
+from src.utils.json_parser import str2Json
+from src.utils.json_stream_parser import StreamingJSONParser
+from src.utils.json_repair import coerce_to_schema, missing_required
 
 logger = logging.getLogger(__name__)
 
+class CallType:
+    """LLM调用类型，用于端点路由和统计"""
+    DEFAULT = "default"
+    SUMMARY = "summary"
+    EVALUATE = "evaluate"
+    QUALITY = "quality"
+    COMPRESSION = "compression"
+
 class LLMClient:
     """
     LLM客户端，封装对LLM API的调用
     """
     
     def __init__(self, api_key: str, model: str = "deepseek-r1", api_base: str = None,
-                temperature: float = 0.7, max_tokens: int = 4096, use_tool_model: str = None):
+                temperature: float = 0.7, max_tokens: int = 4096, use_tool_model: str = None,
+                max_connections: int = 100, max_keepalive_connections: int = 20,
+                keepalive_expiry: float = 30.0, request_timeout: float = 120.0, max_retries: int = 2,
+                cache: Optional[LLMResponseCache] = None, rate_limiter: Optional[LLMRateLimiter] = None,
+                cascade_router: Optional[CascadeRouter] = None, metrics: Optional[LLMMetrics] = None,
+                structured_output: Optional[StructuredOutput] = None,
+                batch_runner: Optional[LLMBatchRunner] = None,
+                tokenizer_registry: Optional[TokenizerRegistry] = None, model_limits: Optional[ModelLimits] = None):
         self.api_key = api_key
         self.model = model
         self.api_base = api_base
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.use_tool_model = use_tool_model
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.request_timeout = request_timeout
+        self.max_retries = max(1, max_retries)
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.cascade_router = cascade_router
+        self.metrics = metrics or LLMMetrics()
+        self.structured_output = structured_output or StructuredOutput()
+        self.batch_runner = batch_runner or LLMBatchRunner()
+        self.tokenizer_registry = tokenizer_registry or TokenizerRegistry()
+        self.model_limits = model_limits or ModelLimits()
+        self.client: Optional[openai.AsyncOpenAI] = None
+        self.http_client: Optional[httpx.AsyncClient] = None
+        self.endpoint_pool: Optional[LLMEndpointPool] = None
         self._init_client()
         self.token_limit = self._get_model_token_limit(model)
-        logger.info(f"使用模型 {model}，token限制: {self.token_limit}")
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        logger.info(f"使用模型 {model}，token限制: {self.token_limit}，分词器: {self.tokenizer_registry.tokenizer_name(model)}")
+        self._prompt_assemblers: Dict[int, PromptAssembler] = {}
+        # 流式请求要求服务端在最后一个分片返回usage，用于统计前缀缓存命中的prompt token
+        self.stream_include_usage = os.getenv("LLM_STREAM_INCLUDE_USAGE", "true").lower() == "true"
+        self.prompt_cache_stats: Dict[str, Dict[str, int]] = {}
             
     def _get_model_token_limit(self, model: str) -> int:
         """获取模型的token限制"""
-        model_limits = {
-            "qwen2.5-72b-instruct": 128000,
-            "qwen-turbo-latest": 1000000,
-            "qwq-32b": 128000,
-            "deepseek-r1": 64000
-        }
-        return model_limits.get(model.lower(), 64000)
+        return self.model_limits.context_limit(model)
+
+    def token_counter_for(self, model: Optional[str] = None) -> TokenCounter:
+        """获取模型对应分词器的TokenCounter，None表示默认模型"""
+        return self.tokenizer_registry.counter_for(model or self.model)
+
+    async def warm_tokenizers(self):
+        """预加载默认模型、各调用类型配置的模型、级联快速模型和端点模型的分词器"""
+        models = {self.model, self.use_tool_model, self.structured_output.reask_model}
+        models.update(os.getenv(name) for name in (
+            "ARTICLE_QUALITY_MODEL", "COMPRESSION_MODEL", "EVALUATE_INFORMATION_MODEL"
+        ))
+        if self.cascade_router is not None:
+            models.update(rule.fast_model for rule in self.cascade_router.rules.values())
+        if self.endpoint_pool is not None:
+            models.update(endpoint.model for endpoints in self.endpoint_pool.roles.values() for endpoint in endpoints)
+        await self.tokenizer_registry.warm(models)
+
+    def prompt_assembler_for(self, model: Optional[str] = None) -> PromptAssembler:
+        """获取按模型分词器计数的prompt组装器，共用同一分词器的模型共享组装器"""
+        counter = self.token_counter_for(model)
+        assembler = self._prompt_assemblers.get(id(counter))
+        if assembler is None:
+            assembler = self._prompt_assemblers[id(counter)] = PromptAssembler(counter)
+        return assembler
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        return self.token_counter_for(self.model)
+
+    @property
+    def tokenizer(self):
+        return self.token_counter.tokenizer
+
+    @property
+    def prompt_assembler(self) -> PromptAssembler:
+        return self.prompt_assembler_for(self.model)
     
-    def count_tokens(self, text: str) -> int:
-        """计算文本的token数量"""
-        if not text:
-            return 0
-        try:
-            return len(self.tokenizer.encode(text))
-        except Exception as e:
-            logger.warning(f"计算token数量时出错: {e}，使用估算方法")
-            chinese_count = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
-            return chinese_count * 2 + (len(text) - chinese_count)
+    def count_tokens(self, text: str, approximate: bool = False, model: Optional[str] = None) -> int:
+        """
+        计算文本的token数量，结果按内容哈希缓存
+        
+        Args:
+            text: 文本
+            approximate: 是否使用校准后的快速估算，适用于预算检查
+            model: 按该模型的分词器计数，None表示默认模型
+        """
+        return self.token_counter_for(model).count(text, approximate=approximate)
+
+    def count_tokens_batch(self, texts: List[str], approximate: bool = False, model: Optional[str] = None) -> List[int]:
+        """批量计算多段文本的token数量，未缓存的文本批量编码"""
+        return self.token_counter_for(model).count_batch(texts, approximate=approximate)
             
+    def prompt_token_budget(self, model: str = None, max_tokens: Optional[int] = None,
+                            system_message: Optional[str] = None) -> int:
+        """
+        计算prompt可用的token数：模型上下文长度 - 预留的生成长度 - 系统消息
+        
+        Args:
+            model: 模型名称，None表示默认模型
+            max_tokens: 预留的生成长度，None表示使用默认值
+            system_message: 系统消息
+        """
+        limit = self._get_model_token_limit(model or self.model)
+        reserved = max_tokens if max_tokens is not None else self.max_tokens
+        system_tokens = self.count_tokens(system_message, model=model) if system_message else 0
+        return max(0, limit - reserved - system_tokens)
+
     def _truncate_prompt(self, prompt: str, system_message: str = None, model: str = None) -> str:
-        """截断prompt以确保不超过模型token限制"""
-        system_tokens = self.count_tokens(system_message) if system_message else 0
-        available_tokens = self._get_model_token_limit(model) - system_tokens
-        prompt_tokens = self.count_tokens(prompt)
+        """截断prompt以确保不超过模型token限制，按token精确截断；正常情况下prompt已由PromptAssembler装入预算"""
+        system_tokens = self.count_tokens(system_message, model=model) if system_message else 0
+        available_tokens = self._get_model_token_limit(model or self.model) - system_tokens
+        prompt_tokens = self.count_tokens(prompt, model=model)
         if prompt_tokens > available_tokens:
-            truncation_ratio = available_tokens / prompt_tokens
-            logger.warning(f"输入过长 ({prompt_tokens} tokens)，截断至 {available_tokens} tokens (比例: {truncation_ratio:.2f})")
-            truncated_length = int(len(prompt) * truncation_ratio * 0.9)
-            prompt = prompt[:truncated_length] + "\n\n[注：由于内容过长，部分输入已被截断]"
+            logger.warning(f"输入过长 ({prompt_tokens} tokens)，截断至 {available_tokens} tokens")
+            marker = "\n\n" + TRUNCATION_MARKER
+            keep_tokens = max(0, available_tokens - self.count_tokens(marker, model=model))
+            tokenizer = self.token_counter_for(model).tokenizer
+            prompt = tokenizer.decode(tokenizer.encode_ordinary(prompt)[:keep_tokens], errors="ignore") + marker
         return prompt
     
     def _init_client(self):
-        """初始化API客户端"""
+        """初始化异步API客户端，所有端点共享同一个连接池（keep-alive复用连接）"""
         try:
-            openai.api_key = self.api_key
+            self.api_base = normalize_api_base(self.api_base)
             if "dashscope" in self.api_base:
-                if self.api_base.endswith('/'):
-                    self.api_base = self.api_base[:-1]
-                if "/chat/completions" in self.api_base:
-                    self.api_base = self.api_base.replace("/chat/completions", "")
-                if self.api_base.endswith('v1'):
-                    self.api_base = f"{self.api_base}/"
                 logger.info(f"检测到DashScope API，使用基础URL: {self.api_base}")
-            openai.base_url = self.api_base
-            logger.info(f"初始化LLM客户端，模型: {self.model}")
+            self.http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=httpx.Timeout(self.request_timeout, connect=10.0)
+            )
+            # 重试由generate自行以异步退避方式处理，端点内关闭SDK内置重试避免重复
+            primary = LLMEndpoint(
+                name="primary",
+                api_base=self.api_base,
+                api_key=self.api_key,
+                http_client=self.http_client
+            )
+            self.endpoint_pool = LLMEndpointPool.from_env(primary, self.api_key, self.http_client)
+            self.client = primary.client
+            logger.info(f"初始化LLM客户端，模型: {self.model}，最大连接数: {self.max_connections}，"
+                        f"端点数: {len(self.endpoint_pool.all_endpoints())}")
         except Exception as e:
             logger.error(f"初始化OpenAI客户端时出错: {e}", exc_info=True)
+
+    async def aclose(self):
+        """关闭底层HTTP连接池，应用退出时调用"""
+        try:
+            if self.http_client is not None:
+                await self.http_client.aclose()
+        except Exception as e:
+            logger.warning(f"关闭LLM客户端连接池时出错: {e}")
+        if self.cache is not None:
+            await self.cache.aclose()
     
     async def generate(self, prompt: str, max_tokens: Optional[int] = None, 
                      temperature: Optional[float] = None, 
                      tools: Optional[List[Dict[str, Any]]] = None,
                      system_message: Optional[str] = None,
                      model: Optional[str] = None,
-                     use_tool_model: Optional[str] = None) -> str:
+                     use_tool_model: Optional[str] = None,
+                     use_cache: bool = True,
+                     priority: int = RequestPriority.NORMAL,
+                     call_type: str = CallType.DEFAULT,
+                     cascade: bool = True,
+                     stream_sink: Optional[StreamingJSONParser] = None,
+                     response_format: Optional[Dict[str, Any]] = None) -> str:
         """
         生成文本
         
@@ -94,61 +220,560 @@ class LLMClient:
             temperature: 温度参数，None表示使用默认值
             tools: 可用工具列表
             system_message: 系统消息
+            use_cache: 是否使用响应缓存，需要每次重新采样的调用传False
+            priority: 限流排队优先级，交互式调用使用INTERACTIVE，后台批量调用使用BULK
+            call_type: 调用类型，决定使用哪组端点和级联规则
+            cascade: 是否按call_type的级联规则先调用快速模型
+            stream_sink: 增量JSON解析器，流式输出时逐段喂入，顶层对象闭合后提前结束生成
+            response_format: 服务端结构化输出参数（json_object / json_schema），None表示不限制
             
         Returns:
             str: 生成的文本
         """
         if not model:
             model = self.model
+        rule = self.cascade_router.rule_for(call_type) if cascade and self.cascade_router is not None else None
+        if rule is not None and not tools and model != rule.fast_model:
+            return await self._generate_with_cascade(
+                rule, prompt, max_tokens=max_tokens, temperature=temperature, system_message=system_message,
+                model=model, use_cache=use_cache, priority=priority, call_type=call_type,
+                stream_sink=stream_sink, response_format=response_format
+            )
         prompt = self._truncate_prompt(prompt, system_message, model)
         messages = []
         if system_message:
             messages.append({"role": "system", "content": system_message})
         messages.append({"role": "user", "content": prompt})
-        max_retries = 2
-        retry_delay = 2
         if not use_tool_model:
             use_tool_model = self.use_tool_model
+        params = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature if temperature is not None else self.temperature,
+            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
+        }
+        if tools:
+            params["model"] = use_tool_model
+            params["tools"] = tools
+        elif response_format:
+            params["response_format"] = response_format
+
+        record = self.metrics.start(call_type, params["model"], priority)
+        try:
+            if not use_cache or self.cache is None:
+                if self.cache is not None:
+                    self.cache.record_bypass()
+                response = await self._request_with_retry(params, priority, call_type, stream_sink)
+            else:
+                cache_key = self.cache.make_key(
+                    params["model"],
+                    messages,
+                    temperature=params["temperature"],
+                    max_tokens=params["max_tokens"],
+                    tools=tools,
+                    response_format=params.get("response_format")
+                )
+                response = await self.cache.get_or_create(cache_key, lambda: self._request_with_retry(params, priority, call_type, stream_sink))
+        except BaseException as e:
+            self.metrics.finish(record, e)
+            raise
+        if record is not None:
+            # 命中缓存或合并到进行中的相同请求时没有发起请求
+            record.cache_hit = record.attempts == 0
+        self.metrics.finish(record)
+        return response
+
+    async def _generate_with_cascade(self, rule: CascadeRule, prompt: str, model: str, call_type: str,
+                                     **kwargs) -> str:
+        """
+        模型级联：先让快速模型输出带置信度的结果，置信度不足、无法解析、调用失败
+        或prompt超过规则的大小阈值时改用原模型
+        """
+        router = self.cascade_router
+        # 快速模型的结果要先检查置信度，只有重型模型的输出才增量喂给解析器
+        stream_sink = kwargs.pop("stream_sink", None)
+        prompt_tokens = self.count_tokens(prompt, model=rule.fast_model)
+        if kwargs.get("system_message"):
+            prompt_tokens += self.count_tokens(kwargs["system_message"], model=rule.fast_model)
+        if prompt_tokens > rule.max_prompt_tokens:
+            router.record_skip(call_type)
+        else:
+            start_time = time.time()
+            outcome = "fast_error"
+            # response_format是按重型模型生成的，换成快速模型支持的方式，避免快速模型因参数不支持而总是失败升级
+            fast_kwargs = {**kwargs, "response_format": self.structured_output.adapt_response_format(
+                rule.fast_model, kwargs.get("response_format"))}
+            try:
+                response = await self.generate(
+                    router.with_confidence_instruction(prompt), model=rule.fast_model,
+                    call_type=call_type, cascade=False, **fast_kwargs
+                )
+                confidence = router.extract_confidence(response)
+                if confidence is None:
+                    outcome = "unparsable"
+                elif confidence >= rule.confidence_threshold:
+                    outcome = "accepted"
+                    return response
+                else:
+                    outcome = "low_confidence"
+            except Exception as e:
+                logger.warning(f"快速模型 {rule.fast_model} 调用失败，升级到 {model}: {str(e)}")
+            finally:
+                router.record_fast(call_type, time.time() - start_time, outcome)
+            logger.info(f"{call_type} 调用升级到 {model}，原因: {outcome}")
+
+        start_time = time.time()
+        response = await self.generate(prompt, model=model, call_type=call_type, cascade=False,
+                                       stream_sink=stream_sink, **kwargs)
+        router.record_heavy(call_type, time.time() - start_time)
+        return response
+
+    async def _request_with_retry(self, params: Dict[str, Any], priority: int = RequestPriority.NORMAL,
+                                  call_type: str = CallType.DEFAULT,
+                                  stream_sink: Optional[StreamingJSONParser] = None) -> str:
+        """
+        发起一次LLM请求，失败时按指数退避异步重试
         
+        Args:
+            params: chat.completions请求参数
+            priority: 限流排队优先级
+            call_type: 调用类型
+            stream_sink: 增量JSON解析器
+            
+        Returns:
+            str: 生成的文本
+        """
+        max_retries = self.max_retries
+        retry_delay = 2
+        prompt_tokens = sum(self.count_tokens_batch([m["content"] for m in params["messages"]], model=params["model"]))
+        record = current_record()
+        if record is not None:
+            record.prompt_tokens = prompt_tokens
         for attempt in range(max_retries):
+            if record is not None:
+                record.attempts += 1
             try:
-                params = {
-                    "model": model,
-                    "messages": messages,
-                    "temperature": temperature if temperature is not None else self.temperature,
-                    "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
-                }
-                if tools:
-                    params["model"] = use_tool_model
-                    params["tools"] = tools
-                if "dashscope" in self.api_base:
-                    params["stream"] = True
-                    full_response = ""
-                    logger.info(f"流式等待: {openai.base_url} {model}")
-                    stream_resp = openai.chat.completions.create(**params)
-                    for chunk in stream_resp:
-                        if hasattr(chunk.choices[0].delta, 'content') and chunk.choices[0].delta.content is not None:
-                            content = chunk.choices[0].delta.content
-                            full_response += content
-                    return full_response
-                else:
-                    logger.info(f"同步: {openai.base_url} {model}")
-                    response = openai.chat.completions.create(**params)
-                    return response.choices[0].message.content
+                return await self._complete_with_failover(params, prompt_tokens, priority, call_type, stream_sink)
             except Exception as e:
                 logger.error(f"调用LLM API时出错 (尝试 {attempt+1}/{max_retries}): {e}", exc_info=True)
                 if attempt < max_retries - 1:
                     sleep_time = retry_delay * (2 ** attempt)
                     logger.info(f"等待 {sleep_time} 秒后重试...")
-                    time.sleep(sleep_time)
+                    await asyncio.sleep(sleep_time)
                 else:
                     logger.error("达到最大重试次数，无法获取LLM响应")
                     raise
+
+    async def _complete_with_failover(self, params: Dict[str, Any], prompt_tokens: int,
+                                      priority: int, call_type: str,
+                                      stream_sink: Optional[StreamingJSONParser] = None) -> str:
+        """
+        按候选端点顺序发起请求
+        
+        主请求超过对冲阈值（首token延迟p95）仍未返回首token时，向下一个端点发起对冲请求，
+        先返回首token的请求胜出，其余请求立即取消；请求失败（包括胜出请求中途失败）且没有其他进行中的请求时转移到下一个端点
+        """
+        pool = self.endpoint_pool
+        candidates = pool.candidates(call_type, prompt_tokens + params["max_tokens"])
+        loop = asyncio.get_running_loop()
+        winner = loop.create_future()
+        running: Dict[asyncio.Task, LLMEndpoint] = {}
+        next_index = 0
+        hedges = 0
+        hedge_deadline = 0.0
+        last_error: Optional[BaseException] = None
+
+        def launch(acquire: bool):
+            nonlocal next_index, hedge_deadline
+            endpoint = candidates[next_index]
+            next_index += 1
+            task = asyncio.create_task(
+                self._stream_completion(endpoint, params, prompt_tokens, priority, winner, acquire, stream_sink)
+            )
+            running[task] = endpoint
+            hedge_deadline = loop.time() + pool.hedge_delay(endpoint)
+
+        # 主请求先在当前协程内排队获取配额，避免排队时间被计入对冲阈值
+        await self._acquire_rate_limit(candidates[0].resolve_model(params["model"]), prompt_tokens, priority)
+        launch(acquire=False)
+        first_task = next(iter(running))
+        try:
+            while True:
+                while not winner.done():
+                    if not running:
+                        if next_index >= len(candidates):
+                            raise last_error
+                        pool.stats["failovers"] += 1
+                        logger.warning(f"LLM端点请求失败，转移到端点 {candidates[next_index].name}: {last_error}")
+                        launch(acquire=True)
+                        continue
+                    timeout = None
+                    if pool.hedge_enabled and hedges < pool.max_hedges and next_index < len(candidates):
+                        timeout = max(0.0, hedge_deadline - loop.time())
+                    done, _ = await asyncio.wait([winner, *running], timeout=timeout,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        hedges += 1
+                        pool.stats["hedged"] += 1
+                        logger.info(f"LLM请求超过对冲阈值仍未返回首token，向端点 {candidates[next_index].name} 发起对冲请求")
+                        launch(acquire=True)
+                        continue
+                    for task in done:
+                        if task is winner:
+                            continue
+                        running.pop(task, None)
+                        if task.exception() is not None:
+                            last_error = task.exception()
+                win_task = winner.result()
+                # 胜出后立即取消其余请求，不再等胜出请求生成完毕，避免落败端点继续生成并占用配额
+                for task in [t for t in running if t is not win_task]:
+                    running.pop(task)
+                    task.cancel()
+                if hedges and win_task is not first_task:
+                    pool.stats["hedge_wins"] += 1
+                try:
+                    return await win_task
+                except Exception as e:
+                    # 胜出请求中途失败时转移到下一个端点，stream_sink重新扫描新的响应且不会重复产出已产出的字段
+                    running.pop(win_task, None)
+                    last_error = e
+                    winner = loop.create_future()
+        finally:
+            for task in running:
+                if not task.done():
+                    task.cancel()
+
+    async def _stream_completion(self, endpoint: LLMEndpoint, params: Dict[str, Any], prompt_tokens: int,
+                                 priority: int, winner: asyncio.Future, acquire: bool = True,
+                                 stream_sink: Optional[StreamingJSONParser] = None) -> str:
+        """
+        向单个端点发起流式请求，收到首个token时登记为胜出请求，返回完整文本
+
+        只有胜出请求的输出会喂给stream_sink，解析器判定顶层JSON对象闭合后关闭流，不再生成多余token
+        """
+        model = endpoint.resolve_model(params["model"])
+        if acquire:
+            await self._acquire_rate_limit(model, prompt_tokens, priority)
+        logger.info(f"流式等待: {endpoint.name} {endpoint.api_base} {model}")
+        start = time.monotonic()
+        ttft = None
+        full_response = ""
+        feeding = False
+        usage = None
+        try:
+            stream_resp = await endpoint.client.chat.completions.create(**self._stream_params(params, model))
+            async for chunk in stream_resp:
+                if getattr(chunk, 'usage', None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if ttft is None and (getattr(delta, 'content', None) or getattr(delta, 'reasoning_content', None)):
+                    ttft = time.monotonic() - start
+                    if not winner.done():
+                        winner.set_result(asyncio.current_task())
+                if getattr(delta, 'content', None) is not None:
+                    full_response += delta.content
+                    if stream_sink is None or not winner.done() or winner.result() is not asyncio.current_task():
+                        continue
+                    if not feeding:
+                        feeding = True
+                        stream_sink.reset()
+                        stream_sink.feed(full_response)
+                    else:
+                        stream_sink.feed(delta.content)
+                    if stream_sink.closed:
+                        logger.info(f"JSON对象已闭合，提前结束生成: {endpoint.name} {model}")
+                        close = getattr(stream_resp, "close", None)
+                        if close is not None:
+                            await close()
+                        break
+        except (asyncio.CancelledError, LocalBackendBusy):
+            # 本地后端排队已满不是故障，不计入熔断
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        endpoint.record_success(ttft)
+        completion_tokens = self.count_tokens(full_response, model=model)
+        self._record_rate_usage(model, completion_tokens)
+        record = current_record()
+        if record is not None:
+            record.endpoint = endpoint.name
+            record.model = model
+            record.ttft = ttft
+            record.completion_tokens = completion_tokens
+        self._record_prompt_usage(model, usage, record)
+        if not winner.done():
+            winner.set_result(asyncio.current_task())
+        return full_response
+
+    def _stream_params(self, params: Dict[str, Any], model: str) -> Dict[str, Any]:
+        """构造流式请求参数"""
+        stream_params = dict(params, model=model, stream=True)
+        if self.stream_include_usage:
+            stream_params["stream_options"] = {"include_usage": True}
+        return stream_params
+
+    @staticmethod
+    def _cached_prompt_tokens(usage) -> int:
+        """从usage中读取命中前缀缓存的prompt token数，兼容OpenAI/DashScope与DeepSeek的字段"""
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if isinstance(details, dict):
+            cached = details.get('cached_tokens')
+        else:
+            cached = getattr(details, 'cached_tokens', None)
+        if cached is None:
+            cached = getattr(usage, 'prompt_cache_hit_tokens', None)
+        return int(cached or 0)
+
+    def _record_prompt_usage(self, model: str, usage, record=None):
+        """按服务端返回的usage记录prompt token与前缀缓存命中情况"""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        cached_tokens = self._cached_prompt_tokens(usage)
+        stats = self.prompt_cache_stats.setdefault(model, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0})
+        stats["requests"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["cached_tokens"] += cached_tokens
+        if record is not None:
+            if prompt_tokens:
+                record.prompt_tokens = prompt_tokens
+            if getattr(usage, 'completion_tokens', None):
+                record.completion_tokens = usage.completion_tokens
+            record.cached_prompt_tokens = cached_tokens
+
+    def get_prompt_cache_stats(self) -> Dict[str, Any]:
+        """获取各模型服务端前缀缓存命中的prompt token比例"""
+        return {
+            model: {**stats, "cached_ratio": stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0}
+            for model, stats in self.prompt_cache_stats.items()
+        }
+
+    async def generate_json_stream(self, prompt: str, schema_key: Optional[str] = None,
+                                   **kwargs) -> AsyncGenerator[Tuple[str, Any], None]:
+        """
+        流式生成JSON对象，顶层字段一生成完毕就产出 (字段名, 值)，顶层对象闭合后停止生成
+
+        调用方可以在需要的字段到达后立即开始后续动作，提前退出迭代时会取消尚未完成的请求
+
+        Args:
+            prompt: 提示词
+            schema_key: OUTPUT_SCHEMAS中的模板名，指定后按模型启用服务端结构化输出，
+                        输出不完整时经修复/重新请求后再产出缺失的字段
+            kwargs: 与generate相同的参数
+        Yields:
+            Tuple[str, Any]: 字段名与解析后的值
+        """
+        if schema_key is not None and "response_format" not in kwargs:
+            kwargs["response_format"] = self.structured_output.response_format(kwargs.get("model") or self.model, schema_key)
+        properties = OUTPUT_SCHEMAS[schema_key].get("properties", {}) if schema_key is not None else {}
+
+        def typed(key: str, value: Any) -> Tuple[str, Any]:
+            # 增量产出的字段同样按schema校正类型，如字符串形式的布尔值
+            return key, coerce_to_schema(value, properties[key]) if key in properties else value
+
+        queue: asyncio.Queue = asyncio.Queue()
+        parser = StreamingJSONParser(on_field=lambda key, value: queue.put_nowait(typed(key, value)))
+        task = asyncio.create_task(self.generate(prompt, stream_sink=parser, **kwargs))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield item
+            response = await task
+            # 缓存命中、级联快速模型的结果以及增量解析失败的字段，按完整响应补齐
+            parser.on_field = None
+            parser.reset()
+            for key, value in parser.feed(response or ""):
+                yield typed(key, value)
+            if schema_key is not None:
+                if parser.closed and not missing_required(parser.fields, OUTPUT_SCHEMAS[schema_key]):
+                    self.structured_output.record_streamed(schema_key)
+                    return
+                data = await self.structured_output.parse(
+                    self, schema_key, response, model=kwargs.get("model"),
+                    priority=kwargs.get("priority", RequestPriority.NORMAL),
+                    call_type=kwargs.get("call_type", CallType.DEFAULT)
+                )
+            else:
+                data = None if parser.closed else (str2Json(response) if response else None)
+            if isinstance(data, dict):
+                for key, value in data.items():
+                    if key not in parser.fields:
+                        parser.fields[key] = value
+                        yield key, value
+        finally:
+            if not task.done():
+                task.cancel()
+
+    async def generate_json(self, prompt: str, stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                            **kwargs) -> Optional[Dict[str, Any]]:
+        """
+        流式生成并解析JSON对象
+
+        Args:
+            prompt: 提示词
+            stop_when: 每收到一个字段调用一次，返回True时不再等待剩余字段（如质量评估已判定为低质量）
+            kwargs: 与generate相同的参数
+        Returns:
+            Optional[Dict[str, Any]]: 解析出的字段，没有任何字段或指定schema_key时缺少必填字段为None
+        """
+        result = {}
+        stopped = False
+        stream = self.generate_json_stream(prompt, **kwargs)
+        try:
+            async for key, value in stream:
+                result[key] = value
+                if stop_when is not None and stop_when(result):
+                    stopped = True
+                    break
+        finally:
+            await stream.aclose()
+        schema_key = kwargs.get("schema_key")
+        if not stopped and schema_key is not None and missing_required(result, OUTPUT_SCHEMAS[schema_key]):
+            # 增量产出了部分字段但完整响应仍缺少必填字段，不返回残缺结果，由调用方走备用策略
+            return None
+        return result or None
+
+    async def generate_batch(self, prompts: List[str], max_tokens: Optional[int] = None,
+                             temperature: Optional[float] = None,
+                             system_message: Optional[str] = None,
+                             model: Optional[str] = None,
+                             call_type: str = CallType.DEFAULT,
+                             response_format: Optional[Dict[str, Any]] = None) -> List[Optional[str]]:
+        """
+        离线批量生成，用于不要求实时返回的后台任务
+
+        启用LLM_BATCH_ENABLED时通过调用类型首选端点的批处理接口一次提交，按批量价格计费且不占用限流配额；
+        未启用时逐条以BULK优先级走普通请求路径
+
+        Args:
+            prompts: 提示词列表
+            max_tokens: 最大生成长度
+            temperature: 温度参数
+            system_message: 所有请求共用的系统消息
+            model: 模型名称
+            call_type: 调用类型，决定使用哪组端点
+            response_format: 服务端结构化输出参数
+        Returns:
+            List[Optional[str]]: 与prompts顺序一致的生成文本，失败的请求为None
+        """
+        if not prompts:
+            return []
+        if not model:
+            model = self.model
+        if not self.batch_runner.enabled:
+            results = await asyncio.gather(*(
+                self.generate(prompt, max_tokens=max_tokens, temperature=temperature, system_message=system_message,
+                              model=model, priority=RequestPriority.BULK, call_type=call_type,
+                              response_format=response_format)
+                for prompt in prompts
+            ), return_exceptions=True)
+            return [result if isinstance(result, str) else None for result in results]
+
+        # 本地推理端点没有批处理接口，取第一个远程端点
+        endpoint = next((e for e in self.endpoint_pool.candidates(call_type) if not e.is_local), self.endpoint_pool.primary)
+        bodies = []
+        for prompt in prompts:
+            messages = []
+            if system_message:
+                messages.append({"role": "system", "content": system_message})
+            messages.append({"role": "user", "content": self._truncate_prompt(prompt, system_message, model)})
+            body = {
+                "model": endpoint.resolve_model(model),
+                "messages": messages,
+                "temperature": temperature if temperature is not None else self.temperature,
+                "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
+            }
+            if response_format:
+                body["response_format"] = response_format
+            bodies.append(body)
+        completions = await self.batch_runner.run(endpoint.client, bodies, metadata={"call_type": call_type})
+        return [LLMBatchRunner.content_of(completion) for completion in completions]
+
+    async def generate_json_batch(self, prompts: List[str], schema_key: str,
+                                  **kwargs) -> List[Optional[Dict[str, Any]]]:
+        """
+        离线批量生成并按schema解析JSON对象
+
+        Args:
+            prompts: 提示词列表
+            schema_key: OUTPUT_SCHEMAS中的模板名
+            kwargs: 与generate_batch相同的参数
+        Returns:
+            List[Optional[Dict[str, Any]]]: 与prompts顺序一致的解析结果，请求失败或无法解析时为None
+        """
+        if "response_format" not in kwargs:
+            kwargs["response_format"] = self.structured_output.response_format(kwargs.get("model") or self.model, schema_key)
+        responses = await self.generate_batch(prompts, **kwargs)
+
+        async def parse(response: Optional[str]) -> Optional[Dict[str, Any]]:
+            if response is None:
+                return None
+            return await self.structured_output.parse(
+                self, schema_key, response, model=kwargs.get("model"),
+                priority=RequestPriority.BULK, call_type=kwargs.get("call_type", CallType.DEFAULT)
+            )
+
+        return list(await asyncio.gather(*(parse(response) for response in responses)))
+
+    async def _acquire_rate_limit(self, model: str, prompt_tokens: int, priority: int) -> float:
+        """按模型获取限流配额，返回排队等待秒数"""
+        if self.rate_limiter is None:
+            return 0.0
+        waited = await self.rate_limiter.acquire(model, prompt_tokens, priority)
+        record = current_record()
+        if record is not None:
+            record.queue_time += waited
+        return waited
+
+    def _record_rate_usage(self, model: str, completion_tokens: int):
+        """按生成内容的token数补扣TPM配额"""
+        if self.rate_limiter is not None and completion_tokens:
+            self.rate_limiter.record_usage(model, completion_tokens)
+
+    def get_rate_limit_stats(self) -> Dict[str, Any]:
+        """获取限流排队统计"""
+        return self.rate_limiter.get_stats() if self.rate_limiter is not None else {}
+
+    def get_endpoint_stats(self) -> Dict[str, Any]:
+        """获取端点健康状况与对冲/故障转移统计"""
+        return self.endpoint_pool.get_stats() if self.endpoint_pool is not None else {}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取响应缓存命中统计"""
+        return self.cache.get_stats() if self.cache is not None else {}
+
+    def get_cascade_stats(self) -> Dict[str, Any]:
+        """获取模型级联的升级率与节省延迟统计"""
+        return self.cascade_router.get_stats() if self.cascade_router is not None else {}
+
+    def get_structured_output_stats(self) -> Dict[str, Any]:
+        """获取各模板JSON输出的解析、修复、重新请求与失败次数"""
+        return self.structured_output.get_stats()
+
+    def get_tokenizer_stats(self) -> Dict[str, Any]:
+        """获取各分词器的计数缓存命中统计和回退原因"""
+        return self.tokenizer_registry.get_stats()
+
+    def get_batch_stats(self) -> Dict[str, Any]:
+        """获取离线批处理的提交、成功与失败统计"""
+        return self.batch_runner.get_stats()
+
+    def get_call_records(self, **tags) -> List[Dict[str, Any]]:
+        """获取内存缓冲区中的调用指标记录，可按session_id、stream_id等标签过滤"""
+        sink = self.metrics.get_sink(RingBufferSink)
+        return sink.records(**tags) if sink is not None else []
     
     async def generate_with_streaming(self, prompt: str,
                                     max_tokens: Optional[int] = None,
                                     temperature: Optional[float] = None,
-                                    system_message: Optional[str] = None) -> AsyncGenerator[str, None]:
+                                    system_message: Optional[str] = None,
+                                    priority: int = RequestPriority.INTERACTIVE) -> AsyncGenerator[str, None]:
         """
         流式生成文本
         
@@ -157,6 +782,7 @@ class LLMClient:
             max_tokens: 最大生成长度
             temperature: 温度
             system_message: 系统消息
+            priority: 限流排队优先级，默认按交互式调用处理
             
         Returns:
             AsyncGenerator[str, None]: 生成的文本流
@@ -170,25 +796,74 @@ class LLMClient:
             "model": self.model,
             "messages": messages,
             "temperature": temperature if temperature is not None else self.temperature,
-            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens,
-            "stream": True
+            "max_tokens": max_tokens if max_tokens is not None else self.max_tokens
         }
-        logger.info(f"流式输出: {openai.base_url} {self.model}")
+        prompt_tokens = sum(self.count_tokens_batch([m["content"] for m in messages], model=self.model))
+        # 异步生成器跨yield执行，调用记录不绑定到上下文，在这里直接填写
+        record = self.metrics.start(CallType.SUMMARY, self.model, priority, streaming=True, bind=False)
+        if record is not None:
+            record.prompt_tokens = prompt_tokens
+        completion = ""
         try:
-            stream_resp = openai.chat.completions.create(**params)
-            for chunk in stream_resp:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if delta:
-                        yield {
-                            "content": delta.content if hasattr(delta, 'content') else "",
-                            "reasoning_content": delta.reasoning_content if hasattr(delta, 'reasoning_content') else ""
-                        }
-        except Exception as e:
+            # 流式输出已开始后无法切换端点，仅在首个分片前失败时转移到下一个端点
+            candidates = self.endpoint_pool.candidates(CallType.SUMMARY, prompt_tokens + params["max_tokens"])
+            for index, endpoint in enumerate(candidates):
+                model = endpoint.resolve_model(self.model)
+                yielded = False
+                try:
+                    waited = await self._acquire_rate_limit(model, prompt_tokens, priority)
+                    if record is not None:
+                        record.attempts += 1
+                        record.queue_time += waited
+                        record.endpoint = endpoint.name
+                        record.model = model
+                    logger.info(f"流式输出: {endpoint.name} {endpoint.api_base} {model}")
+                    start = time.monotonic()
+                    stream_resp = await endpoint.client.chat.completions.create(**self._stream_params(params, model))
+                    usage = None
+                    async for chunk in stream_resp:
+                        if getattr(chunk, 'usage', None):
+                            usage = chunk.usage
+                        if chunk.choices and len(chunk.choices) > 0:
+                            delta = chunk.choices[0].delta
+                            if delta:
+                                if not yielded:
+                                    ttft = time.monotonic() - start
+                                    endpoint.record_success(ttft)
+                                    if record is not None:
+                                        record.ttft = ttft
+                                    yielded = True
+                                completion += (getattr(delta, 'content', None) or "") + (getattr(delta, 'reasoning_content', None) or "")
+                                yield {
+                                    "content": delta.content if hasattr(delta, 'content') else "",
+                                    "reasoning_content": delta.reasoning_content if hasattr(delta, 'reasoning_content') else ""
+                                }
+                    if not yielded:
+                        endpoint.record_success(None)
+                    if record is not None:
+                        record.completion_tokens = self.count_tokens(completion, model=record.model)
+                    self._record_prompt_usage(model, usage, record)
+                    self.metrics.finish(record)
+                    return
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if yielded or index == len(candidates) - 1:
+                        raise
+                    endpoint.record_failure()
+                    self.endpoint_pool.stats["failovers"] += 1
+                    logger.warning(f"端点 {endpoint.name} 流式请求失败，转移到端点 {candidates[index + 1].name}: {e}")
+        except (Exception, asyncio.CancelledError, GeneratorExit) as e:
+            if record is not None:
+                record.completion_tokens = self.count_tokens(completion, model=record.model)
+            self.metrics.finish(record, e)
+            if not isinstance(e, Exception):
+                raise
             logger.error(f"流式生成文本时出错: {e}", exc_info=True)
             try:
                 logger.info("尝试使用非流式方式生成...")
-                non_streaming_response = await self.generate(prompt, max_tokens, temperature, None, system_message)
+                non_streaming_response = await self.generate(prompt, max_tokens, temperature, None, system_message,
+                                                             priority=priority, call_type=CallType.SUMMARY)
                 yield {
                     "content": non_streaming_response,
                     "reasoning_content": ""
@@ -198,4 +873,17 @@ class LLMClient:
 
 llm_client = LLMClient(api_key=app_config.llm.api_key, 
                        model=app_config.llm.model, 
-                       api_base=app_config.llm.api_base)
\ No newline at end of file
+                       api_base=app_config.llm.api_base,
+                       max_connections=app_config.llm.max_connections,
+                       max_keepalive_connections=app_config.llm.max_keepalive_connections,
+                       keepalive_expiry=app_config.llm.keepalive_expiry,
+                       request_timeout=app_config.llm.request_timeout,
+                       max_retries=app_config.llm.max_retries,
+                       cache=LLMResponseCache.from_env() if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true" else None,
+                       rate_limiter=LLMRateLimiter.from_env(),
+                       cascade_router=CascadeRouter.from_env(),
+                       metrics=LLMMetrics.from_env(),
+                       structured_output=StructuredOutput.from_env(),
+                       batch_runner=LLMBatchRunner.from_env(),
+                       tokenizer_registry=TokenizerRegistry.from_env(),
+                       model_limits=ModelLimits.from_env())
\ No newline at end of file
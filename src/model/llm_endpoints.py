@@ -0,0 +1,240 @@
+"""
+LLM多端点管理模块
+维护按调用角色划分的OpenAI兼容端点列表，记录每个端点的首token延迟与失败情况，
+为LLMClient的对冲请求（hedging）和故障转移提供候选端点与对冲阈值
+"""
+
+import os
+import json
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_api_base(api_base: str) -> str:
+    """规范化API基础URL，DashScope兼容模式需要以 /v1/ 结尾且不包含 /chat/completions"""
+    if api_base and "dashscope" in api_base:
+        if api_base.endswith('/'):
+            api_base = api_base[:-1]
+        if "/chat/completions" in api_base:
+            api_base = api_base.replace("/chat/completions", "")
+        if api_base.endswith('v1'):
+            api_base = f"{api_base}/"
+    return api_base
+
+
+class LLMEndpoint:
+    """
+    单个OpenAI兼容端点
+
+    model为空时使用调用方指定的模型，否则固定使用该端点配置的模型；
+    client不为空时（如本地推理后端）直接使用，不创建AsyncOpenAI客户端；
+    context_limit不为空时（如本地后端的n_ctx）输入加输出超过该长度的请求不发往此端点
+    """
+
+    def __init__(self, name: str, api_base: str, api_key: str, http_client: httpx.AsyncClient,
+                 model: Optional[str] = None, failure_threshold: int = 3, cooldown: float = 30.0,
+                 sample_size: int = 200, client: Optional[Any] = None, context_limit: Optional[int] = None):
+        self.name = name
+        self.api_base = normalize_api_base(api_base)
+        self.model = model
+        self.is_local = client is not None
+        self.context_limit = context_limit
+        self.client = client if client is not None else openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=self.api_base,
+            http_client=http_client,
+            max_retries=0
+        )
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.total_requests = 0
+        self.total_failures = 0
+        self._ttft_samples: deque = deque(maxlen=sample_size)
+
+    def resolve_model(self, model: str) -> str:
+        return self.model or model
+
+    def fits(self, tokens: int) -> bool:
+        """输入加输出共tokens个token的请求能否装入该端点的上下文"""
+        return self.context_limit is None or tokens <= self.context_limit
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def record_success(self, ttft: Optional[float]):
+        self.total_requests += 1
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        if ttft is not None:
+            self._ttft_samples.append(ttft)
+
+    def record_failure(self):
+        self.total_requests += 1
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.cooldown_until = time.monotonic() + self.cooldown
+            logger.warning(f"LLM端点 {self.name} 连续失败{self.consecutive_failures}次，熔断{self.cooldown}秒")
+
+    def ttft_percentile(self, percentile: float) -> Optional[float]:
+        """返回首token延迟的分位数，样本不足时返回None"""
+        if len(self._ttft_samples) < 20:
+            return None
+        values = sorted(self._ttft_samples)
+        return values[min(len(values) - 1, int(len(values) * percentile))]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {
+            "api_base": self.api_base,
+            "model": self.model,
+            "healthy": self.healthy,
+            "requests": self.total_requests,
+            "failures": self.total_failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ttft_p50": self.ttft_percentile(0.5),
+            "ttft_p95": self.ttft_percentile(0.95),
+            "context_limit": self.context_limit
+        }
+        if self.is_local and hasattr(self.client, "get_stats"):
+            stats["local"] = self.client.get_stats()
+        return stats
+
+
+class LLMEndpointPool:
+    """
+    按调用角色组织的端点池
+
+    LLM_ENDPOINTS 环境变量为JSON，key为调用类型（default/summary/evaluate/quality/compression），
+    value为端点列表，例如：
+        {"default": [{"name": "deepseek", "api_base": "https://api.deepseek.com/v1",
+                      "api_key_env": "DEEPSEEK_API_KEY", "model": "deepseek-reasoner"}],
+         "quality": [{"name": "qwen-fast", "api_base": "https://dashscope.aliyuncs.com/compatible-mode/v1",
+                      "model": "qwen-turbo-latest"}]}
+    配置local_model_path的端点为进程内llama.cpp后端（可选n_ctx、n_threads、n_gpu_layers、max_queue、chat_format），
+    应在同一角色中放一个远程端点作为排队已满或失败时的转移目标，输入加输出超过n_ctx的请求直接发往其他端点
+    主端点（LLM_API_BASE）总是default列表的第一个；未配置的角色使用default列表
+    """
+
+    def __init__(self, primary: LLMEndpoint, roles: Optional[Dict[str, List[LLMEndpoint]]] = None,
+                 hedge_enabled: bool = True, hedge_percentile: float = 0.95,
+                 hedge_initial_delay: float = 8.0, hedge_min_delay: float = 1.0, max_hedges: int = 1):
+        self.primary = primary
+        self.roles = roles or {}
+        self.roles["default"] = [primary] + [e for e in self.roles.get("default", []) if e is not primary]
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_initial_delay = hedge_initial_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.max_hedges = max_hedges
+        self.stats = {"hedged": 0, "hedge_wins": 0, "failovers": 0, "context_skipped": 0}
+
+    @classmethod
+    def from_env(cls, primary: LLMEndpoint, api_key: str, http_client: httpx.AsyncClient) -> "LLMEndpointPool":
+        roles: Dict[str, List[LLMEndpoint]] = {}
+        raw = os.getenv("LLM_ENDPOINTS", "")
+        failure_threshold = int(os.getenv("LLM_ENDPOINT_FAILURE_THRESHOLD", "3"))
+        cooldown = float(os.getenv("LLM_ENDPOINT_COOLDOWN", "30"))
+        primary.failure_threshold = failure_threshold
+        primary.cooldown = cooldown
+        if raw:
+            try:
+                for role, items in json.loads(raw).items():
+                    endpoints = []
+                    for i, item in enumerate(items):
+                        if item.get("local_model_path"):
+                            endpoints.append(cls._local_endpoint(role, i, item, http_client, failure_threshold, cooldown))
+                            continue
+                        key = os.getenv(item["api_key_env"], "") if item.get("api_key_env") else item.get("api_key", api_key)
+                        endpoints.append(LLMEndpoint(
+                            name=item.get("name", f"{role}-{i}"),
+                            api_base=item["api_base"],
+                            api_key=key,
+                            http_client=http_client,
+                            model=item.get("model"),
+                            failure_threshold=failure_threshold,
+                            cooldown=cooldown
+                        ))
+                    roles[role] = endpoints
+            except Exception as e:
+                logger.error(f"解析LLM_ENDPOINTS失败，仅使用主端点: {str(e)}")
+                roles = {}
+        return cls(
+            primary=primary,
+            roles=roles,
+            hedge_enabled=os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true",
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+            hedge_initial_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "8")),
+            hedge_min_delay=float(os.getenv("LLM_HEDGE_MIN_DELAY", "1")),
+            max_hedges=int(os.getenv("LLM_MAX_HEDGES", "1"))
+        )
+
+    @staticmethod
+    def _local_endpoint(role: str, index: int, item: Dict[str, Any], http_client: httpx.AsyncClient,
+                        failure_threshold: int, cooldown: float) -> LLMEndpoint:
+        from src.model.local_backend import LlamaCppBackend
+        model_path = item["local_model_path"]
+        backend = LlamaCppBackend(
+            model_path=model_path,
+            n_ctx=int(item.get("n_ctx", 8192)),
+            n_threads=item.get("n_threads"),
+            n_gpu_layers=int(item.get("n_gpu_layers", 0)),
+            max_queue=int(item.get("max_queue", 4)),
+            chat_format=item.get("chat_format")
+        )
+        return LLMEndpoint(
+            name=item.get("name", f"{role}-{index}"),
+            api_base=f"local://{os.path.basename(model_path)}",
+            api_key="",
+            http_client=http_client,
+            model=item.get("model") or os.path.splitext(os.path.basename(model_path))[0],
+            failure_threshold=failure_threshold,
+            cooldown=cooldown,
+            client=backend,
+            context_limit=backend.n_ctx
+        )
+
+    def candidates(self, call_type: Optional[str] = None, required_tokens: int = 0) -> List[LLMEndpoint]:
+        """
+        返回候选端点，健康端点按配置顺序在前，熔断中的端点按恢复时间排在最后
+
+        required_tokens为请求的输入加输出token数，上下文装不下的端点（如n_ctx较小的本地后端）在发送前排除，
+        避免请求必然失败并触发熔断；全部被排除时使用主端点
+        """
+        endpoints = self.roles.get(call_type or "default") or self.roles["default"]
+        fitting = [e for e in endpoints if e.fits(required_tokens)]
+        if len(fitting) < len(endpoints):
+            self.stats["context_skipped"] += 1
+            endpoints = fitting or [self.primary]
+        healthy = [e for e in endpoints if e.healthy]
+        unhealthy = sorted((e for e in endpoints if not e.healthy), key=lambda e: e.cooldown_until)
+        return healthy + unhealthy
+
+    def hedge_delay(self, endpoint: LLMEndpoint) -> float:
+        """根据端点首token延迟分位数计算对冲阈值，样本不足时使用初始阈值"""
+        value = endpoint.ttft_percentile(self.hedge_percentile)
+        if value is None:
+            return self.hedge_initial_delay
+        return max(self.hedge_min_delay, value)
+
+    def all_endpoints(self) -> List[LLMEndpoint]:
+        seen = []
+        for endpoints in self.roles.values():
+            for e in endpoints:
+                if e not in seen:
+                    seen.append(e)
+        return seen
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["endpoints"] = {e.name: e.get_stats() for e in self.all_endpoints()}
+        return stats
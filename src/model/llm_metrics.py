@@ -0,0 +1,224 @@
+"""
+LLM调用指标模块
+为每次LLM调用记录调用类型、模型、token数、首token延迟、总耗时、重试次数、缓存命中、错误类型和排队时间，
+按会话/流ID打标签后分发给可插拔的输出端（JSON日志、Prometheus、内存环形缓冲区）
+"""
+
+import os
+import json
+import time
+import logging
+import contextvars
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_call_tags: contextvars.ContextVar = contextvars.ContextVar("llm_call_tags", default={})
+_current_record: contextvars.ContextVar = contextvars.ContextVar("llm_call_record", default=None)
+
+
+def bind_call_tags(**tags) -> contextvars.Token:
+    """
+    为当前上下文（及其创建的子任务）中的LLM调用绑定标签，如session_id、stream_id
+
+    Returns:
+        contextvars.Token: 可传给reset_call_tags恢复原标签
+    """
+    return _call_tags.set({**_call_tags.get(), **{k: v for k, v in tags.items() if v is not None}})
+
+
+def reset_call_tags(token: contextvars.Token):
+    _call_tags.reset(token)
+
+
+def current_record() -> Optional["LLMCallRecord"]:
+    """当前上下文中正在进行的调用记录，不在generate调用链中时为None"""
+    return _current_record.get()
+
+
+class LLMCallRecord:
+    """单次LLM调用的指标"""
+
+    def __init__(self, call_type: str, model: str, priority: int = None, streaming: bool = False):
+        self.call_type = call_type
+        self.model = model
+        self.priority = priority
+        self.streaming = streaming
+        self.tags = dict(_call_tags.get())
+        self.timestamp = time.time()
+        self.endpoint: Optional[str] = None
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_prompt_tokens: Optional[int] = None
+        self.ttft: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.queue_time = 0.0
+        self.attempts = 0
+        self.cache_hit = False
+        self.error: Optional[str] = None
+        self._start = time.monotonic()
+        self._token: Optional[contextvars.Token] = None
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.latency = time.monotonic() - self._start
+        if error is not None:
+            self.error = type(error).__name__
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "timestamp": self.timestamp,
+            "call_type": self.call_type,
+            "model": self.model,
+            "endpoint": self.endpoint,
+            "priority": int(self.priority) if self.priority is not None else None,
+            "streaming": self.streaming,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "ttft": self.ttft,
+            "latency": self.latency,
+            "queue_time": self.queue_time,
+            "retries": self.retries,
+            "cache_hit": self.cache_hit,
+            "error": self.error,
+            **self.tags
+        }
+
+
+class LogJSONSink:
+    """每次调用输出一行JSON日志"""
+
+    def __init__(self, logger_name: str = "llm_metrics"):
+        self.logger = logging.getLogger(logger_name)
+
+    def emit(self, record: LLMCallRecord):
+        self.logger.info(json.dumps(record.to_dict(), ensure_ascii=False))
+
+
+class RingBufferSink:
+    """在内存中保留最近的调用记录，便于测试和接口查询"""
+
+    def __init__(self, max_records: int = 1000):
+        self._records: deque = deque(maxlen=max_records)
+
+    def emit(self, record: LLMCallRecord):
+        self._records.append(record.to_dict())
+
+    def records(self, **tags) -> List[Dict[str, Any]]:
+        """返回记录，可按标签过滤，如records(session_id=...)"""
+        return [r for r in self._records if all(r.get(k) == v for k, v in tags.items())]
+
+    def clear(self):
+        self._records.clear()
+
+
+class PrometheusSink:
+    """导出为Prometheus计数器与直方图，需要安装prometheus_client"""
+
+    def __init__(self, namespace: str = "llm"):
+        from prometheus_client import Counter, Histogram
+        labels = ["call_type", "model"]
+        self.calls = Counter(f"{namespace}_calls_total", "LLM调用次数", labels + ["cache_hit", "error"])
+        self.tokens = Counter(f"{namespace}_tokens_total", "LLM token数", labels + ["kind"])
+        self.retries = Counter(f"{namespace}_retries_total", "LLM重试次数", labels)
+        self.latency = Histogram(f"{namespace}_latency_seconds", "LLM调用总耗时", labels,
+                                 buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128))
+        self.ttft = Histogram(f"{namespace}_ttft_seconds", "LLM首token延迟", labels,
+                              buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32))
+        self.queue_time = Histogram(f"{namespace}_queue_seconds", "LLM限流排队时间", labels,
+                                    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30))
+
+    def emit(self, record: LLMCallRecord):
+        labels = {"call_type": record.call_type, "model": record.model}
+        self.calls.labels(cache_hit=str(record.cache_hit).lower(), error=record.error or "", **labels).inc()
+        self.tokens.labels(kind="prompt", **labels).inc(record.prompt_tokens)
+        self.tokens.labels(kind="completion", **labels).inc(record.completion_tokens)
+        if record.cached_prompt_tokens:
+            self.tokens.labels(kind="cached_prompt", **labels).inc(record.cached_prompt_tokens)
+        if record.retries:
+            self.retries.labels(**labels).inc(record.retries)
+        if record.latency is not None:
+            self.latency.labels(**labels).observe(record.latency)
+        if record.ttft is not None:
+            self.ttft.labels(**labels).observe(record.ttft)
+        if record.attempts:
+            self.queue_time.labels(**labels).observe(record.queue_time)
+
+
+class LLMMetrics:
+    """
+    调用指标分发器
+
+    LLM_METRICS_SINKS 为逗号分隔的输出端列表：log、memory、prometheus，为空时不记录；
+    LLM_METRICS_PROMETHEUS_PORT 非0时在该端口启动Prometheus抓取接口
+    """
+
+    def __init__(self, sinks: Optional[List[Any]] = None):
+        self.sinks = sinks or []
+
+    @classmethod
+    def from_env(cls) -> "LLMMetrics":
+        sinks = []
+        for name in os.getenv("LLM_METRICS_SINKS", "memory").split(","):
+            name = name.strip().lower()
+            if not name:
+                continue
+            if name == "log":
+                sinks.append(LogJSONSink())
+            elif name == "memory":
+                sinks.append(RingBufferSink(int(os.getenv("LLM_METRICS_BUFFER_SIZE", "1000"))))
+            elif name == "prometheus":
+                try:
+                    sinks.append(PrometheusSink())
+                    port = int(os.getenv("LLM_METRICS_PROMETHEUS_PORT", "0"))
+                    if port:
+                        from prometheus_client import start_http_server
+                        start_http_server(port)
+                except ImportError:
+                    logger.warning("未安装prometheus_client，跳过Prometheus指标输出")
+            else:
+                logger.warning(f"未知的LLM指标输出端: {name}")
+        return cls(sinks)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks)
+
+    def start(self, call_type: str, model: str, priority: int = None,
+              streaming: bool = False, bind: bool = True) -> Optional[LLMCallRecord]:
+        """
+        开始记录一次调用
+
+        Args:
+            bind: 是否设为当前上下文的调用记录，供重试、限流、流式请求等内部环节补充指标；
+                跨yield的异步生成器不能绑定，需要自行填写
+        """
+        if not self.sinks:
+            return None
+        record = LLMCallRecord(call_type, model, priority, streaming)
+        if bind:
+            record._token = _current_record.set(record)
+        return record
+
+    def finish(self, record: Optional[LLMCallRecord], error: Optional[BaseException] = None):
+        if record is None:
+            return
+        record.finish(error)
+        if record._token is not None:
+            _current_record.reset(record._token)
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                logger.error(f"输出LLM调用指标失败 {type(sink).__name__}: {str(e)}")
+
+    def get_sink(self, sink_type: type):
+        for sink in self.sinks:
+            if isinstance(sink, sink_type):
+                return sink
+        return None
@@ -0,0 +1,177 @@
+"""
+本地CPU推理后端
+在进程内用llama.cpp（llama-cpp-python）运行量化的小型指令模型，对外提供与AsyncOpenAI相同的
+chat.completions.create流式接口，可以作为LLM_ENDPOINTS中的一个端点挂在quality、evaluate等调用类型下，
+与远程端点共用LLMClient的对冲、故障转移和调用指标
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class LocalBackendBusy(RuntimeError):
+    """本地后端排队已满，调用方应转移到其他端点"""
+
+
+def _chunk(content: Optional[str] = None, finish_reason: Optional[str] = None) -> SimpleNamespace:
+    delta = SimpleNamespace(content=content, reasoning_content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=finish_reason)], usage=None)
+
+
+class LocalCompletionStream:
+    """本地生成的流式响应，迭代方式与OpenAI SDK的AsyncStream相同；关闭或取消时通知生成线程停止"""
+
+    def __init__(self, queue: asyncio.Queue, stop: threading.Event):
+        self._queue = queue
+        self._stop = stop
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            item = await self._queue.get()
+        except asyncio.CancelledError:
+            self._stop.set()
+            raise
+        if item is _END:
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    async def close(self):
+        self._stop.set()
+
+
+class _ChatCompletions:
+    def __init__(self, backend: "LlamaCppBackend"):
+        self._backend = backend
+
+    async def create(self, model: str, messages: List[Dict[str, Any]], temperature: float = 0.7,
+                     max_tokens: Optional[int] = None, stream: bool = False,
+                     response_format: Optional[Dict[str, Any]] = None, **kwargs) -> LocalCompletionStream:
+        if not stream:
+            raise ValueError("本地后端只支持流式调用")
+        # 本地推理没有前缀缓存，不返回usage，stream_options等参数忽略
+        return await self._backend.stream(messages, temperature, max_tokens, response_format)
+
+
+class LlamaCppBackend:
+    """
+    llama.cpp推理后端
+
+    模型在首次调用时加载；llama.cpp的上下文不能并发使用，生成在单个工作线程中串行执行，
+    等待中的请求超过max_queue时立即抛出LocalBackendBusy，由端点池转移到远程端点，避免CPU排队拖慢抓取
+    """
+
+    def __init__(self, model_path: str, n_ctx: int = 8192, n_threads: Optional[int] = None,
+                 n_gpu_layers: int = 0, max_queue: int = 4, chat_format: Optional[str] = None):
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads or os.cpu_count()
+        self.n_gpu_layers = n_gpu_layers
+        self.max_queue = max_queue
+        self.chat_format = chat_format
+        self.chat = SimpleNamespace(completions=_ChatCompletions(self))
+        self._llama = None
+        self._load_lock = threading.Lock()
+        self._slot: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self.stats = {"requests": 0, "rejected": 0, "completion_tokens": 0, "generation_seconds": 0.0}
+
+    def _get_llama(self):
+        if self._llama is None:
+            with self._load_lock:
+                if self._llama is None:
+                    try:
+                        from llama_cpp import Llama
+                    except ImportError as e:
+                        raise RuntimeError("本地后端需要安装 llama-cpp-python") from e
+                    start = time.monotonic()
+                    self._llama = Llama(
+                        model_path=self.model_path,
+                        n_ctx=self.n_ctx,
+                        n_threads=self.n_threads,
+                        n_gpu_layers=self.n_gpu_layers,
+                        chat_format=self.chat_format,
+                        verbose=False
+                    )
+                    logger.info(f"已加载本地模型 {self.model_path}，耗时{time.monotonic() - start:.1f}s")
+        return self._llama
+
+    @staticmethod
+    def _llama_response_format(response_format: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """把OpenAI的response_format转换为llama-cpp-python的JSON语法约束"""
+        if not response_format:
+            return None
+        if response_format.get("type") == "json_schema":
+            return {"type": "json_object", "schema": response_format.get("json_schema", {}).get("schema")}
+        if response_format.get("type") == "json_object":
+            return {"type": "json_object"}
+        return None
+
+    async def stream(self, messages: List[Dict[str, Any]], temperature: float, max_tokens: Optional[int],
+                     response_format: Optional[Dict[str, Any]] = None) -> LocalCompletionStream:
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)
+        if self._waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise LocalBackendBusy(f"本地模型排队请求已达{self.max_queue}个")
+        self._waiting += 1
+        try:
+            await self._slot.acquire()
+        finally:
+            self._waiting -= 1
+        self.stats["requests"] += 1
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        put = lambda item: loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def generate():
+            start = time.monotonic()
+            tokens = 0
+            try:
+                kwargs = {"messages": messages, "temperature": temperature, "max_tokens": max_tokens, "stream": True}
+                llama_format = self._llama_response_format(response_format)
+                if llama_format is not None:
+                    kwargs["response_format"] = llama_format
+                for part in self._get_llama().create_chat_completion(**kwargs):
+                    if stop.is_set():
+                        break
+                    choice = part["choices"][0]
+                    content = choice.get("delta", {}).get("content")
+                    if content:
+                        tokens += 1
+                        put(_chunk(content))
+                    if choice.get("finish_reason"):
+                        put(_chunk(finish_reason=choice["finish_reason"]))
+            except BaseException as e:
+                put(e)
+            finally:
+                self.stats["completion_tokens"] += tokens
+                self.stats["generation_seconds"] += time.monotonic() - start
+                put(_END)
+                loop.call_soon_threadsafe(self._slot.release)
+
+        loop.run_in_executor(None, generate)
+        return LocalCompletionStream(queue, stop)
+
+    def get_stats(self) -> Dict[str, Any]:
+        seconds = self.stats["generation_seconds"]
+        return {
+            **self.stats,
+            "waiting": self._waiting,
+            "tokens_per_sec": self.stats["completion_tokens"] / seconds if seconds else 0.0
+        }
@@ -0,0 +1,52 @@
+"""
+模型上下文长度表
+默认值覆盖常用模型，LLM_MODEL_LIMITS 可按模型名或前缀补充和覆盖，未匹配的模型使用 LLM_DEFAULT_CONTEXT_LIMIT
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Optional
+
+from src.model.tokenizer_registry import match_model
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_LIMITS = {
+    "qwen2.5-72b-instruct": 128000,
+    "qwen-turbo": 1000000,
+    "qwen-plus": 131072,
+    "qwen-max": 32768,
+    "qwq-32b": 128000,
+    "qwq-plus": 131072,
+    "deepseek-r1": 64000,
+    "deepseek-reasoner": 64000,
+    "deepseek-chat": 64000,
+}
+
+
+class ModelLimits:
+    """
+    模型上下文长度（输入+输出的token数）
+
+    LLM_MODEL_LIMITS 为JSON，例如 {"qwen-plus-latest": 131072, "deepseek": 64000}，键可以是模型名前缀
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default_limit: int = 64000):
+        self.limits = {**DEFAULT_MODEL_LIMITS, **{k.lower(): int(v) for k, v in (limits or {}).items()}}
+        self.default_limit = default_limit
+
+    @classmethod
+    def from_env(cls) -> "ModelLimits":
+        limits = {}
+        raw = os.getenv("LLM_MODEL_LIMITS", "")
+        if raw:
+            try:
+                limits = json.loads(raw)
+            except Exception as e:
+                logger.error(f"解析LLM_MODEL_LIMITS失败，使用默认上下文长度表: {str(e)}")
+        return cls(limits=limits, default_limit=int(os.getenv("LLM_DEFAULT_CONTEXT_LIMIT", "64000")))
+
+    def context_limit(self, model: str) -> int:
+        limit = match_model(self.limits, model)
+        return limit if limit is not None else self.default_limit
@@ -0,0 +1,284 @@
+"""
+文章质量嵌入分类器
+记录每篇文章的BGE-M3嵌入、查询嵌入与LLM给出的high_quality判定，离线训练一个基于嵌入的逻辑回归分类器（numpy，CPU），
+在线时对分类器有把握判为低质量的文章直接跳过LLM质量评估；判为高质量的文章仍需LLM生成标题、场景和压缩内容
+
+训练与评估:
+    python -m src.model.quality_classifier train [--log data/quality_verdicts.jsonl] [--out local_models/quality_classifier.npz]
+    python -m src.model.quality_classifier evaluate [--log ...] [--model ...]
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_PATH = os.path.join("data", "quality_verdicts.jsonl")
+DEFAULT_MODEL_PATH = os.path.join("local_models", "quality_classifier.npz")
+
+
+def build_features(article_embs: np.ndarray, query_embs: np.ndarray) -> np.ndarray:
+    """文章嵌入、查询嵌入及两者逐元素乘积拼接，乘积项表达文章与查询的相关性"""
+    article_embs = np.atleast_2d(article_embs)
+    query_embs = np.atleast_2d(query_embs)
+    return np.hstack([article_embs, query_embs, article_embs * query_embs])
+
+
+class LogisticQualityModel:
+    """带L2正则和类别权重的逻辑回归，输出文章为高质量的概率"""
+
+    def __init__(self, weights: Optional[np.ndarray] = None, bias: float = 0.0,
+                 mean: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None,
+                 reject_threshold: float = 0.0):
+        self.weights = weights
+        self.bias = bias
+        self.mean = mean
+        self.scale = scale
+        # 高质量概率不超过该阈值时判定为低质量并跳过LLM
+        self.reject_threshold = reject_threshold
+
+    def fit(self, features: np.ndarray, labels: np.ndarray, l2: float = 1e-3, epochs: int = 300,
+            learning_rate: float = 0.5) -> "LogisticQualityModel":
+        self.mean = features.mean(axis=0)
+        self.scale = features.std(axis=0) + 1e-6
+        x = (features - self.mean) / self.scale
+        y = labels.astype(np.float64)
+        positive = max(1.0, y.sum())
+        negative = max(1.0, len(y) - y.sum())
+        sample_weights = np.where(y == 1, len(y) / (2 * positive), len(y) / (2 * negative))
+        self.weights = np.zeros(x.shape[1])
+        self.bias = 0.0
+        for _ in range(epochs):
+            error = (self._sigmoid(x @ self.weights + self.bias) - y) * sample_weights
+            self.weights -= learning_rate * (x.T @ error / len(y) + l2 * self.weights)
+            self.bias -= learning_rate * error.mean()
+        return self
+
+    @staticmethod
+    def _sigmoid(z: np.ndarray) -> np.ndarray:
+        return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        x = (np.atleast_2d(features) - self.mean) / self.scale
+        return self._sigmoid(x @ self.weights + self.bias)
+
+    def calibrate(self, probabilities: np.ndarray, labels: np.ndarray, target_precision: float,
+                  max_high_quality_loss: float = 0.02) -> float:
+        """
+        选择拒绝阈值：概率不超过阈值的文章中真正低质量的比例不低于target_precision，
+        且被误拒的高质量文章不超过全部高质量文章的max_high_quality_loss，在此前提下跳过的文章最多
+        没有满足条件的阈值时为0（不跳过任何文章）
+        """
+        order = np.argsort(probabilities)
+        sorted_probs = probabilities[order]
+        is_low = (labels[order] == 0).astype(np.float64)
+        precision = np.cumsum(is_low) / np.arange(1, len(is_low) + 1)
+        lost = np.cumsum(1 - is_low) / max(1.0, float(np.sum(1 - is_low)))
+        valid = np.nonzero((precision >= target_precision) & (lost <= max_high_quality_loss))[0]
+        self.reject_threshold = float(sorted_probs[valid[-1]]) if len(valid) else 0.0
+        return self.reject_threshold
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez(path, weights=self.weights, bias=self.bias, mean=self.mean, scale=self.scale,
+                 reject_threshold=self.reject_threshold)
+
+    @classmethod
+    def load(cls, path: str) -> "LogisticQualityModel":
+        data = np.load(path)
+        return cls(weights=data["weights"], bias=float(data["bias"]), mean=data["mean"], scale=data["scale"],
+                   reject_threshold=float(data["reject_threshold"]))
+
+
+def load_verdict_log(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """读取判定日志，返回 (特征矩阵, 标签)"""
+    article_embs, query_embs, labels = [], [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            article_embs.append(row["article_emb"])
+            query_embs.append(row["query_emb"])
+            labels.append(1 if row["high_quality"] else 0)
+    if not labels:
+        return np.zeros((0, 0)), np.zeros(0)
+    return build_features(np.array(article_embs), np.array(query_embs)), np.array(labels)
+
+
+def evaluation_report(model: LogisticQualityModel, features: np.ndarray, labels: np.ndarray) -> Dict[str, Any]:
+    """按当前拒绝阈值统计跳过的LLM调用比例、拒绝精确率和误拒的高质量文章"""
+    probabilities = model.predict_proba(features)
+    rejected = probabilities <= model.reject_threshold
+    false_rejects = int(np.sum(rejected & (labels == 1)))
+    predicted = probabilities >= 0.5
+    return {
+        "samples": int(len(labels)),
+        "high_quality_ratio": float(labels.mean()) if len(labels) else 0.0,
+        "accuracy": float(np.mean(predicted == (labels == 1))) if len(labels) else 0.0,
+        "reject_threshold": model.reject_threshold,
+        "calls_avoided": int(rejected.sum()),
+        "calls_avoided_ratio": float(rejected.mean()) if len(labels) else 0.0,
+        "reject_precision": float(1 - false_rejects / rejected.sum()) if rejected.sum() else None,
+        "false_rejects": false_rejects,
+        "high_quality_lost_ratio": float(false_rejects / max(1, labels.sum())),
+    }
+
+
+class QualityClassifier:
+    """
+    在线质量预筛
+
+    screen()计算文章头部与查询的嵌入，分类器有把握判为低质量时返回低质量结果，调用方据此跳过LLM；
+    record()把LLM的判定连同嵌入追加到日志，作为下一次训练的样本（分类器自己的判定不记录，避免自我强化）
+    """
+
+    def __init__(self, embedder: Callable[[List[str]], List[List[float]]], model_path: str = DEFAULT_MODEL_PATH,
+                 log_path: str = DEFAULT_LOG_PATH, enabled: bool = False, log_enabled: bool = False,
+                 head_chars: int = 10000, query_cache_size: int = 64):
+        self.embedder = embedder
+        self.model_path = model_path
+        self.log_path = log_path
+        self.enabled = enabled
+        self.log_enabled = log_enabled
+        self.head_chars = head_chars
+        self.query_cache_size = query_cache_size
+        self.model: Optional[LogisticQualityModel] = None
+        self._query_embs: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.stats = {"screened": 0, "short_circuited": 0, "logged": 0}
+        if enabled:
+            try:
+                self.model = LogisticQualityModel.load(model_path)
+                logger.info(f"已加载质量分类器 {model_path}，拒绝阈值: {self.model.reject_threshold:.3f}")
+            except Exception as e:
+                logger.warning(f"加载质量分类器 {model_path} 失败，所有文章走LLM评估: {str(e)}")
+
+    @classmethod
+    def from_env(cls, embedder: Callable[[List[str]], List[List[float]]], head_chars: int) -> "QualityClassifier":
+        return cls(
+            embedder=embedder,
+            model_path=os.getenv("QUALITY_CLASSIFIER_MODEL_PATH", DEFAULT_MODEL_PATH),
+            log_path=os.getenv("QUALITY_VERDICT_LOG_PATH", DEFAULT_LOG_PATH),
+            enabled=os.getenv("QUALITY_CLASSIFIER_ENABLED", "false").lower() == "true",
+            log_enabled=os.getenv("QUALITY_VERDICT_LOG_ENABLED", "false").lower() == "true",
+            head_chars=head_chars
+        )
+
+    @property
+    def active(self) -> bool:
+        return self.model is not None or self.log_enabled
+
+    async def _query_emb(self, query: str) -> np.ndarray:
+        query = query or ""
+        emb = self._query_embs.get(query)
+        if emb is None:
+            emb = np.asarray((await asyncio.to_thread(self.embedder, [query or "通用"]))[0], dtype=np.float32)
+            self._query_embs[query] = emb
+            while len(self._query_embs) > self.query_cache_size:
+                self._query_embs.popitem(last=False)
+        return emb
+
+    async def embed(self, article: str, query: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """返回 (文章头部嵌入, 查询嵌入)，嵌入模型不可用（返回零向量）时为None"""
+        try:
+            article_emb = np.asarray((await asyncio.to_thread(self.embedder, [article[:self.head_chars]]))[0],
+                                     dtype=np.float32)
+            query_emb = await self._query_emb(query)
+        except Exception as e:
+            logger.warning(f"质量预筛计算嵌入失败: {str(e)}")
+            return None
+        if not article_emb.any() or not query_emb.any():
+            return None
+        return article_emb, query_emb
+
+    def screen(self, embeddings: Optional[Tuple[np.ndarray, np.ndarray]]) -> Optional[Dict[str, Any]]:
+        """分类器有把握判为低质量时返回低质量结果，否则返回None（需要LLM评估）"""
+        if self.model is None or embeddings is None:
+            return None
+        self.stats["screened"] += 1
+        probability = float(self.model.predict_proba(build_features(*embeddings))[0])
+        if probability > self.model.reject_threshold:
+            return None
+        self.stats["short_circuited"] += 1
+        return {"high_quality": False, "reason": f"嵌入分类器判定为低质量(p={probability:.3f})", "compress": False}
+
+    def record(self, url: str, query: str, embeddings: Optional[Tuple[np.ndarray, np.ndarray]],
+               verdict: Optional[Dict[str, Any]]):
+        """追加一条LLM判定样本"""
+        if not self.log_enabled or embeddings is None or not isinstance(verdict, dict) or "high_quality" not in verdict:
+            return
+        row = {
+            "ts": int(time.time()),
+            "url": url,
+            "query": query,
+            "high_quality": bool(verdict["high_quality"]),
+            "article_emb": np.round(embeddings[0], 5).tolist(),
+            "query_emb": np.round(embeddings[1], 5).tolist(),
+        }
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self.stats["logged"] += 1
+        except Exception as e:
+            logger.warning(f"写入质量判定日志失败: {str(e)}")
+
+
+def _train(args):
+    features, labels = load_verdict_log(args.log)
+    if len(labels) < 20 or labels.min() == labels.max():
+        print(f"样本不足或只有一个类别（{len(labels)}条），无法训练")
+        return
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(labels))
+    split = int(len(order) * (1 - args.holdout))
+    train, holdout = order[:split], order[split:]
+    # 阈值在训练集之外的一半上校准，报告在剩余的一半上计算，避免乐观估计
+    calibration, test = holdout[:len(holdout) // 2], holdout[len(holdout) // 2:]
+    model = LogisticQualityModel().fit(features[train], labels[train], l2=args.l2, epochs=args.epochs)
+    model.calibrate(model.predict_proba(features[calibration]), labels[calibration], args.target_precision,
+                    args.max_high_quality_loss)
+    model.save(args.out)
+    print(f"已保存 {args.out}，训练{len(train)}条，校准{len(calibration)}条，测试{len(test)}条")
+    print(json.dumps(evaluation_report(model, features[test], labels[test]), ensure_ascii=False, indent=2))
+
+
+def _evaluate(args):
+    features, labels = load_verdict_log(args.log)
+    model = LogisticQualityModel.load(args.model)
+    print(json.dumps(evaluation_report(model, features, labels), ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="从判定日志训练分类器并校准拒绝阈值")
+    train.add_argument("--log", default=os.getenv("QUALITY_VERDICT_LOG_PATH", DEFAULT_LOG_PATH))
+    train.add_argument("--out", default=os.getenv("QUALITY_CLASSIFIER_MODEL_PATH", DEFAULT_MODEL_PATH))
+    train.add_argument("--target-precision", type=float, default=0.95, help="被跳过的文章中真正低质量的最低比例")
+    train.add_argument("--max-high-quality-loss", type=float, default=0.02, help="允许被误拒的高质量文章比例上限")
+    train.add_argument("--holdout", type=float, default=0.3)
+    train.add_argument("--l2", type=float, default=1e-3)
+    train.add_argument("--epochs", type=int, default=300)
+    train.add_argument("--seed", type=int, default=0)
+    evaluate = sub.add_parser("evaluate", help="在判定日志上评估已训练的分类器")
+    evaluate.add_argument("--log", default=os.getenv("QUALITY_VERDICT_LOG_PATH", DEFAULT_LOG_PATH))
+    evaluate.add_argument("--model", default=os.getenv("QUALITY_CLASSIFIER_MODEL_PATH", DEFAULT_MODEL_PATH))
+    args = parser.parse_args()
+    if args.command == "train":
+        _train(args)
+    else:
+        _evaluate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+LLM调用限流模块
+按模型维护请求数/token数两个令牌桶（每分钟），等待中的调用按优先级排队，
+交互式调用（总结、评估）优先于后台批量调用（文章质量评估）获得配额
+"""
+
+import os
+import json
+import time
+import heapq
+import asyncio
+import itertools
+import logging
+from collections import deque
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RequestPriority(IntEnum):
+    """LLM调用优先级，数值越小越优先"""
+    INTERACTIVE = 0
+    NORMAL = 1
+    BULK = 2
+
+
+class TokenBucket:
+    """令牌桶，capacity<=0表示不限流"""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0 or self.refill_per_second <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """返回可取出amount个令牌还需等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float):
+        """取出令牌，允许透支（用于按实际用量补扣）"""
+        if self.unlimited:
+            return
+        self._refill()
+        self.tokens -= amount
+
+
+class ModelRateLimiter:
+    """单个模型的限流器：RPM + TPM 两个令牌桶，等待者按 (优先级, 到达顺序) 出队"""
+
+    def __init__(self, model: str, rpm: int = 0, tpm: int = 0):
+        self.model = model
+        self.request_bucket = TokenBucket(rpm, rpm / 60.0)
+        self.token_bucket = TokenBucket(tpm, tpm / 60.0)
+        self._waiters: List[list] = []
+        self._counter = itertools.count()
+        self._event = asyncio.Event()
+
+    async def acquire(self, tokens: int, priority: int = RequestPriority.NORMAL) -> float:
+        """
+        获取一次调用配额
+
+        Args:
+            tokens: 预计消耗的token数
+            priority: 调用优先级
+        Returns:
+            float: 排队等待的秒数
+        """
+        start = time.monotonic()
+        if self.request_bucket.unlimited and self.token_bucket.unlimited:
+            return 0.0
+        entry = [int(priority), next(self._counter)]
+        heapq.heappush(self._waiters, entry)
+        try:
+            while True:
+                if self._waiters[0] is entry:
+                    delay = max(self.request_bucket.time_until(1), self.token_bucket.time_until(tokens))
+                    if delay <= 0:
+                        self.request_bucket.consume(1)
+                        self.token_bucket.consume(tokens)
+                        heapq.heappop(self._waiters)
+                        self._wake()
+                        return time.monotonic() - start
+                    await self._wait(delay)
+                else:
+                    await self._wait(None)
+        except BaseException:
+            if entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._wake()
+            raise
+
+    def record_usage(self, extra_tokens: int):
+        """调用完成后按实际生成的token数补扣TPM配额"""
+        if extra_tokens > 0:
+            self.token_bucket.consume(extra_tokens)
+
+    async def _wait(self, timeout: Optional[float]):
+        event = self._event
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _wake(self):
+        self._event.set()
+        self._event = asyncio.Event()
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._waiters)
+
+
+class LLMRateLimiter:
+    """
+    LLM限流器注册表，按模型懒加载ModelRateLimiter并统计排队耗时
+
+    限额配置来自环境变量：
+        LLM_RATE_LIMITS: JSON，如 {"qwq-plus-latest": {"rpm": 60, "tpm": 100000}}
+        LLM_DEFAULT_RPM / LLM_DEFAULT_TPM: 未单独配置的模型的默认限额，0表示不限流
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, int]]] = None,
+                 default_rpm: int = 0, default_tpm: int = 0, sample_size: int = 1000):
+        self.limits = {k.lower(): v for k, v in (limits or {}).items()}
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self._limiters: Dict[str, ModelRateLimiter] = {}
+        self._wait_samples: Dict[str, deque] = {}
+        self._sample_size = sample_size
+
+    @classmethod
+    def from_env(cls) -> "LLMRateLimiter":
+        limits = {}
+        raw = os.getenv("LLM_RATE_LIMITS", "")
+        if raw:
+            try:
+                limits = json.loads(raw)
+            except Exception as e:
+                logger.error(f"解析LLM_RATE_LIMITS失败: {str(e)}")
+        return cls(
+            limits=limits,
+            default_rpm=int(os.getenv("LLM_DEFAULT_RPM", "0")),
+            default_tpm=int(os.getenv("LLM_DEFAULT_TPM", "0"))
+        )
+
+    def get(self, model: str) -> ModelRateLimiter:
+        key = (model or "").lower()
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            conf = self.limits.get(key, {})
+            limiter = ModelRateLimiter(
+                model=key,
+                rpm=int(conf.get("rpm", self.default_rpm)),
+                tpm=int(conf.get("tpm", self.default_tpm))
+            )
+            self._limiters[key] = limiter
+        return limiter
+
+    async def acquire(self, model: str, tokens: int, priority: int = RequestPriority.NORMAL) -> float:
+        """获取模型调用配额，返回排队等待秒数"""
+        wait = await self.get(model).acquire(tokens, priority)
+        label = f"{(model or '').lower()}:{RequestPriority(priority).name.lower()}"
+        samples = self._wait_samples.setdefault(label, deque(maxlen=self._sample_size))
+        samples.append(wait)
+        if wait > 1:
+            logger.info(f"LLM调用排队 {wait:.2f}s，模型: {model}，优先级: {RequestPriority(priority).name}")
+        return wait
+
+    def record_usage(self, model: str, extra_tokens: int):
+        self.get(model).record_usage(extra_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """按 模型:优先级 统计排队等待时间（次数、均值、p95、最大值）及当前队列长度"""
+        stats = {}
+        for label, samples in self._wait_samples.items():
+            values = sorted(samples)
+            if not values:
+                continue
+            stats[label] = {
+                "count": len(values),
+                "avg_wait": sum(values) / len(values),
+                "p95_wait": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max_wait": values[-1]
+            }
+        stats["queue_size"] = {model: limiter.queue_size for model, limiter in self._limiters.items()}
+        return stats
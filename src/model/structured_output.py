@@ -0,0 +1,195 @@
+"""
+结构化输出模块
+按模型选择服务端结构化输出方式（json_schema / json_object / none），并在解析失败时依次做本地修复、
+只发送损坏输出的低成本修复请求，避免一次JSON格式错误浪费整个长耗时请求；
+按模板统计解析成功、修复、重新请求和失败次数
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import json5
+
+from src.prompts.output_schemas import OUTPUT_SCHEMAS
+from src.prompts.prompt_templates import PromptTemplates
+from src.utils.json_repair import coerce_to_schema, missing_required, repair_json, truncated_in_array
+
+logger = logging.getLogger(__name__)
+
+MODE_JSON_SCHEMA = "json_schema"
+MODE_JSON_OBJECT = "json_object"
+MODE_NONE = "none"
+
+
+class StructuredOutput:
+    """
+    结构化输出配置与解析
+
+    LLM_STRUCTURED_OUTPUT 为JSON，按模型配置服务端支持的结构化输出方式，例如：
+        {"qwen-plus-latest": "json_schema", "qwen-turbo-latest": "json_object", "deepseek-r1": "none"}
+    未配置的模型使用 LLM_STRUCTURED_OUTPUT_DEFAULT（默认none，仅做本地修复）
+    """
+
+    def __init__(self, modes: Optional[Dict[str, str]] = None, default_mode: str = MODE_NONE,
+                 reask_enabled: bool = True, reask_model: Optional[str] = None, reask_max_tokens: int = 6000):
+        self.modes = {model.lower(): mode for model, mode in (modes or {}).items()}
+        self.default_mode = default_mode
+        self.reask_enabled = reask_enabled
+        self.reask_model = reask_model
+        self.reask_max_tokens = reask_max_tokens
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "StructuredOutput":
+        modes = {}
+        raw = os.getenv("LLM_STRUCTURED_OUTPUT", "")
+        if raw:
+            try:
+                modes = json.loads(raw)
+            except Exception as e:
+                logger.error(f"解析LLM_STRUCTURED_OUTPUT失败，所有模型按默认方式处理: {str(e)}")
+        return cls(
+            modes=modes,
+            default_mode=os.getenv("LLM_STRUCTURED_OUTPUT_DEFAULT", MODE_NONE),
+            reask_enabled=os.getenv("LLM_JSON_REASK_ENABLED", "true").lower() == "true",
+            reask_model=os.getenv("LLM_JSON_REASK_MODEL") or None,
+            reask_max_tokens=int(os.getenv("LLM_JSON_REASK_MAX_TOKENS", "6000"))
+        )
+
+    def mode_for(self, model: str) -> str:
+        return self.modes.get((model or "").lower(), self.default_mode)
+
+    def response_format(self, model: str, schema_key: str) -> Optional[Dict[str, Any]]:
+        """生成chat.completions的response_format参数，模型不支持结构化输出时为None"""
+        mode = self.mode_for(model)
+        if mode == MODE_JSON_SCHEMA:
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": schema_key.lower(), "schema": OUTPUT_SCHEMAS[schema_key], "strict": False}
+            }
+        if mode == MODE_JSON_OBJECT:
+            return {"type": "json_object"}
+        return None
+
+    def adapt_response_format(self, model: str, response_format: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        把为另一个模型生成的response_format换成该模型支持的方式（如级联中的快速模型），
+        不支持json_schema的模型降级为json_object，不支持结构化输出的模型不带该参数
+        """
+        if response_format is None:
+            return None
+        mode = self.mode_for(model)
+        if mode == MODE_JSON_SCHEMA:
+            return response_format
+        if mode == MODE_JSON_OBJECT:
+            return {"type": "json_object"}
+        return None
+
+    def _count(self, schema_key: str, status: str):
+        bucket = self._stats.setdefault(schema_key, {
+            "requests": 0, "parsed": 0, "repaired": 0, "reasked": 0, "failed": 0
+        })
+        bucket["requests"] += 1
+        bucket[status] += 1
+
+    def record_streamed(self, schema_key: str):
+        """增量解析已拿到全部必填字段，无需再解析完整响应"""
+        self._count(schema_key, "parsed")
+
+    @staticmethod
+    def _loads(response: str) -> Optional[Any]:
+        try:
+            return json5.loads(response.strip())
+        except Exception:
+            return None
+
+    async def parse(self, llm_client, schema_key: str, response: Optional[str], model: Optional[str] = None,
+                    **kwargs) -> Optional[Dict[str, Any]]:
+        """
+        解析结构化输出
+
+        依次尝试：直接解析 -> 本地修复 -> 把损坏的输出发给模型只做格式修复；
+        仍缺少必填字段或输出在数组内部被截断（截断点之后的元素已丢失）时返回None，由调用方走各自的备用策略，
+        不用空值补齐必填字段，避免调用方把残缺结果当作完整结果使用
+
+        Args:
+            llm_client: LLMClient实例，用于修复请求
+            schema_key: OUTPUT_SCHEMAS中的模板名
+            response: 原始输出
+            model: 原请求使用的模型
+            kwargs: 传给修复请求的generate参数（priority、call_type等）
+        Returns:
+            Optional[Dict[str, Any]]: 校正后的结果，无法得到完整的JSON对象时为None
+        """
+        schema = OUTPUT_SCHEMAS[schema_key]
+        data = self._loads(response) if response else None
+        if isinstance(data, dict) and not missing_required(data, schema):
+            self._count(schema_key, "parsed")
+            return coerce_to_schema(data, schema)
+        if truncated_in_array(response):
+            # 补齐括号或让模型修复格式都只能得到截断前的元素
+            self._count(schema_key, "failed")
+            logger.error(f"{schema_key} 输出在数组内部被截断，不使用不完整的结果")
+            return None
+
+        repaired = repair_json(response)
+        if isinstance(repaired, dict) and not missing_required(repaired, schema):
+            self._count(schema_key, "repaired")
+            logger.info(f"{schema_key} 输出经本地修复后解析成功")
+            return coerce_to_schema(repaired, schema)
+
+        if self.reask_enabled and response:
+            reasked = await self._reask(llm_client, schema_key, response, model, **kwargs)
+            if isinstance(reasked, dict) and not missing_required(reasked, schema):
+                self._count(schema_key, "reasked")
+                return coerce_to_schema(reasked, schema)
+
+        self._count(schema_key, "failed")
+        partial = data if isinstance(data, dict) else repaired
+        if isinstance(partial, dict):
+            logger.error(f"{schema_key} 输出缺少必填字段 {missing_required(partial, schema)}，交由调用方的备用策略处理")
+        else:
+            logger.error(f"{schema_key} 输出无法解析为JSON，原始响应前200字符: {(response or '')[:200]}")
+        return None
+
+    async def _reask(self, llm_client, schema_key: str, response: str, model: Optional[str],
+                     **kwargs) -> Optional[Any]:
+        """只发送损坏的输出和schema请求模型修复格式，prompt不包含原始文章，成本远低于重新生成"""
+        repair_model = self.reask_model or model or llm_client.model
+        tokenizer = llm_client.token_counter_for(repair_model).tokenizer
+        tokens = tokenizer.encode_ordinary(response)
+        if len(tokens) > self.reask_max_tokens:
+            response = tokenizer.decode(tokens[:self.reask_max_tokens], errors="ignore")
+        system_message = PromptTemplates.system_prompt("JSON_REPAIR_TEMPLATE")
+        prompt = PromptTemplates.format_json_repair_prompt(
+            schema=json.dumps(OUTPUT_SCHEMAS[schema_key], ensure_ascii=False),
+            broken_output=response
+        )
+        try:
+            fixed = await llm_client.generate(
+                prompt=prompt,
+                system_message=system_message,
+                model=repair_model,
+                temperature=0,
+                response_format=self.response_format(repair_model, schema_key),
+                cascade=False,
+                **kwargs
+            )
+        except Exception as e:
+            logger.error(f"{schema_key} 输出修复请求失败: {str(e)}")
+            return None
+        if not fixed:
+            return None
+        data = self._loads(fixed)
+        return data if data is not None else repair_json(fixed)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {}
+        for schema_key, bucket in self._stats.items():
+            stats[schema_key] = {
+                **bucket,
+                "failure_rate": bucket["failed"] / bucket["requests"] if bucket["requests"] else 0.0
+            }
+        return stats
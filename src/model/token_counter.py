@@ -0,0 +1,149 @@
+"""
+Token计数服务
+按内容哈希缓存token数，批量编码未命中的文本，并提供按实际编码结果持续校准的快速估算模式，
+用于研究流程中反复对同一批文章做token预算检查的场景
+"""
+
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List, Optional
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCounter:
+    """
+    带缓存的token计数器
+
+    短文本直接编码（哈希开销与编码相当），长文本按blake2b摘要缓存；
+    approximate=True时按 中文字符数*cjk_weight + 其他字符数*other_weight 估算，
+    并用每次精确计数的结果更新校准系数
+    """
+
+    def __init__(self, encoding_name: str = "cl100k_base", max_entries: int = 4096,
+                 min_cache_length: int = 256, cjk_weight: float = 1.0, other_weight: float = 0.25,
+                 tokenizer=None):
+        # tokenizer需提供tiktoken风格的encode_ordinary/encode_ordinary_batch/decode，为None时使用encoding_name
+        self.tokenizer = tokenizer if tokenizer is not None else tiktoken.get_encoding(encoding_name)
+        self.max_entries = max_entries
+        self.min_cache_length = min_cache_length
+        self.cjk_weight = cjk_weight
+        self.other_weight = other_weight
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._calibrated_tokens = 0
+        self._calibrated_estimate = 0.0
+        self.stats = {"hits": 0, "misses": 0, "approximations": 0}
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _raw_estimate(self, text: str) -> float:
+        cjk_count = sum(1 for char in text if '\u4e00' <= char <= '\u9fff')
+        return cjk_count * self.cjk_weight + (len(text) - cjk_count) * self.other_weight
+
+    @property
+    def calibration_factor(self) -> float:
+        """精确token数与原始估算值之比，尚无样本时为1"""
+        if self._calibrated_estimate <= 0:
+            return 1.0
+        return self._calibrated_tokens / self._calibrated_estimate
+
+    def _calibrate(self, text: str, tokens: int):
+        # 只用较长文本校准，避免短文本的取整误差影响系数
+        if len(text) >= self.min_cache_length:
+            self._calibrated_tokens += tokens
+            self._calibrated_estimate += self._raw_estimate(text)
+
+    def _encode_len(self, text: str) -> int:
+        try:
+            return len(self.tokenizer.encode_ordinary(text))
+        except Exception as e:
+            logger.warning(f"计算token数量时出错: {e}，使用估算方法")
+            return int(self._raw_estimate(text) * self.calibration_factor)
+
+    def _remember(self, key: bytes, tokens: int):
+        self._cache[key] = tokens
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def estimate(self, text: str) -> int:
+        """按校准系数快速估算token数，不做BPE编码"""
+        if not text:
+            return 0
+        self.stats["approximations"] += 1
+        return int(self._raw_estimate(text) * self.calibration_factor) + 1
+
+    def count(self, text: str, approximate: bool = False) -> int:
+        """
+        计算文本的token数量
+
+        Args:
+            text: 文本
+            approximate: 是否使用快速估算（已缓存的精确值优先）
+        Returns:
+            int: token数
+        """
+        if not text:
+            return 0
+        if len(text) < self.min_cache_length:
+            return self.estimate(text) if approximate else self._encode_len(text)
+        key = self._digest(text)
+        tokens = self._cache.get(key)
+        if tokens is not None:
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return tokens
+        if approximate:
+            return self.estimate(text)
+        self.stats["misses"] += 1
+        tokens = self._encode_len(text)
+        self._calibrate(text, tokens)
+        self._remember(key, tokens)
+        return tokens
+
+    def count_batch(self, texts: List[Optional[str]], approximate: bool = False) -> List[int]:
+        """
+        批量计算token数，缓存未命中的文本批量编码（tiktoken多线程释放GIL，HuggingFace fast分词器同样并行）
+
+        Args:
+            texts: 文本列表
+            approximate: 是否使用快速估算
+        Returns:
+            List[int]: 与texts一一对应的token数
+        """
+        results = [0] * len(texts)
+        missing_index: List[int] = []
+        missing_keys: List[Optional[bytes]] = []
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            key = self._digest(text) if len(text) >= self.min_cache_length else None
+            if key is not None and key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                results[i] = self._cache[key]
+            elif approximate:
+                results[i] = self.estimate(text)
+            else:
+                missing_index.append(i)
+                missing_keys.append(key)
+        if missing_index:
+            self.stats["misses"] += len(missing_index)
+            missing_texts = [texts[i] for i in missing_index]
+            try:
+                encoded = self.tokenizer.encode_ordinary_batch(missing_texts)
+                counts = [len(tokens) for tokens in encoded]
+            except Exception as e:
+                logger.warning(f"批量计算token数量时出错: {e}，逐条计算")
+                counts = [self._encode_len(text) for text in missing_texts]
+            for i, key, text, tokens in zip(missing_index, missing_keys, missing_texts, counts):
+                results[i] = tokens
+                if key is not None:
+                    self._calibrate(text, tokens)
+                    self._remember(key, tokens)
+        return results
@@ -0,0 +1,175 @@
+"""
+分词器注册表
+按模型加载对应的本地分词器（Qwen、DeepSeek等使用各自的HuggingFace分词器，OpenAI模型使用tiktoken），
+优先读取本地缓存，允许时才联网下载，加载失败回退到cl100k_base；每个分词器对应一个带缓存的TokenCounter，
+使上下文预算和截断按目标模型的真实token数计算；HuggingFace分词器在启动时通过warm()在线程中预加载，
+事件循环中遇到未加载的分词器时也在线程中加载，加载完成前用回退分词器计数，不阻塞其他协程
+"""
+
+import os
+import json
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.model.token_counter import TokenCounter
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_TOKENIZER = "tiktoken:cl100k_base"
+
+# 模型名前缀 -> 分词器，"tiktoken:"开头为tiktoken编码，其余为HuggingFace仓库名或本地目录
+DEFAULT_TOKENIZERS = {
+    "qwen": "Qwen/Qwen2.5-7B-Instruct",
+    "qwq": "Qwen/QwQ-32B",
+    "deepseek": "deepseek-ai/DeepSeek-R1",
+    "gpt-4o": "tiktoken:o200k_base",
+    "gpt-4": "tiktoken:cl100k_base",
+    "gpt-3.5": "tiktoken:cl100k_base",
+}
+
+
+def match_model(table: Dict[str, Any], model: str) -> Optional[Any]:
+    """按模型名精确匹配，否则取最长的前缀匹配"""
+    model = (model or "").lower()
+    if model in table:
+        return table[model]
+    prefixes = [key for key in table if model.startswith(key)]
+    return table[max(prefixes, key=len)] if prefixes else None
+
+
+class HFTokenizerAdapter:
+    """把HuggingFace分词器包装成TokenCounter和PromptAssembler使用的tiktoken接口"""
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        # 只用于计数和截断，关闭超过模型最大长度的警告
+        self.tokenizer.model_max_length = int(1e12)
+
+    def encode_ordinary(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False)
+
+    def encode_ordinary_batch(self, texts: List[str]) -> List[List[int]]:
+        return self.tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+    def decode(self, tokens: List[int], errors: str = "ignore") -> str:
+        return self.tokenizer.decode(tokens, skip_special_tokens=True)
+
+
+class TokenizerRegistry:
+    """
+    模型 -> 分词器 -> TokenCounter
+
+    LLM_TOKENIZERS 为JSON，覆盖或补充默认映射，例如：
+        {"qwen-plus-latest": "/models/qwen2.5-tokenizer", "my-model": "tiktoken:o200k_base"}
+    同一分词器的模型共享计数缓存；TOKENIZER_ALLOW_DOWNLOAD为true时本地缓存中没有的分词器才联网下载
+    """
+
+    def __init__(self, tokenizers: Optional[Dict[str, str]] = None, cache_dir: Optional[str] = None,
+                 allow_download: bool = False, max_entries: int = 4096):
+        self.tokenizers = {**DEFAULT_TOKENIZERS, **{k.lower(): v for k, v in (tokenizers or {}).items()}}
+        self.cache_dir = cache_dir
+        self.allow_download = allow_download
+        self.max_entries = max_entries
+        self._counters: Dict[str, TokenCounter] = {}
+        self._fallbacks: Dict[str, str] = {}
+        # 每个分词器一把锁，后台加载慢的分词器时不阻塞回退分词器的加载
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._pending: Set[str] = set()
+
+    @classmethod
+    def from_env(cls) -> "TokenizerRegistry":
+        tokenizers = {}
+        raw = os.getenv("LLM_TOKENIZERS", "")
+        if raw:
+            try:
+                tokenizers = json.loads(raw)
+            except Exception as e:
+                logger.error(f"解析LLM_TOKENIZERS失败，使用默认分词器映射: {str(e)}")
+        return cls(
+            tokenizers=tokenizers,
+            cache_dir=os.getenv("TOKENIZER_CACHE_DIR") or None,
+            allow_download=os.getenv("TOKENIZER_ALLOW_DOWNLOAD", "false").lower() == "true",
+            max_entries=int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))
+        )
+
+    def tokenizer_name(self, model: str) -> str:
+        return match_model(self.tokenizers, model) or FALLBACK_TOKENIZER
+
+    def counter_for(self, model: str) -> TokenCounter:
+        """
+        返回模型对应的TokenCounter
+
+        在事件循环中调用且HuggingFace分词器尚未加载时，不在当前协程中同步读取或下载分词器，
+        而是在线程中加载，加载完成前返回回退分词器的TokenCounter
+        """
+        name = self.tokenizer_name(model)
+        counter = self._counters.get(name)
+        if counter is not None:
+            return counter
+        if name.startswith("tiktoken:"):
+            return self._load_counter(name)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._load_counter(name)
+        if name not in self._pending:
+            self._pending.add(name)
+            logger.info(f"分词器 {name} 尚未加载，在后台线程中加载，加载完成前使用 {FALLBACK_TOKENIZER} 计数")
+            future = loop.run_in_executor(None, self._load_counter, name)
+            future.add_done_callback(lambda _: self._pending.discard(name))
+        return self._load_counter(FALLBACK_TOKENIZER)
+
+    async def warm(self, models: Iterable[str]):
+        """在线程中预加载这些模型的分词器，应用启动时调用"""
+        names = {self.tokenizer_name(model) for model in models if model}
+        for name in names:
+            if name not in self._counters:
+                await asyncio.to_thread(self._load_counter, name)
+
+    def _load_counter(self, name: str) -> TokenCounter:
+        counter = self._counters.get(name)
+        if counter is None:
+            with self._lock:
+                load_lock = self._load_locks.setdefault(name, threading.Lock())
+            with load_lock:
+                counter = self._counters.get(name)
+                if counter is None:
+                    counter = TokenCounter(tokenizer=self._load(name), max_entries=self.max_entries)
+                    self._counters[name] = counter
+        return counter
+
+    def _load(self, name: str):
+        if name.startswith("tiktoken:"):
+            import tiktoken
+            return tiktoken.get_encoding(name.split(":", 1)[1])
+        try:
+            from transformers import AutoTokenizer
+        except ImportError:
+            return self._fallback(name, "未安装transformers")
+        try:
+            # 先只读本地缓存，离线环境不发起网络请求
+            tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=self.cache_dir, local_files_only=True)
+        except Exception as local_error:
+            if not self.allow_download:
+                return self._fallback(name, f"本地缓存中没有该分词器: {local_error}")
+            try:
+                tokenizer = AutoTokenizer.from_pretrained(name, cache_dir=self.cache_dir)
+            except Exception as e:
+                return self._fallback(name, str(e))
+        logger.info(f"已加载分词器 {name}")
+        return HFTokenizerAdapter(tokenizer)
+
+    def _fallback(self, name: str, reason: str):
+        import tiktoken
+        self._fallbacks[name] = reason
+        logger.warning(f"加载分词器 {name} 失败，回退到 {FALLBACK_TOKENIZER}，token数可能不准确: {reason}")
+        return tiktoken.get_encoding(FALLBACK_TOKENIZER.split(":", 1)[1])
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            name: {**counter.stats, "fallback": self._fallbacks.get(name)}
+            for name, counter in self._counters.items()
+        }
@@ -0,0 +1,114 @@
+"""输出结构定义模块
+与PROMPT_TEMPLATES对应的JSON Schema，用于服务端结构化输出（JSON mode / JSON schema）和本地修复时的字段补齐与类型校正。
+schema不设置additionalProperties=false，级联调用追加的confidence等字段可以保留
+"""
+
+_QUALITY_ITEM_PROPERTIES = {
+    "high_quality": {"type": "boolean"},
+    "compress": {"type": "boolean"},
+    "compressed_article": {"type": "string"},
+    "title": {"type": "string"},
+    "scenario": {"type": "string"},
+}
+
+_EXTRACTIVE_QUALITY_ITEM_PROPERTIES = {
+    "high_quality": {"type": "boolean"},
+    "compress": {"type": "boolean"},
+    "keep_paragraphs": {"type": "array", "items": {"type": "integer"}},
+    "title": {"type": "string"},
+    "scenario": {"type": "string"},
+}
+
+OUTPUT_SCHEMAS = {
+    "EVALUATE_INFORMATION_TEMPLATE": {
+        "type": "object",
+        "properties": {
+            "fetch_url": {"type": "array", "items": {"type": "string"}},
+            "enough": {"type": "boolean"},
+            "search_url": {"type": "array", "items": {"type": "string"}},
+            "thought": {"type": "string"},
+            "query": {"type": "string"},
+            "scenario": {"type": "string"},
+        },
+        "required": ["fetch_url", "enough", "search_url", "thought", "query", "scenario"],
+    },
+
+    "ARTICLE_QUALITY_TEMPLATE": {
+        "type": "object",
+        "properties": _QUALITY_ITEM_PROPERTIES,
+        "required": ["high_quality"],
+    },
+
+    "ARTICLE_QUALITY_BATCH_TEMPLATE": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"index": {"type": "integer"}, **_QUALITY_ITEM_PROPERTIES},
+                    "required": ["index", "high_quality"],
+                },
+            },
+        },
+        "required": ["results"],
+    },
+
+    "ARTICLE_QUALITY_EXTRACTIVE_TEMPLATE": {
+        "type": "object",
+        "properties": _EXTRACTIVE_QUALITY_ITEM_PROPERTIES,
+        "required": ["high_quality"],
+    },
+
+    "ARTICLE_QUALITY_EXTRACTIVE_BATCH_TEMPLATE": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {"index": {"type": "integer"}, **_EXTRACTIVE_QUALITY_ITEM_PROPERTIES},
+                    "required": ["index", "high_quality"],
+                },
+            },
+        },
+        "required": ["results"],
+    },
+
+    "ARTICLE_QUALITY_EXCERPT_TEMPLATE": {
+        "type": "object",
+        "properties": {
+            "score": {"type": "integer"},
+            "reason": {"type": "string"},
+        },
+        "required": ["score"],
+    },
+
+    "CONTENT_COMPRESSION_TEMPLATE": {
+        "type": "object",
+        "properties": {
+            "decisions": {
+                "type": "object",
+                "properties": {
+                    "reasoning": {"type": "string"},
+                    "strategy": {"type": "string"},
+                },
+            },
+            "compressed_results": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "original_index": {"type": "integer"},
+                        "url": {"type": "string"},
+                        "title": {"type": "string"},
+                        "content": {"type": "string"},
+                        "compressed": {"type": "boolean"},
+                    },
+                    "required": ["original_index", "content"],
+                },
+            },
+        },
+        "required": ["compressed_results"],
+    },
+}
@@ -0,0 +1,128 @@
+"""
+提示词组装模块
+把模板中的可变部分拆成带优先级的段落（问题、历史对话、文章等），每个段落只编码一次，
+按优先级把段落精确装入目标模型的token预算，超出时先丢弃价值最低的文章，而不是从末尾截断整个prompt
+"""
+
+import logging
+from typing import List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+TRUNCATION_MARKER = "[注：由于内容过长，部分内容已被截断]"
+
+
+class PromptSection:
+    """
+    prompt中的一个可变段落
+
+    Args:
+        name: 模板中的占位符名称
+        content: 段落文本，或按价值从高到低排列的条目列表（如文章列表）
+        priority: 优先级，数值越小越先分配预算
+        separator: 条目之间的分隔符
+        keep: 超出预算时保留头部("head")还是尾部("tail"，如历史对话保留最近的部分)
+        sanitized: 内容已在抓取或入库时用TextFilter清理过（文章正文），渲染时不再逐次过滤
+    """
+
+    def __init__(self, name: str, content: Union[str, List[str], None], priority: int = 0,
+                 separator: str = "\n", keep: str = "head", sanitized: bool = False):
+        self.name = name
+        self.is_list = isinstance(content, list)
+        self.items = [item for item in content if item] if self.is_list else [content or ""]
+        self.priority = priority
+        self.separator = separator
+        self.keep = keep
+        self.sanitized = sanitized
+
+
+class PromptAssembler:
+    """按token预算组装prompt，token_counter提供tokenizer与带缓存的计数"""
+
+    def __init__(self, token_counter, min_item_tokens: int = 200, max_passes: int = 3):
+        self.token_counter = token_counter
+        self.tokenizer = token_counter.tokenizer
+        self.min_item_tokens = min_item_tokens
+        self.max_passes = max_passes
+        self._marker_tokens = self._encode("\n" + TRUNCATION_MARKER)
+
+    def _encode(self, text: str) -> List[int]:
+        return self.tokenizer.encode_ordinary(text) if text else []
+
+    def _decode(self, tokens: List[int]) -> str:
+        return self.tokenizer.decode(tokens, errors="ignore")
+
+    def assemble(self, template: str, sections: List[PromptSection], token_budget: int, **fixed) -> str:
+        """
+        组装prompt
+
+        Args:
+            template: 含占位符的模板
+            sections: 可变段落
+            token_budget: prompt可用的token数
+            fixed: 模板中的固定字段（当前时间、领域说明等），不参与裁剪
+        Returns:
+            str: 不超过token_budget的prompt
+        """
+        empty = {section.name: "" for section in sections}
+        base_tokens = self.token_counter.count(template.format(**fixed, **empty))
+        encoded = {section.name: [self._encode(item) for item in section.items] for section in sections}
+        separator_tokens = {section.name: len(self._encode(section.separator)) for section in sections}
+        ordered = sorted(sections, key=lambda s: s.priority)
+        overflow = 0
+        prompt = ""
+        for _ in range(self.max_passes):
+            remaining = token_budget - base_tokens - overflow
+            values = {}
+            for section in ordered:
+                text, used = self._fit(section, encoded[section.name], separator_tokens[section.name], max(0, remaining))
+                values[section.name] = text
+                remaining -= used
+            prompt = template.format(**fixed, **values)
+            # 段落拼接处的BPE合并可能带来少量误差，按实际编码结果复核
+            total = self.token_counter.count(prompt)
+            if total <= token_budget:
+                return prompt
+            overflow += total - token_budget
+        logger.warning(f"prompt组装{self.max_passes}次后仍超出预算{token_budget}")
+        return prompt
+
+    def _fit(self, section: PromptSection, token_lists: List[List[int]], separator_tokens: int,
+             remaining: int) -> Tuple[str, int]:
+        """在remaining个token内放置段落，返回 (文本, 使用的token数)"""
+        total = sum(len(tokens) for tokens in token_lists) + separator_tokens * max(0, len(token_lists) - 1)
+        if total <= remaining:
+            return section.separator.join(section.items), total
+        if not section.is_list:
+            return self._truncate(token_lists[0] if token_lists else [], remaining, section.keep)
+
+        indexes = list(range(len(token_lists)))
+        if section.keep == "tail":
+            indexes.reverse()
+        kept = {}
+        used = 0
+        for i in indexes:
+            cost = len(token_lists[i]) + (separator_tokens if kept else 0)
+            if used + cost <= remaining:
+                kept[i] = section.items[i]
+                used += cost
+                continue
+            space = remaining - used - (separator_tokens if kept else 0)
+            if space >= self.min_item_tokens:
+                text, item_used = self._truncate(token_lists[i], space, section.keep)
+                kept[i] = text
+                used += item_used + (separator_tokens if len(kept) > 1 else 0)
+            break
+        logger.info(f"prompt段落 {section.name} 超出预算，保留{len(kept)}/{len(token_lists)}项")
+        return section.separator.join(kept[i] for i in sorted(kept)), used
+
+    def _truncate(self, tokens: List[int], limit: int, keep: str = "head") -> Tuple[str, int]:
+        """把单段文本截断到limit个token以内，并附加截断标记"""
+        if len(tokens) <= limit:
+            return self._decode(tokens), len(tokens)
+        space = limit - len(self._marker_tokens)
+        if space <= 0:
+            return "", 0
+        if keep == "tail":
+            return TRUNCATION_MARKER + "\n" + self._decode(tokens[-space:]), limit
+        return self._decode(tokens[:space]) + "\n" + TRUNCATION_MARKER, limit
@@ -10,26 +10,18 @@ SCENARIO_DESC = """
     - bid：商机匹配、投标策略、竞标分析、甲方分析等招投标领域
 """
 
-# 集中管理所有提示词模板
-PROMPT_TEMPLATES = {
+# 模板拆分为静态的系统提示词前缀(SYSTEM_PROMPTS)和可变的用户消息(PROMPT_TEMPLATES)，
+# 系统提示词只包含部署期固定的参数，同一模板的每次调用前缀完全一致，可以命中服务端的前缀缓存；
+# 用户消息中按变化频率从低到高排列（时间、查询、历史、已有文章、新内容），相邻调用的公共前缀尽量长
+SYSTEM_PROMPTS = {
     # 深度分析提示词
-    "DEEP_ANALYSIS_TEMPLATE": """  
-    结合查到的数据，解决用户问题。 
-    当前时间：{current_time}
-    用户查询：{query}
-    查到的数据：{summaries}
-    你的回答：
+    "DEEP_ANALYSIS_TEMPLATE": """
+    结合查到的数据，解决用户问题。
     """,
-    
+
     # 信息充分性评估提示词
     "EVALUATE_INFORMATION_TEMPLATE": """
     作为智能研究助手，你的任务是评估我们目前收集的信息是否足够解决用户的问题，不够的话规划下一步如何收集信息解决用户的查询，给出包含搜索关键字的搜索URL。
-    当前时间：{current_time}
-    用户查询：{query}
-    已收集的信息:
-    {article_text}
-    历史对话上下文: 
-    {context}
     
     以JSON格式输出：
     1 fetch_url：数组格式，收集到信息时，该字段为空；用户查询中包含URL时，提取URL
@@ -42,10 +34,8 @@ PROMPT_TEMPLATES = {
         {scenario}
     8 query和scenario字段逻辑上需要保持一致
     9 请只输出符合JSON格式的内容，不要输出任何额外的文本
-
-    你的评估与反思:
     """,
-    
+
     # 文章质量处理提示词
     "ARTICLE_QUALITY_TEMPLATE": """
     你是智能内容处理专家，帮我对爬取到的文章内容进行内容质量评估、智能压缩和主题提炼，最终结果以json格式输出，具体规则如下：
@@ -56,26 +46,63 @@ PROMPT_TEMPLATES = {
     5 如果内容优质，结合用户查询和文章内容识别所属领域添加到scenario字段，当无法识别时给unknown，不要强行从可选领域匹配，一定要保证准确性，可选领域：
         {scenario}
     6 请只输出符合JSON格式的内容，不要输出任何额外的文本
+    """,
 
-    当前时间：{current_time}
-    用户查询：{query}
-    以下是文章内容：
-    {article}
+    # 文章质量批量处理提示词
+    "ARTICLE_QUALITY_BATCH_TEMPLATE": """
+    你是智能内容处理专家，帮我对爬取到的多篇文章逐篇进行内容质量评估、智能压缩和主题提炼，每篇文章以[文章序号]开头，最终结果以json格式输出，对每篇文章的处理规则如下：
+    1 先判断内容是否优质，将结果添加到high_quality字段(与用户查询相关且内容高质量为True、与用户查询不相关或内容低质量为False)，不优质直接结束该篇
+    2 如果内容优质，判断字数是否超过{word_count}字需要压缩，将结果添加到compress字段(需压缩值为True、不需压缩值为False)
+    3 如果优质文章需要压缩，把文章压缩结果放到compressed_article字段，压缩需保留原文不要加入自己的总结，尽可能打满{word_count}字避免语义严重缺失，压缩后的内容不能影响JSON反序列化
+    4 如果内容优质，提取文章原来的标题放在title字段，内容不超过30字
+    5 如果内容优质，结合用户查询和文章内容识别所属领域添加到scenario字段，当无法识别时给unknown，不要强行从可选领域匹配，一定要保证准确性，可选领域：
+        {scenario}
+    6 每篇文章的结果必须包含index字段，值为该文章的序号；各篇文章相互独立评估，不要互相影响
+    7 输出格式为 {{"results": [{{"index": 0, "high_quality": true, ...}}, ...]}}，results中每篇文章对应一个元素
+    8 请只输出符合JSON格式的内容，不要输出任何额外的文本
     """,
-    
+
+    # 文章质量处理提示词（抽取式压缩，只输出保留的段落序号）
+    "ARTICLE_QUALITY_EXTRACTIVE_TEMPLATE": """
+    你是智能内容处理专家，帮我对爬取到的文章内容进行内容质量评估、智能压缩和主题提炼，文章已按段落编号，每段以[P段落序号]开头，最终结果以json格式输出，具体规则如下：
+    1 先判断内容是否优质，将结果添加到high_quality字段(与用户查询相关且内容高质量为True、与用户查询不相关或内容低质量为False)，不优质直接结束
+    2 如果内容优质，判断字数是否超过{word_count}字需要压缩，将结果添加到compress字段(需压缩值为True、不需压缩值为False)
+    3 如果优质文章需要压缩，不要输出压缩后的正文，只把需要保留的段落序号按原文顺序放到keep_paragraphs字段(整数数组)，保留的段落合计尽可能接近{word_count}字避免语义严重缺失
+    4 如果内容优质，提取文章原来的标题放在title字段，内容不超过30字
+    5 如果内容优质，结合用户查询和文章内容识别所属领域添加到scenario字段，当无法识别时给unknown，不要强行从可选领域匹配，一定要保证准确性，可选领域：
+        {scenario}
+    6 请只输出符合JSON格式的内容，不要输出任何额外的文本
+    """,
+
+    # 文章质量批量处理提示词（抽取式压缩，只输出保留的段落序号）
+    "ARTICLE_QUALITY_EXTRACTIVE_BATCH_TEMPLATE": """
+    你是智能内容处理专家，帮我对爬取到的多篇文章逐篇进行内容质量评估、智能压缩和主题提炼，每篇文章以[文章序号]开头，文章内按段落编号，每段以[P段落序号]开头，最终结果以json格式输出，对每篇文章的处理规则如下：
+    1 先判断内容是否优质，将结果添加到high_quality字段(与用户查询相关且内容高质量为True、与用户查询不相关或内容低质量为False)，不优质直接结束该篇
+    2 如果内容优质，判断字数是否超过{word_count}字需要压缩，将结果添加到compress字段(需压缩值为True、不需压缩值为False)
+    3 如果优质文章需要压缩，不要输出压缩后的正文，只把该篇需要保留的段落序号按原文顺序放到keep_paragraphs字段(整数数组)，保留的段落合计尽可能接近{word_count}字避免语义严重缺失
+    4 如果内容优质，提取文章原来的标题放在title字段，内容不超过30字
+    5 如果内容优质，结合用户查询和文章内容识别所属领域添加到scenario字段，当无法识别时给unknown，不要强行从可选领域匹配，一定要保证准确性，可选领域：
+        {scenario}
+    6 每篇文章的结果必须包含index字段，值为该文章的序号；各篇文章相互独立评估，不要互相影响
+    7 输出格式为 {{"results": [{{"index": 0, "high_quality": true, ...}}, ...]}}，results中每篇文章对应一个元素
+    8 请只输出符合JSON格式的内容，不要输出任何额外的文本
+    """,
+
+    # 文章摘录初筛提示词
+    "ARTICLE_QUALITY_EXCERPT_TEMPLATE": """
+    你是智能内容处理专家，帮我根据爬取到的文章摘录（标题、小标题和开头段落）初步判断整篇文章是否值得进一步评估，最终结果以json格式输出，具体规则如下：
+    1 结合用户查询评估文章与查询的相关性和内容质量，给出0到10的整数分数放到score字段，明显不相关、广告、导航页、登录页、内容空洞为0到2分，无法确定为3到6分，明显相关且有实质内容为7到10分
+    2 把评分理由放到reason字段，不超过30字
+    3 请只输出符合JSON格式的内容，不要输出任何额外的文本
+    """,
+
     # 内容压缩统一管理提示词
     "CONTENT_COMPRESSION_TEMPLATE": """
     作为AI研究助手，您的任务是对已收集的多篇文章进行分析，根据与查询的相关性和信息价值，决定如何压缩和优化这些内容。
-    当前时间：{current_time}
-    用户查询: {query}
-    当前已收集的文章内容:
-    {existing_content}
-    新文章内容:
-    {new_content}
     您需要:
     1 评估每篇文章与用户查询的相关性，以及这篇文章在整体中的重要性
     2 确定哪些文章需要保留，哪些可以丢弃或压缩
-    3 对保留的文章进行适当压缩，确保总内容不超过{token_limit}个token
+    3 对保留的文章进行适当压缩，确保总内容不超过用户消息中给出的token上限
     4 确保最重要和最相关的信息得到保留
     5 确保最重要和最相关的信息放在前面
     6 请只输出符合JSON格式的内容，不要输出任何额外的文本
@@ -99,94 +126,330 @@ PROMPT_TEMPLATES = {
       ]
     }}
     ```
+    """,
+
+    # JSON格式修复提示词
+    "JSON_REPAIR_TEMPLATE": """
+    你是JSON格式修复工具。用户会给出一段格式有误或被截断的JSON输出以及它应当符合的JSON Schema，
+    请只修复格式问题（引号、转义、括号、逗号、字段类型），尽量保留原有内容，不要改写、总结或补充信息，
+    缺失的必填字段按类型给出空值。请只输出修复后的JSON，不要输出任何额外的文本
+    """
+}
+
+# 集中管理所有提示词模板（用户消息部分）
+PROMPT_TEMPLATES = {
+    # 深度分析提示词
+    "DEEP_ANALYSIS_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    查到的数据：{summaries}
+    你的回答：
+    """,
+    
+    # 信息充分性评估提示词
+    "EVALUATE_INFORMATION_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    历史对话上下文: 
+    {context}
+    已收集的信息:
+    {article_text}
+
+    你的评估与反思:
+    """,
+    
+    # 文章质量处理提示词
+    "ARTICLE_QUALITY_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    以下是文章内容：
+    {article}
+    """,
+    
+    # 文章质量批量处理提示词
+    "ARTICLE_QUALITY_BATCH_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    以下是文章内容：
+    {articles}
+    """,
+    
+    # 文章质量处理提示词（抽取式压缩）
+    "ARTICLE_QUALITY_EXTRACTIVE_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    以下是按段落编号的文章内容：
+    {article}
+    """,
+    
+    # 文章质量批量处理提示词（抽取式压缩）
+    "ARTICLE_QUALITY_EXTRACTIVE_BATCH_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    以下是按段落编号的文章内容：
+    {articles}
+    """,
+    
+    # 文章摘录初筛提示词
+    "ARTICLE_QUALITY_EXCERPT_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询：{query}
+    以下是文章摘录：
+    {excerpt}
+    """,
+    
+    # 内容压缩统一管理提示词
+    "CONTENT_COMPRESSION_TEMPLATE": """
+    当前时间：{current_time}
+    用户查询: {query}
+    压缩后的总内容不超过{token_limit}个token
+    当前已收集的文章内容:
+    {existing_content}
+    新文章内容:
+    {new_content}
+    """,
+
+    # JSON格式修复提示词
+    "JSON_REPAIR_TEMPLATE": """
+    JSON Schema:
+    {schema}
+    需要修复的输出:
+    {broken_output}
     """
 }
 
 from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import List, Optional, Union
 from src.utils.text_filter import TextFilter
+from src.utils.article_paragraphs import number_paragraphs, split_paragraphs
+from src.prompts.prompt_assembler import PromptAssembler, PromptSection
+
+class CompiledTemplate:
+    """
+    预编译的提示词模板
+
+    加载时把模板拆成静态文本和字段名，format()只按顺序拼接，不再每次解析模板；
+    结果与str.format相同（模板字段不使用格式说明和转换），可以直接传给PromptAssembler
+    """
+
+    def __init__(self, template: str):
+        self.literals: List[str] = []
+        self.fields: List[Optional[str]] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"预编译模板不支持格式说明: {{{field}!{conversion}:{spec}}}")
+            self.literals.append(literal)
+            self.fields.append(field)
+
+    def format(self, **values) -> str:
+        parts = []
+        for literal, field in zip(self.literals, self.fields):
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+
+COMPILED_TEMPLATES = {key: CompiledTemplate(template) for key, template in PROMPT_TEMPLATES.items()}
+
 
 class PromptTemplates:
 
-    """提示词模板类，集中管理所有提示词"""
+    """提示词模板类，集中管理所有提示词
+    
+    format_*方法传入assembler和token_budget时，按段落优先级把可变内容精确装入token预算
+    （问题 > 新内容/历史对话 > 文章，文章列表从价值最低的末尾开始丢弃）；不传时直接格式化
+    format_*方法只生成用户消息，调用时需要配合system_prompt()作为system_message发送
+    文章正文在抓取和入库时已经清理过（sanitized段落），渲染时只过滤查询、历史对话等短段落，不再对整个prompt做正则替换
+    """
+    @classmethod
+    @lru_cache(maxsize=None)
+    def system_prompt(cls, template_key: str, **fixed) -> str:
+        """获取模板的静态系统提示词
+        
+        Args:
+            template_key: 模板名称，与PROMPT_TEMPLATES相同
+            fixed: 部署期固定的参数，如word_count
+        Returns:
+            str: 系统提示词，参数相同时每次返回完全相同的文本
+        """
+        return TextFilter.filter_useless(SYSTEM_PROMPTS[template_key].format(scenario=SCENARIO_DESC, **fixed))
+
+    @classmethod
+    def _render(cls, template_key: str, sections: List[PromptSection],
+                assembler: Optional[PromptAssembler] = None, token_budget: Optional[int] = None, **fixed) -> str:
+        """渲染模板，有预算时通过assembler组装"""
+        template = COMPILED_TEMPLATES[template_key]
+        for section in sections:
+            if not section.sanitized:
+                section.items = [TextFilter.filter_useless(item) for item in section.items]
+        if assembler is not None and token_budget:
+            prompt = assembler.assemble(template, sections, token_budget, **fixed)
+        else:
+            prompt = template.format(**fixed, **{s.name: s.separator.join(s.items) for s in sections})
+        return prompt.strip()
+
     @classmethod
-    def format_deep_analysis_prompt(cls, query: str, summaries: str) -> str:
+    def format_deep_analysis_prompt(cls, query: str, summaries: Union[str, List[str]],
+                                    assembler: Optional[PromptAssembler] = None, token_budget: Optional[int] = None) -> str:
         """格式化深度分析提示词
         
         Args:
             query: 用户查询
-            summaries: 摘要内容
-            context: 历史对话上下文，默认为空字符串
+            summaries: 摘要内容，或按重要性排列的文章列表
+            assembler: prompt组装器
+            token_budget: prompt可用token数
         Returns:
             str: 格式化后的提示词
         """
-        return TextFilter.filter_useless(
-            PROMPT_TEMPLATES["DEEP_ANALYSIS_TEMPLATE"].format(
-                query=query, 
-                summaries=summaries, 
-                current_time=datetime.now().strftime("%Y-%m-%d")
-            )
+        return cls._render(
+            "DEEP_ANALYSIS_TEMPLATE",
+            [
+                PromptSection("query", query, priority=0),
+                PromptSection("summaries", summaries, priority=2, sanitized=True),
+            ],
+            assembler,
+            token_budget,
+            current_time=datetime.now().strftime("%Y-%m-%d")
         )
     
     @classmethod
-    def format_evaluate_information_prompt(cls, query: str, context: str, article_text: str) -> str:
+    def format_evaluate_information_prompt(cls, query: str, context: str, article_text: Union[str, List[str]],
+                                           assembler: Optional[PromptAssembler] = None, token_budget: Optional[int] = None) -> str:
         """格式化信息充分性评估提示词
         
         Args:
             query: 用户查询
             context: 历史对话上下文
-            article_text: 已收集的文章文本
+            article_text: 已收集的文章文本，或按重要性排列的文章列表
+            assembler: prompt组装器
+            token_budget: prompt可用token数
         Returns:
             str: 格式化后的提示词
         """
-        return TextFilter.filter_useless(
-            PROMPT_TEMPLATES["EVALUATE_INFORMATION_TEMPLATE"].format(
-                query=query, 
-                context=context, 
-                article_text=article_text, 
-                current_time=datetime.now().strftime("%Y-%m-%d"),
-                scenario=SCENARIO_DESC
-            )
+        return cls._render(
+            "EVALUATE_INFORMATION_TEMPLATE",
+            [
+                PromptSection("query", query, priority=0),
+                PromptSection("context", context, priority=1, keep="tail"),
+                PromptSection("article_text", article_text, priority=2, sanitized=True),
+            ],
+            assembler,
+            token_budget,
+            current_time=datetime.now().strftime("%Y-%m-%d")
         )
 
+    @staticmethod
+    def article_quality_template_key(extractive: bool = False, batch: bool = False) -> str:
+        """文章质量评估的模板名，同时用作system_prompt()和结构化输出schema的键"""
+        return f"ARTICLE_QUALITY{'_EXTRACTIVE' if extractive else ''}{'_BATCH' if batch else ''}_TEMPLATE"
+
     @classmethod
-    def format_article_quality_prompt(cls, article: str, word_count: int = 5000, query: str = None) -> str:
+    def format_article_quality_prompt(cls, article: str, query: str = None,
+                                      assembler: Optional[PromptAssembler] = None, token_budget: Optional[int] = None,
+                                      extractive: bool = False) -> str:
         """
-        格式化文章质量评估提示词
+        格式化文章质量评估提示词，系统提示词为system_prompt(article_quality_template_key(extractive), word_count=...)
         
         Args:
             article: 文章内容
-            word_count: 文章字数
+            query: 用户查询
+            assembler: prompt组装器
+            token_budget: prompt可用token数
+            extractive: 抽取式压缩，文章按split_paragraphs()编号，模型只返回保留的段落序号
         Returns:
             str: 格式化后的提示词
         """
-        return TextFilter.filter_useless(
-            PROMPT_TEMPLATES["ARTICLE_QUALITY_TEMPLATE"].format(
-                article=article, 
-                query=query,
-                word_count=word_count,
-                current_time=datetime.now().strftime("%Y-%m-%d"),
-                scenario=SCENARIO_DESC
-            )
+        return cls._render(
+            cls.article_quality_template_key(extractive),
+            [
+                PromptSection("query", query, priority=0),
+                PromptSection("article", number_paragraphs(split_paragraphs(article)) if extractive else article,
+                              priority=1, sanitized=True),
+            ],
+            assembler,
+            token_budget,
+            current_time=datetime.now().strftime("%Y-%m-%d")
         )
+
+    @classmethod
+    def format_article_quality_batch_prompt(cls, articles: List[str], query: str = None, extractive: bool = False) -> str:
+        """
+        格式化文章质量批量评估提示词，系统提示词为system_prompt(article_quality_template_key(extractive, batch=True), word_count=...)
+        
+        Args:
+            articles: 文章内容列表，序号即列表下标
+            query: 用户查询
+            extractive: 抽取式压缩，每篇文章按split_paragraphs()编号
+        Returns:
+            str: 格式化后的提示词
+        """
+        if extractive:
+            articles = [number_paragraphs(split_paragraphs(article)) for article in articles]
+        return COMPILED_TEMPLATES[cls.article_quality_template_key(extractive, batch=True)].format(
+            articles="\n\n".join(f"[文章{i}]\n{article}" for i, article in enumerate(articles)),
+            query=TextFilter.filter_useless(query),
+            current_time=datetime.now().strftime("%Y-%m-%d")
+        ).strip()
     
     @classmethod
-    def format_content_compression_prompt(cls, query: str, existing_content: str, new_content: str, token_limit: int) -> str:
+    def format_article_excerpt_prompt(cls, excerpt: str, query: str = None) -> str:
+        """
+        格式化文章摘录初筛提示词，系统提示词为system_prompt("ARTICLE_QUALITY_EXCERPT_TEMPLATE")
+        
+        Args:
+            excerpt: head_excerpt()生成的文章摘录
+            query: 用户查询
+        Returns:
+            str: 格式化后的提示词
+        """
+        return cls._render(
+            "ARTICLE_QUALITY_EXCERPT_TEMPLATE",
+            [
+                PromptSection("query", query, priority=0),
+                PromptSection("excerpt", excerpt, priority=1, sanitized=True),
+            ],
+            current_time=datetime.now().strftime("%Y-%m-%d")
+        )
+
+    @classmethod
+    def format_content_compression_prompt(cls, query: str, existing_content: Union[str, List[str]], new_content: str, token_limit: int,
+                                          assembler: Optional[PromptAssembler] = None, token_budget: Optional[int] = None) -> str:
         """格式化内容压缩统一管理提示词
         
         Args:
             query: 用户查询
-            existing_content: 现有内容集合
+            existing_content: 现有内容集合，或按重要性排列的文章列表
             new_content: 新内容
             token_limit: token限制
+            assembler: prompt组装器
+            token_budget: prompt可用token数
+        Returns:
+            str: 格式化后的提示词
+        """
+        return cls._render(
+            "CONTENT_COMPRESSION_TEMPLATE",
+            [
+                PromptSection("query", query, priority=0),
+                PromptSection("new_content", new_content, priority=1, sanitized=True),
+                PromptSection("existing_content", existing_content, priority=2, sanitized=True),
+            ],
+            assembler,
+            token_budget,
+            token_limit=int(token_limit * 0.8),
+            current_time=datetime.now().strftime("%Y-%m-%d")
+        )
+
+    @classmethod
+    def format_json_repair_prompt(cls, schema: str, broken_output: str) -> str:
+        """格式化JSON修复提示词，系统提示词为system_prompt("JSON_REPAIR_TEMPLATE")
+        
+        Args:
+            schema: JSON Schema文本
+            broken_output: 需要修复的输出
         Returns:
             str: 格式化后的提示词
         """
-        return TextFilter.filter_useless(
-            PROMPT_TEMPLATES["CONTENT_COMPRESSION_TEMPLATE"].format(
-                query=query,
-                existing_content=existing_content,
-                new_content=new_content,
-                token_limit=int(token_limit * 0.8),
-                current_time=datetime.now().strftime("%Y-%m-%d")
-            )
-        )
\ No newline at end of file
+        return COMPILED_TEMPLATES["JSON_REPAIR_TEMPLATE"].format(schema=schema, broken_output=broken_output)
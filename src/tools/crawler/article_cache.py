@@ -0,0 +1,196 @@
+"""
+处理后文章缓存
+按规范化URL缓存抓取并清理后的Markdown正文，以及各用户查询下的质量评估结果（标题、压缩正文、场景），
+同一URL在有效期内再次出现时不再重新抓取、转换和评估；保存在Redis中供所有会话和worker共享，未配置Redis时只保存在进程内
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+logger = logging.getLogger(__name__)
+
+# 不影响页面内容的跟踪参数
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "yclid", "spm", "ref_src"}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_url(url: str) -> str:
+    """
+    规范化URL：协议和域名小写、去掉默认端口、锚点和跟踪参数，其余查询参数排序，去掉路径末尾斜杠
+
+    与WebCrawler.normalize_url不同，保留影响页面内容的查询参数（如?id=123）
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parsed.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunparse((scheme, host, parsed.path.rstrip("/") or "/", "", urlencode(query), ""))
+
+
+def query_key(query: Optional[str]) -> str:
+    """质量评估与用户查询相关，评估结果按查询分别缓存"""
+    return hashlib.sha1(" ".join((query or "").lower().split()).encode("utf-8")).hexdigest()[:16]
+
+
+class ProcessedArticleCache:
+    """
+    处理后文章缓存
+
+    每个规范化URL保存一条记录：content为抓取清理后的Markdown正文，verdicts按查询保存质量评估结果
+    （high_quality、reason、title、compress、scenario以及压缩后的content），每条记录最多保留max_verdicts个查询；
+    正文抓取失败时不缓存，质量评估失败时只缓存正文，下次重新评估
+    """
+
+    def __init__(self, enabled: bool = False, redis_client: Any = None, key_prefix: str = "crawler_article:",
+                 ttl: int = 86400, max_entries: int = 512, max_verdicts: int = 20):
+        self.enabled = enabled
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_verdicts = max_verdicts
+        # key -> (过期时间, 记录)
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"lookups": 0, "verdict_hits": 0, "content_hits": 0, "misses": 0, "stored": 0,
+                      "redis_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "ProcessedArticleCache":
+        """根据环境变量创建，Redis未配置或不可用时只保存在进程内"""
+        redis_client = None
+        enabled = os.getenv("CRAWLER_ARTICLE_CACHE_ENABLED", "false").lower() == "true"
+        redis_host = os.getenv("REDIS_HOST")
+        if enabled and redis_host:
+            try:
+                import redis.asyncio as aioredis
+                redis_client = aioredis.Redis(
+                    host=redis_host,
+                    port=int(os.getenv("REDIS_PORT", "6379")),
+                    db=int(os.getenv("REDIS_DB", "0")),
+                    password=os.getenv("REDIS_PASSWORD", None),
+                    decode_responses=True,
+                    socket_connect_timeout=1,
+                    socket_timeout=1
+                )
+            except Exception as e:
+                logger.warning(f"文章缓存Redis初始化失败，仅保存在进程内: {str(e)}")
+                redis_client = None
+        return cls(
+            enabled=enabled,
+            redis_client=redis_client,
+            ttl=int(os.getenv("CRAWLER_ARTICLE_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("CRAWLER_ARTICLE_CACHE_MAX_ENTRIES", "512"))
+        )
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._local.get(key)
+        if entry is not None:
+            if entry[0] > time.time():
+                self._local.move_to_end(key)
+                return entry[1]
+            del self._local[key]
+        if self.redis_client is None:
+            return None
+        try:
+            value = await self.redis_client.get(self.key_prefix + key)
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.debug(f"读取文章缓存失败: {str(e)}")
+            return None
+        if not value:
+            return None
+        record = json.loads(value)
+        self._store_local(key, record, record["fetched_at"] + self.ttl)
+        return record
+
+    def _store_local(self, key: str, record: Dict[str, Any], expires_at: float):
+        self._local[key] = (expires_at, record)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def _save(self, key: str, record: Dict[str, Any]):
+        # 有效期从抓取正文时开始计算，补充查询的评估结果不延长有效期
+        remaining = int(record["fetched_at"] + self.ttl - time.time())
+        if remaining <= 0:
+            return
+        self._store_local(key, record, record["fetched_at"] + self.ttl)
+        self.stats["stored"] += 1
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(self.key_prefix + key, json.dumps(record, ensure_ascii=False), ex=remaining)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.debug(f"写入文章缓存失败: {str(e)}")
+
+    async def get(self, url: str, query: Optional[str]) -> Dict[str, Any]:
+        """
+        查询缓存
+
+        Args:
+            url: 文章URL
+            query: 用户查询
+        Returns:
+            Dict[str, Any]: content为缓存的正文（没有时为None），verdict为该查询下的评估结果（没有时为None）
+        """
+        if not self.enabled:
+            return {"content": None, "verdict": None}
+        self.stats["lookups"] += 1
+        record = await self._load(self.key(url))
+        if record is None:
+            self.stats["misses"] += 1
+            return {"content": None, "verdict": None}
+        verdict = record["verdicts"].get(query_key(query))
+        self.stats["verdict_hits" if verdict is not None else "content_hits"] += 1
+        return {"content": record["content"], "verdict": verdict}
+
+    async def put(self, url: str, query: Optional[str], content: str, verdict: Optional[Dict[str, Any]] = None):
+        """
+        保存正文和该查询下的评估结果，正文与缓存中不同时（页面已更新）丢弃其他查询的旧评估结果
+
+        Args:
+            url: 文章URL
+            query: 用户查询
+            content: 抓取清理后的正文
+            verdict: 返回给调用方的处理结果，为None时只缓存正文
+        """
+        if not self.enabled or not content:
+            return
+        key = self.key(url)
+        record = await self._load(key)
+        if record is None or record["content"] != content:
+            record = {"url": canonical_url(url), "content": content, "fetched_at": time.time(), "verdicts": {}}
+        if verdict is not None:
+            verdicts = record["verdicts"]
+            verdicts.pop(query_key(query), None)
+            verdicts[query_key(query)] = {**verdict, "judged_at": time.time()}
+            while len(verdicts) > self.max_verdicts:
+                verdicts.pop(next(iter(verdicts)))
+        await self._save(key, record)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "enabled": self.enabled, "local_entries": len(self._local)}
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.close()
+            except Exception as e:
+                logger.debug(f"关闭文章缓存Redis连接失败: {str(e)}")
@@ -0,0 +1,274 @@
+"""
+Playwright浏览器池
+进程内常驻一个Playwright驱动和若干Chromium实例，抓取时从池中租用已有的浏览器上下文和页面，
+浏览器服务满一定页数或崩溃后回收重建；直连与代理流量使用各自的池，避免每个URL都启动一次浏览器
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fake_useragent import UserAgent
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--no-sandbox",
+    "--disable-web-security",
+    "--disable-features=IsolateOrigins,site-per-process",
+    "--use-fake-ui-for-media-stream",
+    "--use-fake-device-for-media-stream",
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-software-rasterizer"
+]
+
+STEALTH_SCRIPT = """
+    Object.defineProperty(navigator, 'webdriver', {
+        get: () => undefined
+    })
+    window.generateMouseMove = () => {
+        const path = Array.from({length: 20}, () => ({
+            x: Math.random() * window.innerWidth,
+            y: Math.random() * window.innerHeight,
+            duration: Math.random() * 300 + 200
+        }))
+        path.forEach(p => {
+            window.dispatchEvent(new MouseEvent('mousemove', p))
+        })
+    }
+"""
+
+BLOCKED_RESOURCE_TYPES = {"image", "media", "stylesheet", "font"}
+
+
+class _PooledBrowser:
+    """池中的一个浏览器实例及其空闲的 (上下文, 页面)"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.idle: List[Tuple[Any, Any]] = []
+        self.leased = 0
+        self.served = 0
+        self.retired = False
+        self.crashed = False
+
+
+class BrowserPool:
+    """
+    浏览器池
+
+    最多size个浏览器，每个浏览器同时租出pages_per_browser个页面，租用超过容量时排队等待；
+    每次租用复用空闲的上下文和页面（已设置反检测脚本和资源拦截），抓取出错的上下文直接关闭不再复用；
+    浏览器累计服务max_pages个页面后不再分配新租用，租出的页面全部归还后关闭，崩溃断开的浏览器立即移出
+    """
+
+    def __init__(self, name: str, proxy: Optional[Dict[str, str]] = None, size: int = 2,
+                 pages_per_browser: int = 4, max_pages: int = 200):
+        self.name = name
+        self.proxy = proxy
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.max_pages = max_pages
+        self._playwright = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._browsers: List[_PooledBrowser] = []
+        self._lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self.stats = {"launched": 0, "recycled": 0, "crashed": 0, "leases": 0, "contexts_created": 0,
+                      "contexts_discarded": 0, "acquire_wait_seconds": 0.0}
+
+    def _ensure_loop(self):
+        # 池中的对象绑定在创建它们的事件循环上，换了事件循环（如多次asyncio.run）时重新初始化
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._playwright = None
+            self._browsers = []
+            self._lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self.size * self.pages_per_browser)
+
+    async def _launch(self) -> _PooledBrowser:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        options = {
+            "headless": True,
+            "args": LAUNCH_ARGS + [f"--user-agent={UserAgent().random}"],
+            "env": {"SSLKEYLOGFILE": "/dev/null"}
+        }
+        if self.proxy:
+            options["proxy"] = self.proxy
+        browser = await self._playwright.chromium.launch(**options)
+        pooled = _PooledBrowser(browser)
+
+        def on_disconnected(_):
+            if not pooled.retired:
+                pooled.crashed = True
+                self.stats["crashed"] += 1
+                logger.warning(f"浏览器池 {self.name} 中的浏览器意外断开，已移出")
+            if pooled in self._browsers:
+                self._browsers.remove(pooled)
+
+        browser.on("disconnected", on_disconnected)
+        self.stats["launched"] += 1
+        logger.info(f"浏览器池 {self.name} 启动浏览器，当前{len(self._browsers) + 1}个")
+        return pooled
+
+    async def _new_page(self, pooled: _PooledBrowser) -> Tuple[Any, Any]:
+        context = await pooled.browser.new_context(
+            user_agent=UserAgent().random,
+            viewport={"width": 1920, "height": 1080},
+            locale="en-US,en;q=0.9",
+            timezone_id="America/New_York",
+            permissions=["geolocation"],
+            geolocation={"latitude": 40.7128, "longitude": -74.0060},
+            color_scheme="dark"
+        )
+        try:
+            await context.add_init_script(STEALTH_SCRIPT)
+            await context.route("**/*", lambda route: route.abort()
+                                if route.request.resource_type in BLOCKED_RESOURCE_TYPES
+                                else route.continue_())
+            page = await context.new_page()
+        except Exception:
+            await self._close_quietly(context)
+            raise
+        self.stats["contexts_created"] += 1
+        return context, page
+
+    async def _pick_browser(self) -> _PooledBrowser:
+        # 启动浏览器也在锁内进行，并发的首批租用等待同一个浏览器启动，而不是各自启动一个
+        async with self._lock:
+            for pooled in self._browsers:
+                if not pooled.retired and not pooled.crashed and pooled.leased < self.pages_per_browser:
+                    pooled.leased += 1
+                    return pooled
+            pooled = await self._launch()
+            pooled.leased += 1
+            self._browsers.append(pooled)
+            return pooled
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """
+        租用一个页面，退出时归还；with块内抛出异常时该页面的上下文被关闭而不是放回池中
+
+        Yields:
+            Page: 已设置反检测脚本和资源拦截的页面
+        """
+        self._ensure_loop()
+        start = time.monotonic()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self.stats["acquire_wait_seconds"] += time.monotonic() - start
+        pooled = None
+        context = page = None
+        healthy = False
+        try:
+            pooled = await self._pick_browser()
+            pooled.served += 1
+            self.stats["leases"] += 1
+            context, page = pooled.idle.pop() if pooled.idle else await self._new_page(pooled)
+            yield page
+            healthy = not page.is_closed()
+        finally:
+            try:
+                if context is not None:
+                    await self._release(pooled, context, page, healthy)
+                elif pooled is not None:
+                    pooled.leased -= 1
+            finally:
+                self._slots.release()
+
+    async def _release(self, pooled: _PooledBrowser, context, page, healthy: bool):
+        pooled.leased -= 1
+        if pooled.served >= self.max_pages and not pooled.retired:
+            pooled.retired = True
+            self.stats["recycled"] += 1
+            logger.info(f"浏览器池 {self.name} 中的浏览器已服务{pooled.served}个页面，回收重建")
+        if healthy and not pooled.retired and not pooled.crashed:
+            try:
+                # 离开当前站点，停止页面脚本和未完成的请求
+                await page.goto("about:blank")
+                pooled.idle.append((context, page))
+            except Exception:
+                healthy = False
+        if not healthy or pooled.retired or pooled.crashed:
+            self.stats["contexts_discarded"] += 1
+            await self._close_quietly(context)
+        if pooled.retired and pooled.leased == 0:
+            if pooled in self._browsers:
+                self._browsers.remove(pooled)
+            await self._close_quietly(pooled.browser)
+
+    @staticmethod
+    async def _close_quietly(closable):
+        try:
+            await closable.close()
+        except Exception as e:
+            logger.debug(f"关闭浏览器资源失败: {str(e)}")
+
+    async def close(self):
+        """关闭池中所有浏览器和Playwright驱动"""
+        browsers, self._browsers = self._browsers, []
+        for pooled in browsers:
+            pooled.retired = True
+            await self._close_quietly(pooled.browser)
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                logger.debug(f"关闭Playwright驱动失败: {str(e)}")
+            self._playwright = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        capacity = self.size * self.pages_per_browser
+        leased = sum(pooled.leased for pooled in self._browsers)
+        return {
+            **self.stats,
+            "browsers": len(self._browsers),
+            "max_browsers": self.size,
+            "leased_pages": leased,
+            "idle_pages": sum(len(pooled.idle) for pooled in self._browsers),
+            "waiting": self._waiting,
+            "capacity": capacity,
+            "occupancy": leased / capacity if capacity else 0.0
+        }
+
+
+class BrowserPoolManager:
+    """直连与代理两个浏览器池"""
+
+    def __init__(self, proxy: Optional[Dict[str, str]] = None, size: int = 2, pages_per_browser: int = 4,
+                 max_pages: int = 200, proxy_size: int = 1):
+        self.direct = BrowserPool("direct", None, size, pages_per_browser, max_pages)
+        self.proxied = BrowserPool("proxy", proxy, proxy_size, pages_per_browser, max_pages)
+
+    @classmethod
+    def from_env(cls, proxy: Optional[Dict[str, str]] = None) -> "BrowserPoolManager":
+        return cls(
+            proxy=proxy,
+            size=int(os.getenv("CRAWLER_BROWSER_POOL_SIZE", "2")),
+            pages_per_browser=int(os.getenv("CRAWLER_BROWSER_PAGES_PER_BROWSER", "4")),
+            max_pages=int(os.getenv("CRAWLER_BROWSER_MAX_PAGES", "200")),
+            proxy_size=int(os.getenv("CRAWLER_PROXY_BROWSER_POOL_SIZE", "1"))
+        )
+
+    def pool(self, use_proxy: bool) -> BrowserPool:
+        return self.proxied if use_proxy else self.direct
+
+    async def close(self):
+        await self.direct.close()
+        await self.proxied.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"direct": self.direct.get_stats(), "proxy": self.proxied.get_stats()}
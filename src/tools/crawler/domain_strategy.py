@@ -0,0 +1,170 @@
+"""
+按域名记忆抓取策略
+记录每个域名下各抓取策略（直接HTTP、浏览器、代理浏览器）的成功率和耗时，下次抓取同一域名时
+先尝试上次成功的策略，跳过近期几乎总是失败的策略，避免每次都重新试错并耗尽整个抓取超时；
+画像保存在进程内，配置Redis时同时写入Redis供多个worker共享并在重启后保留
+"""
+
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STRATEGY_HTTP = "http"
+STRATEGY_BROWSER = "browser"
+STRATEGY_PROXY = "proxy"
+DEFAULT_ORDER = (STRATEGY_HTTP, STRATEGY_BROWSER, STRATEGY_PROXY)
+
+
+class DomainStrategyMemory:
+    """
+    域名抓取策略画像
+
+    每个策略记录成功/失败次数、成功率（指数滑动平均）、耗时（指数滑动平均）和最近一次成功/失败时间；
+    plan()把最近成功的策略排到最前，尝试次数不少于min_attempts且成功率低于skip_below的策略在
+    retry_after秒内跳过，过期后重新尝试一次以便发现站点恢复
+    """
+
+    def __init__(self, redis_client: Any = None, key_prefix: str = "crawler_domain:", ttl: int = 7 * 86400,
+                 max_entries: int = 4096, refresh_interval: int = 300, min_attempts: int = 3,
+                 skip_below: float = 0.2, retry_after: int = 3600, alpha: float = 0.3):
+        self.redis_client = redis_client
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self.min_attempts = min_attempts
+        self.skip_below = skip_below
+        self.retry_after = retry_after
+        self.alpha = alpha
+        # domain -> (加载时间, 画像)
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"plans": 0, "preferred_first": 0, "skipped": {}, "redis_errors": 0}
+
+    @classmethod
+    def from_env(cls) -> "DomainStrategyMemory":
+        """根据环境变量创建，Redis未配置或不可用时只保存在进程内"""
+        redis_client = None
+        redis_host = os.getenv("REDIS_HOST")
+        if redis_host and os.getenv("CRAWLER_DOMAIN_PROFILE_REDIS_ENABLED", "true").lower() == "true":
+            try:
+                import redis.asyncio as aioredis
+                redis_client = aioredis.Redis(
+                    host=redis_host,
+                    port=int(os.getenv("REDIS_PORT", "6379")),
+                    db=int(os.getenv("REDIS_DB", "0")),
+                    password=os.getenv("REDIS_PASSWORD", None),
+                    decode_responses=True,
+                    socket_connect_timeout=1,
+                    socket_timeout=1
+                )
+            except Exception as e:
+                logger.warning(f"域名抓取策略Redis初始化失败，仅保存在进程内: {str(e)}")
+                redis_client = None
+        return cls(
+            redis_client=redis_client,
+            ttl=int(os.getenv("CRAWLER_DOMAIN_PROFILE_TTL", str(7 * 86400))),
+            min_attempts=int(os.getenv("CRAWLER_DOMAIN_MIN_ATTEMPTS", "3")),
+            skip_below=float(os.getenv("CRAWLER_DOMAIN_SKIP_BELOW", "0.2")),
+            retry_after=int(os.getenv("CRAWLER_DOMAIN_RETRY_AFTER", "3600"))
+        )
+
+    async def _load(self, domain: str) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        entry = self._local.get(domain)
+        if entry is not None and (self.redis_client is None or now - entry[0] < self.refresh_interval):
+            self._local.move_to_end(domain)
+            return entry[1]
+        profile = entry[1] if entry is not None else {}
+        if self.redis_client is not None:
+            try:
+                value = await self.redis_client.get(self.key_prefix + domain)
+                if value:
+                    profile = json.loads(value)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.debug(f"读取域名抓取策略失败 {domain}: {str(e)}")
+        self._store_local(domain, profile, now)
+        return profile
+
+    def _store_local(self, domain: str, profile: Dict[str, Dict[str, Any]], loaded_at: float):
+        self._local[domain] = (loaded_at, profile)
+        self._local.move_to_end(domain)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    def _doomed(self, record: Optional[Dict[str, Any]], now: float) -> bool:
+        if not record:
+            return False
+        attempts = record["success"] + record["failure"]
+        return (attempts >= self.min_attempts and record["success_rate"] < self.skip_below
+                and now - record.get("last_failure", 0) < self.retry_after)
+
+    async def plan(self, domain: str, strategies: List[str]) -> List[str]:
+        """
+        给出本次抓取的策略顺序
+
+        Args:
+            domain: 域名
+            strategies: 当前可用的策略，按默认顺序排列
+        Returns:
+            List[str]: 依次尝试的策略；全部被跳过时返回默认顺序
+        """
+        self.stats["plans"] += 1
+        if not domain:
+            return list(strategies)
+        profile = await self._load(domain)
+        now = time.time()
+        planned = []
+        for strategy in strategies:
+            if self._doomed(profile.get(strategy), now):
+                self.stats["skipped"][strategy] = self.stats["skipped"].get(strategy, 0) + 1
+            else:
+                planned.append(strategy)
+        if not planned:
+            return list(strategies)
+        last_success = {s: profile.get(s, {}).get("last_success", 0) for s in planned}
+        preferred = max(planned, key=lambda s: last_success[s])
+        if last_success[preferred] and preferred != planned[0]:
+            self.stats["preferred_first"] += 1
+            planned.remove(preferred)
+            planned.insert(0, preferred)
+        return planned
+
+    async def record(self, domain: str, strategy: str, success: bool, latency: float):
+        """记录一次抓取结果并写回Redis"""
+        if not domain:
+            return
+        profile = await self._load(domain)
+        record = profile.setdefault(strategy, {
+            "success": 0, "failure": 0, "success_rate": 1.0 if success else 0.0, "latency": latency
+        })
+        record["success" if success else "failure"] += 1
+        record["success_rate"] = (1 - self.alpha) * record["success_rate"] + self.alpha * (1.0 if success else 0.0)
+        record["latency"] = round((1 - self.alpha) * record["latency"] + self.alpha * latency, 3)
+        record["last_success" if success else "last_failure"] = int(time.time())
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.set(self.key_prefix + domain, json.dumps(profile), ex=self.ttl)
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.debug(f"写入域名抓取策略失败 {domain}: {str(e)}")
+
+    def get_profile(self, domain: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        entry = self._local.get(domain)
+        return entry[1] if entry is not None else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "skipped": dict(self.stats["skipped"]), "domains": len(self._local)}
+
+    async def close(self):
+        """关闭Redis连接"""
+        if self.redis_client is not None:
+            try:
+                await self.redis_client.close()
+            except Exception as e:
+                logger.debug(f"关闭域名抓取策略Redis连接失败: {str(e)}")
@@ -0,0 +1,280 @@
+"""
+HTTP响应磁盘缓存
+把HTTP抓取到的原始响应（压缩后的正文和ETag/Last-Modified等校验信息）按URL保存在本地目录，
+新鲜期内的重复抓取直接读取缓存，过期后带If-None-Match/If-Modified-Since发起条件请求，返回304时沿用缓存正文；
+新鲜期可按域名配置（如arXiv的PDF内容不会变化，可以缓存很久），缓存总大小超出上限时按最近访问时间淘汰
+"""
+
+import os
+import json
+import time
+import zlib
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "data/http_cache"
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*(\d+)", re.I)
+
+
+def parse_domain_ttls(spec: str) -> Dict[str, int]:
+    """解析 "arxiv.org=2592000,example.com=0" 形式的按域名新鲜期配置"""
+    ttls = {}
+    for item in (spec or "").split(","):
+        domain, _, ttl = item.strip().partition("=")
+        if domain and ttl.strip().lstrip("-").isdigit():
+            ttls[domain.strip().lower()] = int(ttl)
+    return ttls
+
+
+class CachedResponse:
+    """缓存中的一条响应，body为解压后的正文"""
+
+    def __init__(self, meta: Dict[str, Any], body: bytes, compressed: bytes):
+        self.meta = meta
+        self.body = body
+        # 304后只更新元数据，沿用压缩后的正文而不重新压缩
+        self.compressed = compressed
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """条件请求头"""
+        headers = {}
+        if self.meta.get("etag"):
+            headers["If-None-Match"] = self.meta["etag"]
+        if self.meta.get("last_modified"):
+            headers["If-Modified-Since"] = self.meta["last_modified"]
+        return headers
+
+
+class HttpCache:
+    """
+    HTTP响应磁盘缓存
+
+    每个URL对应一个文件：第一行是JSON元数据，其后是zlib压缩的正文，写入时先写临时文件再替换，避免读到半个文件；
+    新鲜期优先使用按域名配置（匹配域名及其子域名），其次是响应的Cache-Control max-age，最后是默认新鲜期；
+    响应带no-store时不缓存，带no-cache时每次都重新校验
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, enabled: bool = False, max_bytes: int = 1024 ** 3,
+                 default_ttl: int = 3600, domain_ttls: Optional[Dict[str, int]] = None, compress_level: int = 6):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.domain_ttls = domain_ttls or {}
+        self.compress_level = compress_level
+        # key -> 文件大小，按最近访问顺序排列
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "refetched": 0, "stale_served": 0,
+                      "stored": 0, "evicted": 0, "errors": 0, "bytes_served": 0}
+
+    @classmethod
+    def from_env(cls) -> "HttpCache":
+        return cls(
+            cache_dir=os.getenv("CRAWLER_HTTP_CACHE_DIR", DEFAULT_CACHE_DIR),
+            enabled=os.getenv("CRAWLER_HTTP_CACHE_ENABLED", "false").lower() == "true",
+            max_bytes=int(os.getenv("CRAWLER_HTTP_CACHE_MAX_BYTES", str(1024 ** 3))),
+            default_ttl=int(os.getenv("CRAWLER_HTTP_CACHE_TTL", "3600")),
+            domain_ttls=parse_domain_ttls(os.getenv("CRAWLER_HTTP_CACHE_DOMAIN_TTLS", ""))
+        )
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self):
+        # 进程启动后第一次使用时扫描缓存目录，按文件修改时间恢复访问顺序
+        if self._loaded:
+            return
+        self._loaded = True
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _touch(self, key: str, size: int):
+        self._total_bytes += size - self._index.pop(key, 0)
+        self._index[key] = size
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            self.stats["evicted"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _read(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                meta = json.loads(f.readline())
+                return meta, f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, meta: Dict[str, Any], compressed: bytes) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8") + b"\n")
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return os.path.getsize(path)
+
+    def _remove(self, key: str):
+        self._total_bytes -= self._index.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def ttl_for(self, url: str, cache_control: str = "") -> int:
+        """URL的新鲜期秒数"""
+        host = (url.split("://", 1)[-1].split("/", 1)[0].split(":", 1)[0]).lower()
+        parts = host.split(".")
+        for i in range(len(parts)):
+            ttl = self.domain_ttls.get(".".join(parts[i:]))
+            if ttl is not None:
+                return ttl
+        if "no-cache" in cache_control.lower():
+            return 0
+        match = _MAX_AGE.search(cache_control)
+        if match:
+            return int(match.group(1))
+        return self.default_ttl
+
+    def is_fresh(self, cached: CachedResponse) -> bool:
+        return time.time() - cached.meta["stored_at"] < cached.meta["ttl"]
+
+    async def get(self, url: str) -> Optional[CachedResponse]:
+        """读取URL的缓存，不存在或读取失败时为None；是否新鲜由is_fresh()判断"""
+        if not self.enabled:
+            return None
+        self._load_index()
+        key = self.key(url)
+        if key not in self._index:
+            self.stats["misses"] += 1
+            return None
+        try:
+            entry = await asyncio.to_thread(self._read, key)
+            if entry is None or entry[0].get("url") != url:
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+            meta, compressed = entry
+            body = await asyncio.to_thread(zlib.decompress, compressed)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"读取HTTP缓存失败 {url}: {str(e)}")
+            self._remove(key)
+            return None
+        self._index.move_to_end(key)
+        return CachedResponse(meta, body, compressed)
+
+    def record_hit(self, cached: CachedResponse, kind: str = "hits"):
+        """记录一次由缓存提供的响应，kind为hits（新鲜）、revalidated（304）或stale_served（请求失败时使用过期缓存）"""
+        self.stats[kind] += 1
+        self.stats["bytes_served"] += len(cached.body)
+
+    async def put(self, url: str, final_url: str, status: int, content_type: str, encoding: Optional[str],
+                  body: bytes, headers: Dict[str, str]) -> bool:
+        """
+        保存一条响应
+
+        Args:
+            url: 请求的URL（重定向前），缓存按该URL查找
+            final_url: 重定向后的URL
+            status: 状态码，只缓存200
+            content_type: 响应类型
+            encoding: 字符集
+            body: 响应正文
+            headers: 响应头，读取ETag、Last-Modified和Cache-Control
+        Returns:
+            bool: 是否已缓存
+        """
+        if not self.enabled or status != 200:
+            return False
+        cache_control = headers.get("Cache-Control", "")
+        if "no-store" in cache_control.lower():
+            return False
+        meta = {
+            "url": url,
+            "final_url": final_url,
+            "status": status,
+            "content_type": content_type,
+            "encoding": encoding,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "stored_at": time.time(),
+            "ttl": self.ttl_for(url, cache_control)
+        }
+        # 既没有校验信息也没有新鲜期的响应缓存后无法再使用
+        if meta["ttl"] <= 0 and not meta["etag"] and not meta["last_modified"]:
+            return False
+        try:
+            compressed = await asyncio.to_thread(zlib.compress, body, self.compress_level)
+            await self._store(url, meta, compressed)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"写入HTTP缓存失败 {url}: {str(e)}")
+            return False
+        self.stats["stored"] += 1
+        return True
+
+    async def refresh(self, url: str, cached: CachedResponse, headers: Dict[str, str]):
+        """304后更新缓存时间和校验信息，正文不变"""
+        meta = dict(cached.meta)
+        meta["stored_at"] = time.time()
+        meta["etag"] = headers.get("ETag") or meta.get("etag")
+        meta["last_modified"] = headers.get("Last-Modified") or meta.get("last_modified")
+        if headers.get("Cache-Control"):
+            meta["ttl"] = self.ttl_for(url, headers["Cache-Control"])
+        try:
+            await self._store(url, meta, cached.compressed)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"更新HTTP缓存失败 {url}: {str(e)}")
+
+    async def _store(self, url: str, meta: Dict[str, Any], compressed: bytes):
+        self._load_index()
+        key = self.key(url)
+        size = await asyncio.to_thread(self._write, key, meta, compressed)
+        self._touch(key, size)
+        self._evict()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["revalidated"] + self.stats["refetched"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "entries": len(self._index),
+            "total_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": (self.stats["hits"] + self.stats["revalidated"]) / lookups if lookups else 0.0
+        }
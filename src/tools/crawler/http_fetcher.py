@@ -0,0 +1,262 @@
+"""
+HTTP抓取层
+用共享的aiohttp连接池（长连接、DNS缓存）直接GET页面，大部分服务端渲染的文章无需启动浏览器；
+按响应内容判断是否需要升级到Playwright：JS渲染的空壳页面、反爬验证页面、非200响应等；
+配置了磁盘缓存时先查缓存，新鲜的响应不再请求，过期的响应通过条件请求校验
+"""
+
+import os
+import re
+import codecs
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from src.tools.crawler.http_cache import CachedResponse, HttpCache
+
+logger = logging.getLogger(__name__)
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+CHALLENGE_MARKERS = (
+    "cf-browser-verification", "challenge-platform", "cf_chl_opt", "Just a moment...",
+    "_Incapsula_Resource", "Attention Required! | Cloudflare", "window._cf_chl", "g-recaptcha",
+)
+
+# 可见文本中的反爬验证提示（如Google的异常流量页面）
+CAPTCHA_TEXT_PATTERNS = (
+    "detected unusual traffic", "systems have detected unusual", "IP address:", "This page checks",
+    "see if it's really you", "not a robot", "Why did this happen",
+    "Loading...The system can't perform the operation now.", "Try again later.",
+)
+
+JS_REQUIRED_MARKERS = (
+    "enable javascript", "javascript is required", "javascript is disabled", "启用javascript", "开启javascript",
+)
+
+_SCRIPT_OR_STYLE = re.compile(r"<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>", re.S | re.I)
+_SCRIPT_TAG = re.compile(r"<script\b", re.I)
+_TAG = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"\s+")
+# <meta charset="gbk"> 与 <meta http-equiv="Content-Type" content="text/html; charset=gbk">
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I)
+# GB2312/GBK页面中常混有超出声明字符集的字符，按兼容的超集解码
+_SUPERSET_ENCODINGS = {"gb2312": "gb18030", "gbk": "gb18030", "x-gbk": "gb18030", "iso-8859-1": "cp1252",
+                       "latin-1": "cp1252", "ascii": "cp1252", "us-ascii": "cp1252"}
+
+
+def sniff_encoding(body: bytes, declared: Optional[str] = None) -> str:
+    """
+    确定页面编码：响应头声明 > BOM > 前4KB中的<meta charset> > UTF-8
+
+    很多中文站点只在<meta>中声明GBK，只看响应头会按UTF-8解码成乱码
+    """
+    candidates = [declared]
+    if body.startswith(codecs.BOM_UTF8):
+        candidates.append("utf-8-sig")
+    match = _META_CHARSET.search(body[:4096])
+    if match:
+        candidates.append(match.group(1).decode("ascii", errors="ignore"))
+    for encoding in candidates:
+        if not encoding:
+            continue
+        encoding = encoding.strip().lower()
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            continue
+        return _SUPERSET_ENCODINGS.get(encoding, encoding)
+    return "utf-8"
+
+
+class HttpPage:
+    """一次HTTP抓取的结果，error不为None时表示请求失败"""
+
+    def __init__(self, url: str, status: int = 0, content_type: str = "", body: bytes = b"",
+                 encoding: Optional[str] = None, error: Optional[str] = None, from_cache: bool = False):
+        self.url = url
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.encoding = encoding
+        self.error = error
+        self.from_cache = from_cache
+        self._html: Optional[str] = None
+
+    @classmethod
+    def from_cached(cls, cached: CachedResponse) -> "HttpPage":
+        meta = cached.meta
+        return cls(meta.get("final_url") or meta["url"], meta["status"], meta["content_type"], cached.body,
+                   meta.get("encoding"), from_cache=True)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.status == 200
+
+    @property
+    def is_pdf(self) -> bool:
+        # 很多站点把PDF作为application/octet-stream返回或URL不以.pdf结尾，以文件头为准
+        return self.ok and (self.content_type == "application/pdf" or self.body[:5] == b"%PDF-")
+
+    @property
+    def html(self) -> str:
+        if self._html is None:
+            self._html = self.body.decode(sniff_encoding(self.body, self.encoding), errors="replace")
+        return self._html
+
+
+class HttpFetcher:
+    """
+    共享连接池的HTTP抓取器
+
+    fetch()不抛异常，失败时返回带error的HttpPage；needs_browser()给出需要升级到浏览器抓取的原因，不需要时为None；
+    cache不为None时200响应写入磁盘缓存，请求失败但有过期缓存时返回过期缓存
+    """
+
+    def __init__(self, enabled: bool = True, timeout: float = 10, max_bytes: int = 30 * 1024 * 1024,
+                 limit: int = 100, limit_per_host: int = 8, dns_cache_ttl: int = 300, min_text_chars: int = 500,
+                 cache: Optional[HttpCache] = None):
+        self.enabled = enabled
+        self.cache = cache
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        # 可见文本少于该字数且页面主要由脚本构成时视为JS渲染
+        self.min_text_chars = min_text_chars
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "errors": 0, "pdf_sniffed": 0, "served": 0, "filtered": 0, "escalated": {}}
+
+    @classmethod
+    def from_env(cls) -> "HttpFetcher":
+        return cls(
+            enabled=os.getenv("CRAWLER_HTTP_FIRST_ENABLED", "true").lower() == "true",
+            timeout=float(os.getenv("CRAWLER_HTTP_TIMEOUT", "10")),
+            max_bytes=int(os.getenv("CRAWLER_HTTP_MAX_BYTES", str(30 * 1024 * 1024))),
+            limit=int(os.getenv("CRAWLER_HTTP_POOL_LIMIT", "100")),
+            limit_per_host=int(os.getenv("CRAWLER_HTTP_POOL_LIMIT_PER_HOST", "8")),
+            min_text_chars=int(os.getenv("CRAWLER_HTTP_MIN_TEXT_CHARS", "500")),
+            cache=HttpCache.from_env()
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                    keepalive_timeout=30
+                )
+            )
+        return self._session
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[float] = None) -> HttpPage:
+        """
+        GET页面
+
+        Args:
+            url: 页面URL
+            headers: 请求头
+            timeout: 总超时秒数，默认使用CRAWLER_HTTP_TIMEOUT
+        Returns:
+            HttpPage: 抓取结果
+        """
+        cached = await self.cache.get(url) if self.cache is not None else None
+        if cached is not None and self.cache.is_fresh(cached):
+            self.cache.record_hit(cached)
+            return HttpPage.from_cached(cached)
+        if cached is not None:
+            headers = {**(headers or {}), **cached.validators}
+        self.stats["requests"] += 1
+        try:
+            async with self._get_session().get(
+                url, headers=headers, allow_redirects=True,
+                timeout=aiohttp.ClientTimeout(total=timeout or self.timeout)
+            ) as response:
+                if response.status == 304 and cached is not None:
+                    await self.cache.refresh(url, cached, response.headers)
+                    self.cache.record_hit(cached, "revalidated")
+                    return HttpPage.from_cached(cached)
+                content_length = response.content_length
+                if content_length is not None and content_length > self.max_bytes:
+                    return HttpPage(url, response.status, response.content_type, error=f"响应过大: {content_length}")
+                body = await response.content.read(self.max_bytes + 1)
+                if len(body) > self.max_bytes:
+                    return HttpPage(url, response.status, response.content_type, error="响应过大")
+                page = HttpPage(str(response.url), response.status, response.content_type, body, response.charset)
+                response_headers = response.headers
+        except Exception as e:
+            self.stats["errors"] += 1
+            if cached is not None:
+                logger.info(f"HTTP请求失败，使用过期缓存 {url}: {type(e).__name__}")
+                self.cache.record_hit(cached, "stale_served")
+                return HttpPage.from_cached(cached)
+            return HttpPage(url, error=f"{type(e).__name__}: {str(e)}")
+        if self.cache is not None:
+            if cached is not None:
+                self.cache.stats["refetched"] += 1
+            await self.cache.put(url, page.url, page.status, page.content_type, page.encoding, page.body,
+                                 response_headers)
+        if page.is_pdf:
+            self.stats["pdf_sniffed"] += 1
+        return page
+
+    @staticmethod
+    def visible_text(html: str) -> str:
+        """粗略提取可见文本，只用于判断页面是否需要浏览器渲染"""
+        return _SPACES.sub(" ", _TAG.sub(" ", _SCRIPT_OR_STYLE.sub(" ", html))).strip()
+
+    def needs_browser(self, page: HttpPage, text: Optional[str] = None) -> Optional[str]:
+        """
+        判断HTTP抓取结果是否需要升级到浏览器
+
+        Args:
+            page: HTTP抓取结果
+            text: 页面可见文本，为None时从HTML中提取
+        Returns:
+            Optional[str]: 升级原因（error/status/content_type/challenge/encoding/js），可以直接使用时为None
+        """
+        if page.error is not None:
+            return "error"
+        if page.status != 200:
+            return "status"
+        if not page.content_type.startswith(HTML_CONTENT_TYPES):
+            return "content_type"
+        html = page.html
+        if any(marker in html for marker in CHALLENGE_MARKERS):
+            return "challenge"
+        text = self.visible_text(html) if text is None else text
+        lower = text.lower()
+        if any(pattern.lower() in lower for pattern in CAPTCHA_TEXT_PATTERNS):
+            return "challenge"
+        # 编码判断错误时正文是大量替换字符，交给浏览器按页面实际编码渲染
+        replaced = text.count("\ufffd")
+        if replaced >= 10 and replaced > len(text) * 0.01:
+            return "encoding"
+        # 文字很少的页面只要带脚本（包括只有一个打包脚本的单页应用）就交给浏览器渲染
+        if len(text) < self.min_text_chars:
+            if _SCRIPT_TAG.search(html) or any(marker in lower for marker in JS_REQUIRED_MARKERS):
+                return "js"
+        return None
+
+    def record_escalation(self, reason: str):
+        self.stats["escalated"][reason] = self.stats["escalated"].get(reason, 0) + 1
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {**self.stats, "escalated": dict(self.stats["escalated"])}
+        if self.cache is not None:
+            stats["cache"] = self.cache.get_stats()
+        return stats
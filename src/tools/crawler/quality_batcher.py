@@ -0,0 +1,160 @@
+"""
+文章质量批量评估模块
+把并发抓取到的多篇短文章按token预算打包进一次质量评估请求，长文章单独评估，
+减少fetch_article_stream中逐篇调用质量模型带来的模板开销和往返次数
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.model.llm_client import CallType
+from src.model.rate_limiter import RequestPriority
+from src.prompts.prompt_templates import PromptTemplates
+
+logger = logging.getLogger(__name__)
+
+
+class ArticleQualityBatcher:
+    """
+    文章质量评估微批处理器
+
+    evaluate()提交的短文章进入待处理批次，批次达到token预算、篇数上限或等待超过linger秒后
+    合并为一次LLM请求；超过单篇上限的长文章直接走单篇评估。批量结果缺失的文章回退为单篇评估
+    """
+
+    def __init__(self, llm_client, query: str, word_count: int,
+                 single_evaluator: Callable[[str], Awaitable[Optional[Dict[str, Any]]]],
+                 token_budget: int = 12000, max_batch_size: int = 8, linger: float = 0.5, extractive: bool = False):
+        self.llm_client = llm_client
+        self.query = query
+        self.word_count = word_count
+        self.single_evaluator = single_evaluator
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.linger = linger
+        # 抽取式压缩：结果中返回keep_paragraphs段落序号而不是compressed_article，与单篇评估保持一致
+        self.extractive = extractive
+        self.template_key = PromptTemplates.article_quality_template_key(extractive, batch=True)
+        # 单篇超过预算一半的文章不参与打包，避免一篇长文挤占整个批次
+        self.max_article_tokens = token_budget // 2
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.stats = {"batches": 0, "batched_articles": 0, "single": 0, "fallback": 0}
+
+    @classmethod
+    def from_env(cls, llm_client, query: str, word_count: int,
+                 single_evaluator: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]) -> "ArticleQualityBatcher":
+        return cls(
+            llm_client=llm_client,
+            query=query,
+            word_count=word_count,
+            single_evaluator=single_evaluator,
+            token_budget=int(os.getenv("ARTICLE_QUALITY_BATCH_TOKEN_BUDGET", "12000")),
+            max_batch_size=int(os.getenv("ARTICLE_QUALITY_BATCH_MAX_SIZE", "8")),
+            linger=float(os.getenv("ARTICLE_QUALITY_BATCH_LINGER", "0.5")),
+            extractive=os.getenv("ARTICLE_QUALITY_EXTRACTIVE", "true").lower() == "true"
+        )
+
+    async def evaluate(self, article: str) -> Optional[Dict[str, Any]]:
+        """
+        评估单篇文章质量
+
+        Args:
+            article: 文章内容
+        Returns:
+            Optional[Dict[str, Any]]: 与单篇质量评估相同结构的结果，评估失败时为None
+        """
+        tokens = self.llm_client.count_tokens(article)
+        if tokens > self.max_article_tokens:
+            self.stats["single"] += 1
+            return await self.single_evaluator(article)
+        if self._pending and self._pending_tokens + tokens > self.token_budget:
+            self._start_flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((article, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_batch_size or self._pending_tokens >= self.token_budget:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.linger, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = []
+        self._pending_tokens = 0
+        task = asyncio.create_task(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]):
+        if len(batch) == 1:
+            article, future = batch[0]
+            self.stats["single"] += 1
+            await self._resolve(future, self.single_evaluator(article))
+            return
+        self.stats["batches"] += 1
+        self.stats["batched_articles"] += len(batch)
+        try:
+            prompt = PromptTemplates.format_article_quality_batch_prompt(
+                articles=[article for article, _ in batch],
+                query=self.query,
+                extractive=self.extractive
+            )
+            data = await self.llm_client.generate_json(
+                prompt=prompt,
+                system_message=PromptTemplates.system_prompt(self.template_key, word_count=self.word_count),
+                model=os.getenv("ARTICLE_QUALITY_MODEL"),
+                priority=RequestPriority.BULK,
+                call_type=CallType.QUALITY,
+                schema_key=self.template_key
+            )
+            verdicts = self._parse_verdicts(data)
+        except Exception as e:
+            logger.error(f"批量文章质量评估失败，共{len(batch)}篇: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        fallbacks = []
+        for index, (article, future) in enumerate(batch):
+            verdict = verdicts.get(index)
+            if verdict is None:
+                fallbacks.append((article, future))
+            elif not future.done():
+                future.set_result(verdict)
+        if fallbacks:
+            self.stats["fallback"] += len(fallbacks)
+            logger.warning(f"批量质量评估结果缺失{len(fallbacks)}篇，回退为单篇评估")
+            await asyncio.gather(*(self._resolve(future, self.single_evaluator(article)) for article, future in fallbacks))
+
+    def _parse_verdicts(self, data: Optional[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """解析批量结果，返回 序号 -> 单篇结果"""
+        items = data.get("results", []) if isinstance(data, dict) else []
+        verdicts = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("index")
+            if isinstance(index, (int, float)):
+                verdicts[int(index)] = item
+        return verdicts
+
+    async def _resolve(self, future: asyncio.Future, coro: Awaitable[Optional[Dict[str, Any]]]):
+        try:
+            result = await coro
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
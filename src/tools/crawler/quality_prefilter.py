@@ -0,0 +1,101 @@
+"""
+文章质量两阶段评估的摘录初筛
+先把文章的标题、小标题和开头段落交给质量模型打分，明显低质量的文章直接淘汰，
+其余文章再进行全文质量评估，减少全文评估中大量送入无关页面正文的token
+"""
+
+import os
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from src.model.llm_client import CallType
+from src.model.rate_limiter import RequestPriority
+from src.prompts.prompt_templates import PromptTemplates
+from src.utils.article_paragraphs import head_excerpt
+
+logger = logging.getLogger(__name__)
+
+
+class ExcerptQualityPrefilter:
+    """
+    摘录初筛
+
+    screen()返回 (淘汰结果, 分数)：分数不超过reject_score时返回低质量结果，调用方不再进行全文评估；
+    否则返回None，调用方继续全文评估并通过record_full()记录全文结果，
+    stats["score_buckets"]按初筛分数统计全文评估的通过数和淘汰数，用于调整reject_score
+    """
+
+    def __init__(self, llm_client, query: str, enabled: bool = False, excerpt_chars: int = 1500,
+                 min_article_chars: int = 3000, reject_score: int = 2, max_tokens: int = 200):
+        self.llm_client = llm_client
+        self.query = query
+        self.enabled = enabled
+        self.excerpt_chars = excerpt_chars
+        # 短文章的摘录与全文相差不大，直接进行全文评估
+        self.min_article_chars = min_article_chars
+        self.reject_score = reject_score
+        self.max_tokens = max_tokens
+        self.stats = {
+            "excerpt_checked": 0, "excerpt_rejected": 0, "excerpt_passed": 0, "excerpt_failed": 0,
+            "skipped_short": 0, "full_checked": 0, "full_rejected": 0, "score_buckets": {}
+        }
+
+    @classmethod
+    def from_env(cls, llm_client, query: str) -> "ExcerptQualityPrefilter":
+        return cls(
+            llm_client=llm_client,
+            query=query,
+            enabled=os.getenv("ARTICLE_QUALITY_TWO_STAGE_ENABLED", "false").lower() == "true",
+            excerpt_chars=int(os.getenv("ARTICLE_QUALITY_EXCERPT_CHARS", "1500")),
+            min_article_chars=int(os.getenv("ARTICLE_QUALITY_EXCERPT_MIN_ARTICLE_CHARS", "3000")),
+            reject_score=int(os.getenv("ARTICLE_QUALITY_EXCERPT_REJECT_SCORE", "2"))
+        )
+
+    async def screen(self, article: str) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        对文章摘录打分
+
+        Args:
+            article: 文章内容
+        Returns:
+            (淘汰结果, 分数)：淘汰结果不为None时文章已判定为低质量；初筛未执行或失败时分数为None
+        """
+        if not self.enabled:
+            return None, None
+        if len(article) < self.min_article_chars:
+            self.stats["skipped_short"] += 1
+            return None, None
+        self.stats["excerpt_checked"] += 1
+        try:
+            data = await self.llm_client.generate_json(
+                prompt=PromptTemplates.format_article_excerpt_prompt(head_excerpt(article, self.excerpt_chars), self.query),
+                system_message=PromptTemplates.system_prompt("ARTICLE_QUALITY_EXCERPT_TEMPLATE"),
+                model=os.getenv("ARTICLE_QUALITY_MODEL"),
+                priority=RequestPriority.BULK,
+                call_type=CallType.QUALITY,
+                schema_key="ARTICLE_QUALITY_EXCERPT_TEMPLATE",
+                max_tokens=self.max_tokens
+            )
+            score = int(data["score"])
+        except Exception as e:
+            # 初筛失败不影响结果，直接进行全文评估
+            self.stats["excerpt_failed"] += 1
+            logger.warning(f"文章摘录初筛失败，进行全文评估: {str(e)}")
+            return None, None
+        if score <= self.reject_score:
+            self.stats["excerpt_rejected"] += 1
+            return {"high_quality": False, "reason": data.get("reason") or f"摘录初筛评分{score}", "compress": False}, score
+        self.stats["excerpt_passed"] += 1
+        return None, score
+
+    def record_full(self, score: Optional[int], verdict: Optional[Dict[str, Any]]):
+        """记录全文评估结果，score为该文章的初筛分数"""
+        if not self.enabled or not isinstance(verdict, dict):
+            return
+        self.stats["full_checked"] += 1
+        high_quality = bool(verdict.get("high_quality"))
+        if not high_quality:
+            self.stats["full_rejected"] += 1
+        if score is not None:
+            bucket = self.stats["score_buckets"].setdefault(score, {"high_quality": 0, "low_quality": 0})
+            bucket["high_quality" if high_quality else "low_quality"] += 1
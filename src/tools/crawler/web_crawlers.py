@@ -6,10 +6,10 @@ import logging
 import io
 import os
 import asyncio
-from typing import Dict, List, Any, Optional
+import time
+from typing import Dict, List, Any, Optional, Tuple
 from urllib.parse import urlparse, urlunparse, urljoin
 from markdownify import markdownify as md
-import aiohttp
 
 import asyncio
 import logging
@@ -17,7 +17,6 @@ import re
 import os
 from typing import List, Optional, AsyncGenerator
 from urllib.parse import urlparse, urljoin, quote
-import aiohttp
 import requests
 import pdfplumber
 import io
@@ -29,16 +28,26 @@ from src.database.vectordb.milvus_dao import milvus_dao
 import uuid
 from src.prompts.prompt_templates import PromptTemplates
 from datetime import datetime, timezone
-from src.model.llm_client import llm_client
-from playwright.async_api import async_playwright
+from src.model.llm_client import llm_client, CallType
+from src.model.rate_limiter import RequestPriority
+from src.tools.crawler.browser_pool import BrowserPoolManager
+from src.tools.crawler.http_fetcher import CAPTCHA_TEXT_PATTERNS, HttpFetcher
+from src.tools.crawler.domain_strategy import DomainStrategyMemory, STRATEGY_BROWSER, STRATEGY_HTTP, STRATEGY_PROXY
+from src.tools.crawler.article_cache import ProcessedArticleCache
 from src.tools.crawler.cloudflare_bypass import CloudflareBypass
 from src.database.vectordb.schema_manager import MilvusSchemaManager
 from src.tools.crawler.crawler_config import crawler_config_manager
-from src.utils.json_parser import str2Json
 from src.utils.text_filter import TextFilter
+from src.tools.crawler.quality_batcher import ArticleQualityBatcher
+from src.tools.crawler.quality_prefilter import ExcerptQualityPrefilter
+from src.model.quality_classifier import QualityClassifier
+from src.utils.article_paragraphs import rebuild_from_indices, split_paragraphs
 
 logger = logging.getLogger(__name__)
 
+# 文章缓存命中时返回给调用方的字段
+CACHED_RESULT_FIELDS = ("content", "title", "high_quality", "reason", "compress")
+
 class WebCrawler:
     """
     常用网站爬虫，支持主流技术媒体
@@ -61,9 +70,19 @@ class WebCrawler:
         self.crawler_max_links_result = int(os.getenv("CRAWLER_MAX_LINKS_RESULT", 20))
         self.crawler_fetch_url_timeout = int(os.getenv("CRAWLER_FETCH_URL_TIMEOUT", 20))
         self.crawler_fetch_article_with_semaphore = int(os.getenv("CRAWLER_FETCH_ARTICLE_WITH_SEMAPHORE", 10))
+        self.browser_pools = BrowserPoolManager.from_env(self.proxies)
+        self.http_fetcher = HttpFetcher.from_env()
+        self.domain_strategies = DomainStrategyMemory.from_env()
+        self.article_cache = ProcessedArticleCache.from_env()
         self.llm_client = llm_client
         self.article_trunc_word_count = int(os.getenv("ARTICLE_TRUNC_WORD_COUNT", 10000))
         self.article_compress_word_count = int(os.getenv("ARTICLE_COMPRESS_WORD_COUNT", 5000))
+        self.article_quality_batch_enabled = os.getenv("ARTICLE_QUALITY_BATCH_ENABLED", "true").lower() == "true"
+        self.article_quality_extractive = os.getenv("ARTICLE_QUALITY_EXTRACTIVE", "true").lower() == "true"
+        self.article_quality_template_key = PromptTemplates.article_quality_template_key(self.article_quality_extractive)
+        self.quality_classifier = QualityClassifier.from_env(
+            self.milvus_dao.generate_embeddings, self.article_trunc_word_count
+        )
         
     def is_valid_url(self, url: str, base_domain: Optional[str] = None) -> bool:
         """
@@ -175,32 +194,36 @@ class WebCrawler:
         Returns:
             Dict[str, Any]: 提取的内容
         """
+        page = await self.http_fetcher.fetch(url, headers=self.headers, timeout=self.crawler_extract_pdf_timeout)
+        if not page.ok:
+            logger.error(f"提取PDF内容出错: {url}, 错误: {page.error or page.status}")
+            return None
+        return await asyncio.to_thread(self._pdf_to_text, url, page.body)
+
+    def _pdf_to_text(self, url: str, pdf_content: bytes) -> Optional[str]:
+        """解析PDF字节内容为文本，命中低质量规则或解析失败时为None"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers, timeout=self.crawler_extract_pdf_timeout) as response:
-                    if response.status == 200:
-                        pdf_content = await response.read()
-                        with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
-                            text_content = []
-                            laparams = LAParams(
-                                detect_vertical=True,  # 检测垂直文本
-                                all_texts=True,        # 提取所有文本层
-                                line_overlap=0.5,      # 行重叠阈值
-                                char_margin=2.0        # 字符间距阈值
-                            )
-                            for page in pdf.pages:
-                                page_text = page.extract_text(laparams=laparams)
-                                if page_text:
-                                    text_content.append(
-                                        page_text.replace('\ufffd', '?')  # 替换非法字符
-                                    )
-                            if text_content:
-                                final_text = '\n\n'.join(text_content)
-                                is_filter = self._rule_based_filter(url, final_text)
-                                if (is_filter):
-                                    logger.info(f"命中低质量规则校验，过滤掉 {url} 的内容")
-                                    return None
-                                return final_text
+            with pdfplumber.open(io.BytesIO(pdf_content)) as pdf:
+                text_content = []
+                laparams = LAParams(
+                    detect_vertical=True,  # 检测垂直文本
+                    all_texts=True,        # 提取所有文本层
+                    line_overlap=0.5,      # 行重叠阈值
+                    char_margin=2.0        # 字符间距阈值
+                )
+                for page in pdf.pages:
+                    page_text = page.extract_text(laparams=laparams)
+                    if page_text:
+                        text_content.append(
+                            page_text.replace('\ufffd', '?')  # 替换非法字符
+                        )
+                if text_content:
+                    final_text = '\n\n'.join(text_content)
+                    is_filter = self._rule_based_filter(url, final_text)
+                    if (is_filter):
+                        logger.info(f"命中低质量规则校验，过滤掉 {url} 的内容")
+                        return None
+                    return TextFilter.filter_useless(final_text)
         except Exception as e:
             logger.error(f"提取PDF内容出错: {url}, 错误: {str(e)}")
         return None
@@ -295,63 +318,86 @@ class WebCrawler:
             logger.warning("没有有效链接可爬取")
             return
         sem = asyncio.Semaphore(self.crawler_fetch_article_with_semaphore)
+        single_evaluator = lambda article: self.evaluate_article_quality(article, query)
+        batcher = ArticleQualityBatcher.from_env(
+            self.llm_client, query, self.article_trunc_word_count, single_evaluator
+        ) if self.article_quality_batch_enabled else None
+        prefilter = ExcerptQualityPrefilter.from_env(self.llm_client, query)
         async def process_link(link: str) -> dict:
             """处理单个链接的异步任务"""
             try:
-                async with sem:
-                    if self.is_pdf_url(link):
-                        content = await self.extract_pdf(link)
-                    else:
-                        content = await self.fetch_url_md(link)
-                    clean_content = content.strip() if content else ""
-                    if not clean_content:
-                        return {
-                            "url": link, 
-                            "content": "", 
-                            "title": "", 
-                            "high_quality": False, 
-                            "reason": "内容未获取到或已被过滤", 
-                            "compress": False
-                        }
-                    prompt = PromptTemplates.format_article_quality_prompt(
-                        article=clean_content, 
-                        query=query,
-                        word_count=self.article_trunc_word_count)
-                    response = await self.llm_client.generate(
-                        prompt=prompt, 
-                        model=os.getenv("ARTICLE_QUALITY_MODEL")
-                    )
-                    quality_result = str2Json(response)
-                    if not quality_result:
-                        return {
-                            "url": link, 
-                            "content": "", 
-                            "title": "", 
-                            "high_quality": False, 
-                            "reason": "内容质量评估失败", 
-                            "compress": False
-                        }
-                    if not quality_result.get("high_quality", False):
-                        return {
-                            "url": link, 
-                            "content": "", 
-                            "title": "", 
-                            "high_quality": False, 
-                            "reason": quality_result.get("reason"), 
-                            "compress": False
-                        }
-                    if quality_result.get("compress"): 
-                        content = quality_result.get("compressed_article")
+                # 有效期内处理过的URL直接返回缓存的结果；只有正文缓存时跳过抓取和HTML转换，只重新评估质量
+                cached = await self.article_cache.get(link, query)
+                if cached["verdict"] is not None:
+                    verdict = cached["verdict"]
+                    return {"url": link, **{k: verdict.get(k) for k in CACHED_RESULT_FIELDS}}
+                content = cached["content"]
+                if content is None:
+                    # 信号量只限制抓取并发，质量评估在信号量外进行，便于多篇文章合并为一次批量评估
+                    async with sem:
+                        if self.is_pdf_url(link):
+                            content = await self.extract_pdf(link)
+                        else:
+                            content = await self.fetch_url_md(link)
+                clean_content = content.strip() if content else ""
+                if not clean_content:
+                    return {
+                        "url": link, 
+                        "content": "", 
+                        "title": "", 
+                        "high_quality": False, 
+                        "reason": "内容未获取到或已被过滤", 
+                        "compress": False
+                    }
+                # 嵌入分类器有把握判为低质量的文章不再调用LLM；其余文章的LLM判定记录下来用于训练分类器
+                embeddings = await self.quality_classifier.embed(clean_content, query) \
+                    if self.quality_classifier.active else None
+                quality_result = self.quality_classifier.screen(embeddings)
+                if quality_result is None:
+                    # 两阶段评估：摘录初筛淘汰明显低质量的文章，其余文章进行全文评估
+                    quality_result, excerpt_score = await prefilter.screen(clean_content)
+                    if quality_result is None:
+                        if batcher is not None:
+                            quality_result = await batcher.evaluate(clean_content)
+                        else:
+                            quality_result = await single_evaluator(clean_content)
+                        prefilter.record_full(excerpt_score, quality_result)
+                        self.quality_classifier.record(link, query, embeddings, quality_result)
+                if not quality_result:
+                    await self.article_cache.put(link, query, clean_content)
+                    return {
+                        "url": link, 
+                        "content": "", 
+                        "title": "", 
+                        "high_quality": False, 
+                        "reason": "内容质量评估失败", 
+                        "compress": False
+                    }
+                if not quality_result.get("high_quality", False):
                     result = {
                         "url": link, 
-                        "content": content, 
-                        "title": quality_result.get("title"), 
-                        "high_quality": True, 
+                        "content": "", 
+                        "title": "", 
+                        "high_quality": False, 
                         "reason": quality_result.get("reason"), 
-                        "compress": quality_result.get("compress"),
+                        "compress": False
                     }
-                    asyncio.create_task(self.save_article([result], quality_result["scenario"]))
+                    await self.article_cache.put(link, query, clean_content, result)
                     return result
+                if quality_result.get("compress"): 
+                    content = self.compressed_content(clean_content, quality_result)
+                result = {
+                    "url": link, 
+                    "content": content, 
+                    "title": quality_result.get("title"), 
+                    "high_quality": True, 
+                    "reason": quality_result.get("reason"), 
+                    "compress": quality_result.get("compress"),
+                }
+                await self.article_cache.put(link, query, clean_content,
+                                             {**result, "scenario": quality_result.get("scenario")})
+                asyncio.create_task(self.save_article([result], quality_result.get("scenario")))
+                return result
             except asyncio.CancelledError:
                 logger.warning(f"任务取消: {link}", exc_info=True)
                 return {"url": link, "error": "任务取消"}
@@ -375,6 +421,132 @@ class WebCrawler:
             for task in tasks:
                 if not task.done():
                     task.cancel()
+            if batcher is not None:
+                logger.info(f"文章质量评估统计: {batcher.stats}")
+            if prefilter.enabled:
+                logger.info(f"两阶段质量评估统计: {prefilter.stats}")
+            if self.quality_classifier.active:
+                logger.info(f"质量分类器统计: {self.quality_classifier.stats}")
+
+    async def evaluate_article_quality(self, article: str, query: str = None) -> Optional[Dict[str, Any]]:
+        """
+        单篇文章质量评估
+        
+        Args:
+            article: 文章内容
+            query: 用户查询
+            
+        Returns:
+            Optional[Dict[str, Any]]: 质量评估结果，解析失败时为None
+        """
+        quality_model = os.getenv("ARTICLE_QUALITY_MODEL")
+        system_message = PromptTemplates.system_prompt(self.article_quality_template_key, word_count=self.article_trunc_word_count)
+        prompt = PromptTemplates.format_article_quality_prompt(
+            article=article, 
+            query=query,
+            assembler=self.llm_client.prompt_assembler_for(quality_model),
+            token_budget=self.llm_client.prompt_token_budget(quality_model, system_message=system_message),
+            extractive=self.article_quality_extractive)
+        # 判定为低质量后不再等待其余字段
+        return await self.llm_client.generate_json(
+            prompt=prompt, 
+            system_message=system_message,
+            model=quality_model,
+            priority=RequestPriority.BULK,
+            call_type=CallType.QUALITY,
+            schema_key=self.article_quality_template_key,
+            stop_when=lambda result: result.get("high_quality") is False
+        )
+
+    def compressed_content(self, article: str, verdict: Dict[str, Any]) -> str:
+        """
+        取质量评估给出的压缩文章：抽取式结果按keep_paragraphs在本地拼回原文段落，生成式结果直接使用compressed_article
+
+        Args:
+            article: 送去评估的文章内容，段落切分与评估时一致
+            verdict: 质量评估结果
+        Returns:
+            str: 压缩后的文章，模型没有给出可用的段落或内容时截取文章开头
+        """
+        if "keep_paragraphs" in verdict:
+            content = rebuild_from_indices(split_paragraphs(article), verdict.get("keep_paragraphs"))
+        else:
+            # 生成式压缩的内容来自模型输出，与抓取的正文一样在进入prompt前清理一次
+            content = TextFilter.filter_useless(verdict.get("compressed_article"))
+        return content or article[:self.article_compress_word_count]
+
+    async def ingest_links(self, links: List[str], query: str = None) -> Dict[str, int]:
+        """
+        后台批量入库：抓取全部链接后，质量评估通过LLM离线批处理一次提交，通过评估的文章按场景保存到Milvus
+
+        与fetch_article_stream不同，该路径不要求实时返回，批处理不占用交互式调用的限流配额；
+        批处理中失败的文章回退为单篇评估
+
+        Args:
+            links: 链接列表
+            query: 用于质量评估的主题
+
+        Returns:
+            Dict[str, int]: 抓取、评估与入库的文章数统计
+        """
+        stats = {"links": len(links), "fetched": 0, "high_quality": 0, "fallback": 0, "failed": 0}
+        sem = asyncio.Semaphore(self.crawler_fetch_article_with_semaphore)
+
+        async def fetch(link: str):
+            async with sem:
+                try:
+                    content = await self.extract_pdf(link) if self.is_pdf_url(link) else await self.fetch_url_md(link)
+                except Exception as e:
+                    logger.error(f"抓取失败: {link} - {str(e)}")
+                    content = None
+            return link, content.strip() if content else ""
+
+        fetched = [(link, content) for link, content in await asyncio.gather(*(fetch(link) for link in links)) if content]
+        stats["fetched"] = len(fetched)
+        if not fetched:
+            logger.warning("没有抓取到可入库的文章")
+            return stats
+
+        quality_model = os.getenv("ARTICLE_QUALITY_MODEL")
+        system_message = PromptTemplates.system_prompt(self.article_quality_template_key, word_count=self.article_trunc_word_count)
+        token_budget = self.llm_client.prompt_token_budget(quality_model, system_message=system_message)
+        prompts = [
+            PromptTemplates.format_article_quality_prompt(
+                article=content,
+                query=query,
+                assembler=self.llm_client.prompt_assembler_for(quality_model),
+                token_budget=token_budget,
+                extractive=self.article_quality_extractive)
+            for _, content in fetched
+        ]
+        verdicts = await self.llm_client.generate_json_batch(
+            prompts,
+            self.article_quality_template_key,
+            system_message=system_message,
+            model=quality_model,
+            call_type=CallType.QUALITY
+        )
+
+        by_scenario: Dict[str, List[dict]] = {}
+        for (link, content), verdict in zip(fetched, verdicts):
+            if verdict is None:
+                stats["fallback"] += 1
+                verdict = await self.evaluate_article_quality(content, query)
+            if not verdict:
+                stats["failed"] += 1
+                continue
+            if not verdict.get("high_quality", False):
+                continue
+            stats["high_quality"] += 1
+            by_scenario.setdefault(verdict.get("scenario"), []).append({
+                "url": link,
+                "content": self.compressed_content(content, verdict) if verdict.get("compress") else content,
+                "title": verdict.get("title"),
+            })
+        for scenario, results in by_scenario.items():
+            await self.save_article(results, scenario)
+        logger.info(f"批量入库统计: {stats}")
+        return stats
 
     async def save_article(self, results, scenario: str = None):
         batch_size = 5
@@ -493,11 +665,16 @@ class WebCrawler:
         Returns:
             Optional[str]: Markdown内容
         """
-        return self.html2md(await self.fetch_url_with_proxy_fallback(url))
+        html, pdf_content = await self._fetch_with_strategies(url)
+        # URL不带.pdf但实际返回PDF的文档按PDF解析
+        if pdf_content is not None:
+            return await asyncio.to_thread(self._pdf_to_text, url, pdf_content)
+        return self.html2md(html)
 
     async def fetch_url_with_proxy_fallback(self, url: str) -> Optional[str]:
         """
-        尝试获取URL内容，如果不使用代理失败，则尝试使用代理
+        获取URL内容：按域名记忆的策略顺序依次尝试直接HTTP请求、浏览器、代理浏览器，
+        HTTP结果需要JS渲染、为空或是验证页面时视为失败并尝试下一个策略
         
         Args:
             url: 要获取的URL
@@ -505,143 +682,118 @@ class WebCrawler:
         Returns:
             Optional[str]: 页面内容或None（如果获取失败）
         """
+        html, _ = await self._fetch_with_strategies(url)
+        return html
+
+    async def _fetch_with_strategies(self, url: str) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        返回 (HTML, PDF内容)，HTTP请求直接拿到PDF时HTML为None
+
+        页面抓取成功但命中低质量规则时直接返回 (None, None)：其他策略抓到的是同一页面，不再升级，
+        也不计为该策略的失败，避免内容质量差的域名被误判为抓取失败
+        """
         # 验证URL格式
         if not url or not isinstance(url, str):
             logger.error(f"无效URL: {url}")
-            return None
-            
+            return None, None
         # 确保URL有正确的协议前缀
         if not url.startswith(('http://', 'https://')):
             logger.error(f"URL缺少协议前缀: {url}")
-            return None
-            
-        try:
-            return await self._fetch_url_implementation(url, useProxy=False)    
-        except Exception as e:
-            logger.error(f"不使用代理获取URL失败 {url}: {str(e)}")
-            try:
-                return await self._fetch_url_implementation(url, useProxy=True)    
-            except Exception as e:
-                logger.error(f"使用代理获取URL失败 {url}: {str(e)}")
-                return None
+            return None, None
+
+        available = [STRATEGY_HTTP] if self.http_fetcher.enabled else []
+        available.append(STRATEGY_BROWSER)
+        if self.proxies.get("server"):
+            available.append(STRATEGY_PROXY)
+        domain = self.get_domain(url)
+        for strategy in await self.domain_strategies.plan(domain, available):
+            start = time.monotonic()
+            html = pdf_content = None
+            filtered = False
+            if strategy == STRATEGY_HTTP:
+                http_page = await self.http_fetcher.fetch(url, headers=self.headers)
+                if http_page.is_pdf:
+                    pdf_content = http_page.body
+                else:
+                    text = self.http_fetcher.visible_text(http_page.html)
+                    reason = self.http_fetcher.needs_browser(http_page, text) or self._blocked_reason(url, text)
+                    if reason is None and self._content_filter(url, text):
+                        self.http_fetcher.stats["filtered"] += 1
+                        logger.info(f"命中低质量规则校验，过滤掉 {url} 的内容")
+                        filtered = True
+                    elif reason is None:
+                        self.http_fetcher.stats["served"] += 1
+                        html = http_page.html
+                    else:
+                        self.http_fetcher.record_escalation(reason)
+                        logger.info(f"HTTP抓取 {url} 需要浏览器渲染({reason})，尝试下一个抓取策略")
+            else:
+                html, filtered = await self._fetch_url_implementation(url, useProxy=strategy == STRATEGY_PROXY)
+            success = filtered or html is not None or pdf_content is not None
+            await self.domain_strategies.record(domain, strategy, success, time.monotonic() - start)
+            if success:
+                return html, pdf_content
+        return None, None
     
-    async def _fetch_url_implementation(self, url: str, useProxy: bool = False) -> Optional[str]:
+    async def _fetch_url_implementation(self, url: str, useProxy: bool = False) -> Tuple[Optional[str], bool]:
+        """
+        返回 (HTML, 是否命中低质量内容规则)，抓取失败或被过滤时HTML为None；
+        验证页面和文本过短的页面视为抓取失败，由下一个策略重试
+        """
         try:
-            async with async_playwright() as p:
-                if useProxy:
-                    logger.info(f"Fetching URL {url} with proxy")
-                    browser = await p.chromium.launch(
-                        headless=True,
-                        proxy=self.proxies,
-                        args=[
-                        "--disable-blink-features=AutomationControlled",
-                            "--no-sandbox",
-                            "--disable-web-security",
-                            "--disable-features=IsolateOrigins,site-per-process",
-                            f"--user-agent={UserAgent().random}",
-                            "--use-fake-ui-for-media-stream",
-                            "--use-fake-device-for-media-stream",
-                            "--disable-gpu",
-                            "--disable-dev-shm-usage",
-                            "--disable-software-rasterizer"
-                        ],
-                        env={"SSLKEYLOGFILE": "/dev/null"}
-                    )
-                else:
-                    logger.info(f"Fetching URL {url} without proxy")
-                    browser = await p.chromium.launch(
-                        headless=True,
-                        args=[
-                            "--disable-blink-features=AutomationControlled",
-                            "--no-sandbox",
-                            "--disable-web-security",
-                            "--disable-features=IsolateOrigins,site-per-process",
-                            f"--user-agent={UserAgent().random}",
-                            "--use-fake-ui-for-media-stream",
-                            "--use-fake-device-for-media-stream",
-                            "--disable-gpu",
-                            "--disable-dev-shm-usage",
-                            "--disable-software-rasterizer"
-                        ],
-                        env={"SSLKEYLOGFILE": "/dev/null"}
-                    )
-
-                context = await browser.new_context(
-                    user_agent=UserAgent().random,
-                    viewport={"width": 1920, "height": 1080},
-                    locale="en-US,en;q=0.9",
-                    timezone_id="America/New_York",
-                    permissions=["geolocation"],
-                    geolocation={"latitude": 40.7128, "longitude": -74.0060},
-                    color_scheme="dark"
+            logger.info(f"Fetching URL {url} {'with' if useProxy else 'without'} proxy")
+            # 页面从常驻浏览器池中租用，导航或读取出错时异常离开with块，该上下文不再放回池中
+            async with self.browser_pools.pool(useProxy).page() as page:
+                await page.goto(
+                    url, 
+                    wait_until="domcontentloaded", 
+                    timeout=self.crawler_fetch_url_timeout * 1000
                 )
 
+                cloudflare_bypass = CloudflareBypass(page)
                 try:
-                    await context.add_init_script("""
-                        Object.defineProperty(navigator, 'webdriver', {
-                            get: () => undefined
-                        })
-                        window.generateMouseMove = () => {
-                            const path = Array.from({length: 20}, () => ({
-                                x: Math.random() * window.innerWidth,
-                                y: Math.random() * window.innerHeight,
-                                duration: Math.random() * 300 + 200
-                            }))
-                            path.forEach(p => {
-                                window.dispatchEvent(new MouseEvent('mousemove', p))
-                            })
-                        }
-                    """)
-
-                    page = await context.new_page()
-
-                    await page.route("**/*", lambda route: route.abort() 
-                        if route.request.resource_type in {"image", "media", "stylesheet", "font"}
-                        else route.continue_()
-                    )
-
-                    await page.goto(
-                        url, 
-                        wait_until="domcontentloaded", 
-                        timeout=self.crawler_fetch_url_timeout * 1000
-                    )
-
-                    cloudflare_bypass = CloudflareBypass(page)
-                    try:
-                        # 先尝试模拟人类交互
-                        await cloudflare_bypass.simulate_human_interaction()
-                        # 然后处理Cloudflare挑战
-                        html = await cloudflare_bypass.handle_cloudflare()
-                    except Exception as e:
-                        logger.warning(f"Cloudflare绕过过程中出错: {str(e)}")
-                        # 即使出错也尝试获取页面内容
-                        try:
-                            html = await page.inner_html("body")
-                        except Exception as content_error:
-                            logger.error(f"获取页面内容失败: {str(content_error)}")
-                            html = None
-                    if html:
-                        text = await page.inner_text("body")
-                        is_filter = self._rule_based_filter(url, text)
-                        if is_filter:
-                            logger.info(f"命中低质量规则校验，过滤掉 {url} 的内容")
-                            return None
-                        else:
-                            return html
-                    else:
-                        return None
-                finally:
-                    try:
-                        await context.close()
-                    except Exception as context_error:
-                        logger.warning(f"关闭浏览器上下文失败: {str(context_error)}")
+                    # 先尝试模拟人类交互
+                    await cloudflare_bypass.simulate_human_interaction()
+                    # 然后处理Cloudflare挑战
+                    html = await cloudflare_bypass.handle_cloudflare()
+                except Exception as e:
+                    logger.warning(f"Cloudflare绕过过程中出错: {str(e)}")
+                    # 即使出错也尝试获取页面内容
                     try:
-                        await browser.close()
-                    except Exception as browser_error:
-                        logger.warning(f"关闭浏览器失败: {str(browser_error)}")
+                        html = await page.inner_html("body")
+                    except Exception as content_error:
+                        logger.error(f"获取页面内容失败: {str(content_error)}")
+                        html = None
+                if not html:
+                    return None, False
+                text = await page.inner_text("body")
+            reason = self._blocked_reason(url, text)
+            if reason is not None:
+                logger.info(f"{'代理' if useProxy else ''}浏览器抓取 {url} 未拿到正文({reason})")
+                return None, False
+            if self._content_filter(url, text):
+                logger.info(f"命中低质量规则校验，过滤掉 {url} 的内容")
+                return None, True
+            return html, False
         except Exception as e:
             logger.error(f"获取页面内容失败: {str(e)}")
-            return None
+            return None, False
+
+    def get_fetch_stats(self) -> Dict[str, Any]:
+        """抓取层统计"""
+        return {
+            "http": self.http_fetcher.get_stats(),
+            "browser_pools": self.browser_pools.get_stats(),
+            "domain_strategies": self.domain_strategies.get_stats(),
+            "article_cache": self.article_cache.get_stats()
+        }
+
+    async def aclose(self):
+        """关闭HTTP连接池、常驻的浏览器池以及域名策略和文章缓存的Redis连接"""
+        await self.http_fetcher.close()
+        await self.browser_pools.close()
+        await self.domain_strategies.close()
+        await self.article_cache.close()
 
     def get_domain(self, url: str) -> str:
         """
@@ -733,13 +885,27 @@ class WebCrawler:
 
     def _rule_based_filter(self, url, text):
         """基础规则过滤，检测明显的低质量内容"""
-        if not text:
-            return True
+        return self._blocked_reason(url, text) is not None or self._content_filter(url, text)
+
+    def _blocked_reason(self, url, text) -> Optional[str]:
+        """
+        没有拿到正文的页面：文本过短或是反爬验证页面，返回原因（short/challenge），否则为None
+
+        这类结果与抓取方式有关，换用浏览器或代理可能拿到正文
+        """
         # 文本过短
-        if len(text) < 150:
-            logger.info(f"{url} 文本过短，过滤")
-            return True
-            
+        if not text or len(text) < 150:
+            logger.info(f"{url} 文本过短")
+            return "short"
+        # 检测反爬验证页面
+        text_lower = text.lower()
+        if any(pattern.lower() in text_lower for pattern in CAPTCHA_TEXT_PATTERNS):
+            logger.info(f"{url}检测到反爬验证页面")
+            return "challenge"
+        return None
+
+    def _content_filter(self, url, text) -> bool:
+        """正文本身的质量问题（乱码、重复、垃圾内容），换用其他抓取方式结果相同"""
         # 检测乱码（非中文/英文/数字/常用标点符号占比过高）
         non_valid_chars = re.findall(r'[^\u4e00-\u9fa5a-zA-Z0-9，。！？、,\.!?]', text)
         if len(non_valid_chars) / max(len(text), 1) > 0.3:  # 非有效字符超过30%
@@ -763,25 +929,6 @@ class WebCrawler:
         if any(keyword in lower_text for keyword in keywords):
             logger.info(f"{url} 检测到垃圾内容，过滤")
             return True
-
-        # 检测反爬验证页面
-        captcha_patterns = [
-            "detected unusual traffic",
-            "systems have detected unusual",
-            "IP address:",
-            "This page checks",
-            "see if it's really you",
-            "not a robot",
-            "Why did this happen",
-            "Loading...The system can't perform the operation now.",
-            "Try again later.",
-            "Our systems have detected unusual traffic from your computer network."
-        ]
-        text_lower = text.lower()
-        for pattern in captcha_patterns:
-            if pattern in text or pattern.lower() in text_lower:
-                logger.info(f"{url}检测到反爬验证页面，过滤")
-                return True
         return False
 
 web_crawler = WebCrawler()
\ No newline at end of file
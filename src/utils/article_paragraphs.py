@@ -0,0 +1,85 @@
+"""
+文章段落工具
+把文章切分为带序号的段落，质量评估时模型只返回需要保留的段落序号，压缩后的文章在本地按序号拼回，
+输出token数与文章长度无关
+"""
+
+import re
+from typing import Iterable, List
+
+# 超过该长度的段落按句子继续切分，避免一个超长段落只能整段保留或整段丢弃
+MAX_PARAGRAPH_CHARS = 800
+
+_BLANK_LINE = re.compile(r"\n\s*\n")
+_SENTENCE = re.compile(r"[^。！？!?；;.]+[。！？!?；;.]*\s*|[。！？!?；;.]+\s*")
+
+
+def _split_long(paragraph: str, max_chars: int) -> List[str]:
+    pieces, current = [], ""
+    for sentence in _SENTENCE.findall(paragraph):
+        if current and len(current) + len(sentence) > max_chars:
+            pieces.append(current.strip())
+            current = ""
+        current += sentence
+    if current.strip():
+        pieces.append(current.strip())
+    return pieces
+
+
+def split_paragraphs(article: str, max_chars: int = MAX_PARAGRAPH_CHARS) -> List[str]:
+    """按空行切分段落，超长段落按句子切分为不超过max_chars的片段；同一文章每次切分结果相同"""
+    paragraphs = []
+    for block in _BLANK_LINE.split(article or ""):
+        block = block.strip()
+        if not block:
+            continue
+        paragraphs.extend(_split_long(block, max_chars) if len(block) > max_chars else [block])
+    return paragraphs
+
+
+def number_paragraphs(paragraphs: List[str]) -> str:
+    """以[P序号]开头逐段编号，作为提示词中的文章内容"""
+    return "\n\n".join(f"[P{i}] {paragraph}" for i, paragraph in enumerate(paragraphs))
+
+
+def rebuild_from_indices(paragraphs: List[str], indices: Iterable) -> str:
+    """按原文顺序拼接模型选中的段落，忽略越界、重复和非整数的序号"""
+    keep = set()
+    for index in indices or []:
+        if isinstance(index, str):
+            index = index.strip().lstrip("[Pp").rstrip("]")
+            if not index.isdigit():
+                continue
+            index = int(index)
+        if isinstance(index, (int, float)) and not isinstance(index, bool) and 0 <= int(index) < len(paragraphs):
+            keep.add(int(index))
+    return "\n\n".join(paragraphs[i] for i in sorted(keep))
+
+
+def head_excerpt(article: str, max_chars: int = 1500, max_headings: int = 20) -> str:
+    """
+    文章摘录：标题、各级小标题和开头段落，用于先用短文本快速判断文章是否值得全文评估
+
+    Args:
+        article: markdown文章
+        max_chars: 开头段落部分的最大字数
+        max_headings: 最多列出的小标题数
+    Returns:
+        str: 摘录文本
+    """
+    lines = [line.strip() for line in (article or "").splitlines() if line.strip()]
+    headings = [line.lstrip("#").strip() for line in lines if line.startswith("#")]
+    title = headings[0] if headings else (lines[0][:100] if lines else "")
+    head, used = [], 0
+    for paragraph in split_paragraphs(article):
+        if paragraph.startswith("#"):
+            continue
+        if used and used + len(paragraph) > max_chars:
+            break
+        head.append(paragraph[:max_chars - used])
+        used += len(head[-1])
+    parts = [f"标题：{title}"]
+    if len(headings) > 1:
+        parts.append("小标题：" + " / ".join(heading[:50] for heading in headings[1:max_headings + 1]))
+    parts.append("开头段落：\n" + "\n\n".join(head))
+    return "\n".join(parts)
@@ -0,0 +1,182 @@
+import json
+import json5
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CLOSERS = {"{": "}", "[": "]"}
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_MAX_CUT_ATTEMPTS = 3
+
+
+def _scan(text: str) -> Tuple[str, List[str], List[Tuple[int, List[str]]], bool]:
+    """
+    扫描顶层JSON对象，修正字符串中的裸换行、Python字面量、多余逗号和注释
+
+    Returns:
+        (修正后的文本, 未闭合的括号栈, 逗号处的截断点列表, 是否在字符串中结束)
+    """
+    # 逐字符存放，截断点记录的下标即修正后文本中的位置
+    out: List[str] = []
+    stack: List[str] = []
+    cuts: List[Tuple[int, List[str]]] = []
+    quote = None
+    escape = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == quote:
+                quote = None
+            elif char == "\n":
+                char = "\\n"
+            elif char in "\r\t":
+                char = "\\r" if char == "\r" else "\\t"
+            out.extend(char)
+            i += 1
+            continue
+        if char in "\"'":
+            quote = char
+        elif char == "/" and text[i + 1:i + 2] == "/":
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        elif char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            # 去掉右括号前多余的逗号
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                cuts = [cut for cut in cuts if cut[0] < len(out)]
+            if stack:
+                stack.pop()
+            out.append(char)
+            if not stack:
+                return "".join(out), stack, cuts, False
+            i += 1
+            continue
+        elif char == ",":
+            cuts.append((len(out), list(stack)))
+        elif char.isalpha():
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            out.extend(_PYTHON_LITERALS.get(word, word))
+            i = end
+            continue
+        out.append(char)
+        i += 1
+    return "".join(out), stack, cuts, quote is not None
+
+
+def _close(text: str, stack: List[str]) -> str:
+    text = text.rstrip()
+    if text.endswith(":"):
+        text += " null"
+    text = text.rstrip(",")
+    return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def repair_json(response: Optional[str]) -> Optional[Any]:
+    """
+    尽力修复LLM输出的JSON：去掉前后的说明文字和代码块标记，修正字符串中的裸换行、
+    Python风格的True/False/None、多余逗号和注释，补齐被截断的字符串与括号
+
+    Args:
+        response: LLM输出
+    Returns:
+        Optional[Any]: 解析结果，无法修复时为None
+    """
+    if not response:
+        return None
+    starts = [pos for pos in (response.find("{"), response.find("[")) if pos != -1]
+    if not starts:
+        return None
+    text, stack, cuts, in_string = _scan(response[min(starts):])
+    if in_string:
+        text += "\""
+    candidates = [_close(text, stack)]
+    # 截断位置附近的半个键值对无法补齐时，退回到之前的逗号处
+    for position, cut_stack in reversed(cuts[-_MAX_CUT_ATTEMPTS:]):
+        candidates.append(_close(text[:position], cut_stack))
+    for candidate in candidates:
+        try:
+            return json5.loads(candidate)
+        except Exception:
+            continue
+    logger.warning(f"修复JSON失败，原始响应前200字符: {response[:200]}")
+    return None
+
+
+def truncated_in_array(response: Optional[str]) -> bool:
+    """
+    输出是否在数组内部被截断
+
+    这种输出补齐括号后仍能解析，但截断点之后的数组元素已经丢失，不能当作完整结果使用
+    """
+    if not response:
+        return False
+    starts = [pos for pos in (response.find("{"), response.find("[")) if pos != -1]
+    if not starts:
+        return False
+    _, stack, _, _ = _scan(response[min(starts):])
+    return "[" in stack
+
+
+def coerce_to_schema(value: Any, schema: Dict[str, Any]) -> Any:
+    """
+    按JSON Schema校正类型（字符串形式的布尔值、单个值包装为数组等），缺失的必填字段不补默认值，由missing_required检查
+
+    Args:
+        value: 解析出的值
+        schema: JSON Schema
+    Returns:
+        Any: 校正后的值
+    """
+    schema_type = schema.get("type")
+    if schema_type == "object":
+        if not isinstance(value, dict):
+            return value
+        properties = schema.get("properties", {})
+        for key, prop in properties.items():
+            if key in value:
+                value[key] = coerce_to_schema(value[key], prop)
+        return value
+    if schema_type == "array":
+        if value is None or value == "":
+            return []
+        if not isinstance(value, list):
+            value = [value]
+        items = schema.get("items")
+        return [coerce_to_schema(item, items) for item in value] if items else value
+    if schema_type == "boolean":
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "yes", "1", "是")
+        return bool(value)
+    if schema_type == "integer":
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return value
+    if schema_type == "string":
+        if value is None:
+            return ""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False)
+        return value if isinstance(value, str) else str(value)
+    return value
+
+
+def missing_required(value: Any, schema: Dict[str, Any]) -> List[str]:
+    """返回顶层缺失的必填字段"""
+    if not isinstance(value, dict):
+        return list(schema.get("required", []))
+    return [key for key in schema.get("required", []) if key not in value]
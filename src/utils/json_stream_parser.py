@@ -0,0 +1,117 @@
+import json5
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PYTHON_LITERALS = {"True": True, "False": False, "None": None}
+_INCOMPLETE = object()
+
+
+class StreamingJSONParser:
+    """
+    增量JSON解析器
+
+    逐段喂入LLM流式输出，顶层对象中的字段值完整后立即产出 (字段名, 值)，
+    顶层对象闭合后closed置为True。顶层对象之前的文字（如```json）会被忽略
+    """
+
+    def __init__(self, on_field: Optional[Callable[[str, Any], None]] = None):
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self.reset()
+
+    def reset(self):
+        """开始扫描一个新的响应（如重试或故障转移后），已产出的字段保留且不会重复产出"""
+        self.closed = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._quote = None
+        self._escape = False
+        self._segment_start = 0
+        self._colon = None
+
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """
+        喂入一段输出
+
+        Args:
+            text: 新增的输出文本
+        Returns:
+            List[Tuple[str, Any]]: 本次新完成的字段
+        """
+        completed = []
+        if self.closed or not text:
+            return completed
+        self._text += text
+        buffer = self._text
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._quote:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == self._quote:
+                    self._quote = None
+                continue
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._segment_start = i + 1
+                    self._colon = None
+                continue
+            if char in "\"'":
+                self._quote = char
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete(buffer, i, completed)
+                    self.closed = True
+                    self._pos = i + 1
+                    return completed
+            elif self._depth == 1:
+                if char == ":" and self._colon is None:
+                    self._colon = i
+                elif char == ",":
+                    self._complete(buffer, i, completed)
+                    self._segment_start = i + 1
+                    self._colon = None
+        self._pos = len(buffer)
+        return completed
+
+    def _complete(self, buffer: str, end: int, completed: List[Tuple[str, Any]]):
+        if self._colon is None:
+            return
+        key = self._parse_key(buffer[self._segment_start:self._colon].strip())
+        if not key or key in self.fields:
+            return
+        value = self._parse_value(buffer[self._colon + 1:end].strip())
+        if value is _INCOMPLETE:
+            return
+        self.fields[key] = value
+        completed.append((key, value))
+        if self.on_field is not None:
+            self.on_field(key, value)
+
+    @staticmethod
+    def _parse_key(raw: str) -> Optional[str]:
+        if raw[:1] in ("'", '"'):
+            try:
+                return json5.loads(raw)
+            except Exception:
+                return None
+        return raw or None
+
+    @staticmethod
+    def _parse_value(raw: str) -> Any:
+        if raw in _PYTHON_LITERALS:
+            return _PYTHON_LITERALS[raw]
+        try:
+            return json5.loads(raw)
+        except Exception as e:
+            logger.warning(f"增量解析JSON字段值失败，等待完整响应后再解析: {raw[:100]}, 错误:{str(e)}")
+            return _INCOMPLETE
@@ -1,4 +1,15 @@
 import re
+from functools import lru_cache
+
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+@lru_cache(maxsize=32)
+def _compile_words(words: tuple):
+    """同一过滤词列表只编译一次正则，空词会在每个位置匹配空串，需要去掉"""
+    words = [word for word in words if word]
+    return re.compile("|".join(map(re.escape, words))) if words else None
+
 
 class TextFilter:
     DEFAULT_INVALID_WORD = ['', '百度APP内打开', '大家还在搜']
@@ -16,6 +27,7 @@ class TextFilter:
         """
         if not text or not filter:
             return text
-        pattern = "|".join(map(re.escape, filter))
-        text = re.sub(pattern, replacement, text)
-        return re.sub(r'\n{3,}', '\n\n', text).strip()
\ No newline at end of file
+        pattern = _compile_words(tuple(filter))
+        if pattern is not None:
+            text = pattern.sub(replacement, text)
+        return _BLANK_LINES.sub('\n\n', text).strip()